@@ -0,0 +1,213 @@
+"""Offline latency benchmark of the full graph over the golden question set.
+
+Run from the repository root::
+
+    python -m benchmarks.pipeline --mode record      # once, with API keys
+    python -m benchmarks.pipeline --repeat 5         # replay, no network
+
+Replayed responses are keyed by role and prompt, so record and replay
+against the same index and memory file.
+
+Besides latency, every run reports what each node hands to LangGraph: the
+serialized size of its update (what the checkpointer writes for that step)
+and, with ``--memory``, the Python allocation peak while it ran.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+from src.unal_rag.session import initial_state
+from src.unal_rag.utils.metrics import format_table, latency_summary, peak_rss_mb
+from src.unal_rag.utils.resources import MemoryTracker
+
+
+GOLDEN_PATH = Path(__file__).with_name("golden_questions.json")
+SUMMARY_COLUMNS = ("stage", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms")
+STATE_COLUMNS = ("stage", "updates", "update_kb_mean", "update_kb_max", "py_peak_kb_mean")
+
+
+def load_questions(path: Path = GOLDEN_PATH) -> List[Dict[str, Any]]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def run_question(
+    graph: Any,
+    question: str,
+    *,
+    thread_id: str,
+    max_iterations: int,
+    update_bytes: Dict[str, List[int]] | None = None,
+) -> tuple[Dict[str, Any], Dict[str, List[float]], float]:
+    """Stream one question and time each node from the gap between updates.
+
+    When ``update_bytes`` is given, the serialized size of each node's update
+    is appended to it (serialized outside the timed gap).
+    """
+    timings: Dict[str, List[float]] = {}
+    serde = getattr(graph.checkpointer, "serde", None)
+    config = {"configurable": {"thread_id": thread_id}}
+    overhead = 0.0
+    start = last = time.perf_counter()
+    for chunk in graph.stream(
+        initial_state(question, max_iterations=max_iterations),
+        config=config,
+        stream_mode="updates",
+    ):
+        now = time.perf_counter()
+        for node, update in chunk.items():
+            timings.setdefault(node, []).append(now - last)
+            if update_bytes is not None and serde is not None and isinstance(update, dict):
+                update_bytes.setdefault(node, []).append(len(serde.dumps_typed(update)[1]))
+        last = time.perf_counter()
+        overhead += last - now
+    # Updates are deltas; the reduced state is the thread's latest checkpoint.
+    final = dict(graph.get_state(config).values)
+    return final, timings, last - start - overhead
+
+
+def state_rows(update_bytes: Dict[str, List[int]], tracker: MemoryTracker | None) -> List[Dict[str, Any]]:
+    """Per-node update size and, when tracked, Python allocation peak."""
+    peaks: Dict[str, List[float]] = {}
+    for record in tracker.records if tracker else []:
+        if "py_peak_kb" in record:
+            peaks.setdefault(record["node"], []).append(record["py_peak_kb"])
+    rows = []
+    for node, sizes in update_bytes.items():
+        node_peaks = peaks.get(node, [])
+        rows.append(
+            {
+                "stage": node,
+                "updates": len(sizes),
+                "update_kb_mean": round(sum(sizes) / len(sizes) / 1024, 2),
+                "update_kb_max": round(max(sizes) / 1024, 2),
+                "py_peak_kb_mean": round(sum(node_peaks) / len(node_peaks), 1) if node_peaks else None,
+            }
+        )
+    return rows
+
+
+def summarize(node_samples: Dict[str, List[float]], end_to_end: List[float]) -> List[Dict[str, Any]]:
+    rows = [{"stage": node, **latency_summary(samples)} for node, samples in node_samples.items()]
+    rows.append({"stage": "end_to_end", **latency_summary(end_to_end)})
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.pipeline")
+    parser.add_argument("--questions", type=Path, default=GOLDEN_PATH)
+    parser.add_argument("--repeat", type=int, default=3, help="Measured passes over the question set.")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured passes (model and index loading).")
+    parser.add_argument("--max-iterations", type=int, default=2)
+    parser.add_argument("--mode", choices=("replay", "record", "live"), default="replay")
+    parser.add_argument("--fixtures", help="Fixture file (defaults to LLM_REPLAY.fixture_path).")
+    parser.add_argument(
+        "--latency-scale",
+        type=float,
+        help="Multiply replayed latency samples (0 measures graph overhead only).",
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Track Python allocations per node with tracemalloc (slows every node).",
+    )
+    parser.add_argument("--output", type=Path, help="Write the JSON report here.")
+    args = parser.parse_args(argv)
+
+    # Selected before the graph builds any chat model or scheduler.
+    os.environ["UNAL_RAG_LLM_MODE"] = args.mode
+    if args.fixtures:
+        os.environ["UNAL_RAG_LLM_FIXTURES"] = args.fixtures
+    if args.latency_scale is not None:
+        os.environ["UNAL_RAG_REPLAY_LATENCY_SCALE"] = str(args.latency_scale)
+
+    from src.llm_runtime import fixture_store
+    from src.main import build_workflow
+
+    questions = load_questions(args.questions)
+    build_start = time.perf_counter()
+    tracker = MemoryTracker() if args.memory else None
+    graph = build_workflow(node_wrapper=tracker.wrap if tracker else None)
+    build_s = time.perf_counter() - build_start
+
+    run_id = uuid.uuid4().hex[:8]
+    warmup_start = time.perf_counter()
+    for pass_idx in range(max(0, args.warmup)):
+        for item in questions:
+            run_question(
+                graph,
+                item["question"],
+                thread_id=f"bench-{run_id}-warmup{pass_idx}-{item['id']}",
+                max_iterations=args.max_iterations,
+            )
+    warmup_s = time.perf_counter() - warmup_start
+
+    node_samples: Dict[str, List[float]] = {}
+    end_to_end: List[float] = []
+    update_bytes: Dict[str, List[int]] = {}
+    failures = unverified = 0
+    if tracker:
+        tracker.records.clear()
+        tracker.start()
+    for pass_idx in range(max(1, args.repeat)):
+        for item in questions:
+            result, timings, elapsed = run_question(
+                graph,
+                item["question"],
+                thread_id=f"bench-{run_id}-{pass_idx}-{item['id']}",
+                max_iterations=args.max_iterations,
+                update_bytes=update_bytes,
+            )
+            for node, samples in timings.items():
+                node_samples.setdefault(node, []).extend(samples)
+            end_to_end.append(elapsed)
+            failures += int(bool(result.get("llm_failure")))
+            unverified += int(bool(result.get("evaluation_skipped")))
+
+    if tracker:
+        tracker.stop()
+
+    rows = summarize(node_samples, end_to_end)
+    state = state_rows(update_bytes, tracker)
+    report = {
+        "mode": args.mode,
+        "questions": len(questions),
+        "repeat": args.repeat,
+        "build_workflow_s": round(build_s, 3),
+        "warmup_s": round(warmup_s, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "llm_failures": failures,
+        "unverified_answers": unverified,
+        "fixtures": fixture_store().stats() if args.mode != "live" else None,
+        "stages": rows,
+        "state": state,
+        "update_kb_total_mean": round(
+            sum(sum(sizes) for sizes in update_bytes.values()) / 1024 / max(1, len(end_to_end)), 2
+        ),
+    }
+
+    print(format_table(rows, SUMMARY_COLUMNS))
+    print()
+    print(format_table(state, STATE_COLUMNS))
+    print(
+        f"\nbuild_workflow={report['build_workflow_s']}s warmup={report['warmup_s']}s "
+        f"peak_rss={report['peak_rss_mb']}MiB llm_failures={failures} unverified={unverified} "
+        f"update_kb_per_question={report['update_kb_total_mean']}"
+    )
+    if report["fixtures"]:
+        print(f"fixtures: {report['fixtures']}")
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
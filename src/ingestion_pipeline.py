@@ -13,6 +13,8 @@ from langchain_chroma import Chroma
 from dotenv import load_dotenv
 from transformers import AutoTokenizer
 
+from unal_rag.config.settings import EMBEDDING_MODEL
+
 # Loads environment variables (e.g., GOOGLE_API_KEY) from a local .env file.
 load_dotenv()
 
@@ -70,7 +72,7 @@ def split_documents(documents, chunk_size=512, chunk_overlap=0):
     Returns:
         list: Chunked LangChain Document objects.
     """
-    tokenizer = AutoTokenizer.from_pretrained('intfloat/multilingual-e5-small')
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
 
     # Smaller chunks can improve retrieval precision but may increase index size.
     text_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
@@ -93,19 +95,21 @@ def split_documents(documents, chunk_size=512, chunk_overlap=0):
 
     return chunks
 
-def create_vector_store(chunks, persist_directory="db/chroma_db"):
+def create_vector_store(chunks, persist_directory="db/chroma_db", embedding_model=None):
     """Create and persist a local Chroma vector store from document chunks.
 
     Args:
         chunks: Chunked LangChain Document objects to index.
         persist_directory: Local path where Chroma persists its files.
+        embedding_model: Embeddings instance to reuse (loaded when omitted).
 
     Returns:
         Chroma: Persisted vector store instance.
     """
 
     # Uses HF embedding model.
-    embedding_model = HuggingFaceEmbeddings(model="intfloat/multilingual-e5-small")
+    if embedding_model is None:
+        embedding_model = HuggingFaceEmbeddings(model=EMBEDDING_MODEL)
 
     # Build and persist a local vector index on disk.
     vectorstore = Chroma.from_documents(
@@ -1,18 +1,164 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Mapping
 
 
 @dataclass(frozen=True)
 class LLMRoleConfig:
+    name: str
     provider: str
     model: str
     temperature: float
     rationale: str
+    # Ordered alternatives tried (or hedged) after the primary model.
+    fallbacks: tuple["LLMRoleConfig", ...] = ()
+    # Token budget for retrieved context in this role's prompt (0 = no context).
+    context_token_budget: int = 0
+
+    @property
+    def candidates(self) -> tuple["LLMRoleConfig", ...]:
+        return (self, *self.fallbacks)
+
+
+@dataclass(frozen=True)
+class TokenPrice:
+    # USD per million tokens.
+    input_per_mtok: float
+    output_per_mtok: float
+
+
+@dataclass(frozen=True)
+class ProviderRateLimit:
+    requests_per_minute: int
+    tokens_per_minute: int
+    max_queue_wait_s: float
+    max_attempts: int = 4
+
+
+@dataclass(frozen=True)
+class CircuitBreakerConfig:
+    failure_threshold: int
+    cooldown_s: float
+
+
+# Trips a role after consecutive failures; override with
+# UNAL_RAG_BREAKER_THRESHOLD / UNAL_RAG_BREAKER_COOLDOWN.
+CIRCUIT_BREAKER = CircuitBreakerConfig(failure_threshold=3, cooldown_s=60.0)
+
+
+@dataclass(frozen=True)
+class HedgingConfig:
+    enabled: bool
+    # Fire the next candidate once the primary is slower than this latency percentile.
+    percentile: float
+    min_delay_s: float
+    # Used until enough latency samples have been recorded.
+    default_delay_s: float
+    min_samples: int
+    # A primary that lost to a hedge and has not answered this long after the
+    # decision is sampled at the time waited (censored) instead of dropped.
+    censor_after_s: float
+
+
+# Override with UNAL_RAG_HEDGING=0 / UNAL_RAG_HEDGE_PERCENTILE.
+HEDGING = HedgingConfig(
+    enabled=True,
+    percentile=0.9,
+    min_delay_s=1.5,
+    default_delay_s=8.0,
+    min_samples=10,
+    censor_after_s=60.0,
+)
+
+
+@dataclass(frozen=True)
+class DeadlineConfig:
+    # Default per-request budget in seconds (0 = no deadline).
+    default_s: float
+    # Minimum remaining budget to still run each optional step.
+    k_selector_min_s: float
+    evaluator_min_s: float
+    # The router falls back to its heuristic and the generators give up
+    # without calling the provider below these.
+    router_min_s: float
+    generator_min_s: float
+    # A retry repeats retrieval, generation and evaluation.
+    retry_min_s: float
+
+
+# Override the default with UNAL_RAG_DEADLINE or `ask --deadline`.
+DEADLINE = DeadlineConfig(
+    default_s=0.0,
+    k_selector_min_s=6.0,
+    evaluator_min_s=4.0,
+    router_min_s=2.0,
+    generator_min_s=1.0,
+    retry_min_s=15.0,
+)
+
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    # Replayed calls sleep for a log-normal sample with this median and p95.
+    p50_s: float
+    p95_s: float
+
+
+@dataclass(frozen=True)
+class ReplayConfig:
+    # live: call providers; record: call providers and save responses to
+    # ``fixture_path``; replay: serve saved responses without network access.
+    mode: str
+    fixture_path: str
+    latency: Mapping[str, LatencyProfile] = field(default_factory=dict)
+    seed: int = 0
+
+
+# Override with UNAL_RAG_LLM_MODE / UNAL_RAG_LLM_FIXTURES; scale or disable the
+# synthetic latency with UNAL_RAG_REPLAY_LATENCY_SCALE (0 = no sleep).
+LLM_REPLAY = ReplayConfig(
+    mode="live",
+    fixture_path="benchmarks/fixtures/llm_responses.json",
+    latency={
+        "router": LatencyProfile(p50_s=0.35, p95_s=0.9),
+        "k_selector": LatencyProfile(p50_s=0.35, p95_s=0.9),
+        "direct": LatencyProfile(p50_s=0.8, p95_s=2.0),
+        "rag_generation": LatencyProfile(p50_s=2.5, p95_s=6.0),
+        "rag_generation_fallback": LatencyProfile(p50_s=1.5, p95_s=4.0),
+        "grounding_evaluator": LatencyProfile(p50_s=1.8, p95_s=4.5),
+        "grounding_evaluator_fallback": LatencyProfile(p50_s=1.2, p95_s=3.5),
+    },
+    seed=7,
+)
+
+
+# Paid-tier list prices, used to attribute cost per role in the usage report.
+MODEL_PRICING = {
+    "gemini-2.5-flash": TokenPrice(input_per_mtok=0.30, output_per_mtok=2.50),
+    "llama-3.1-8b-instant": TokenPrice(input_per_mtok=0.05, output_per_mtok=0.08),
+    "llama-3.3-70b-versatile": TokenPrice(input_per_mtok=0.59, output_per_mtok=0.79),
+}
+
+
+# Free-tier quotas; override with UNAL_RAG_<PROVIDER>_RPM / _TPM / _MAX_WAIT.
+PROVIDER_RATE_LIMITS = {
+    "groq": ProviderRateLimit(
+        requests_per_minute=30,
+        tokens_per_minute=6000,
+        max_queue_wait_s=15.0,
+    ),
+    "gemini": ProviderRateLimit(
+        requests_per_minute=10,
+        tokens_per_minute=250000,
+        max_queue_wait_s=30.0,
+    ),
+}
 
 
 # Fast, low-latency tasks.
 ROUTER_LLM = LLMRoleConfig(
+    name="router",
     provider="groq",
     model="llama-3.1-8b-instant",
     temperature=0.0,
@@ -20,6 +166,7 @@ ROUTER_LLM = LLMRoleConfig(
 )
 
 K_SELECTOR_LLM = LLMRoleConfig(
+    name="k_selector",
     provider="groq",
     model="llama-3.1-8b-instant",
     temperature=0.0,
@@ -27,6 +174,7 @@ K_SELECTOR_LLM = LLMRoleConfig(
 )
 
 DIRECT_LLM = LLMRoleConfig(
+    name="direct",
     provider="groq",
     model="llama-3.1-8b-instant",
     temperature=0.2,
@@ -35,15 +183,46 @@ DIRECT_LLM = LLMRoleConfig(
 
 # Reasoning/grounding tasks on retrieved context.
 RAG_GENERATION_LLM = LLMRoleConfig(
+    name="rag_generation",
     provider="gemini",
     model="gemini-2.5-flash",
     temperature=0.0,
     rationale="Sintesis controlada sobre contexto recuperado.",
+    context_token_budget=3000,
+    fallbacks=(
+        LLMRoleConfig(
+            name="rag_generation_fallback",
+            provider="groq",
+            model="llama-3.3-70b-versatile",
+            temperature=0.0,
+            rationale="Respaldo entre proveedores cuando Gemini tarda o falla.",
+        ),
+    ),
 )
 
 GROUNDING_EVALUATOR_LLM = LLMRoleConfig(
+    name="grounding_evaluator",
     provider="gemini",
     model="gemini-2.5-flash",
     temperature=0.0,
     rationale="Verificacion semantica de soporte factual y coherencia.",
+    context_token_budget=2000,
+    fallbacks=(
+        LLMRoleConfig(
+            name="grounding_evaluator_fallback",
+            provider="groq",
+            model="llama-3.3-70b-versatile",
+            temperature=0.0,
+            rationale="Respaldo entre proveedores cuando Gemini tarda o falla.",
+        ),
+    ),
+)
+
+# Primary roles in pipeline order (fallbacks hang off their primary).
+LLM_ROLES = (
+    ROUTER_LLM,
+    K_SELECTOR_LLM,
+    DIRECT_LLM,
+    RAG_GENERATION_LLM,
+    GROUNDING_EVALUATOR_LLM,
 )
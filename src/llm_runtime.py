@@ -0,0 +1,560 @@
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Mapping, TypeVar
+
+from .llm_config import (
+    CIRCUIT_BREAKER,
+    DEADLINE,
+    HEDGING,
+    LLM_REPLAY,
+    MODEL_PRICING,
+    PROVIDER_RATE_LIMITS,
+    LLMRoleConfig,
+    ProviderRateLimit,
+)
+from .unal_rag.llm.circuit_breaker import BreakerStateStore, CircuitBreaker, CircuitOpenError
+from .unal_rag.llm.hedging import DEFAULT_HEDGE_STATS_PATH, NoValidResponseError, percentile, run_hedged
+from .unal_rag.llm.rate_limit import (
+    CallCancelledError,
+    DeadlineExceededError,
+    ProviderScheduler,
+    QueueTimeoutError,
+    run_with_timeout,
+)
+from .unal_rag.llm.replay import (
+    FixtureStore,
+    LatencySampler,
+    RecordingChatModel,
+    ReplayChatModel,
+    ReplayMissError,
+)
+from .unal_rag.llm.usage import UsageStore, call_cost, request_records, run_with_usage
+from .unal_rag.utils.errors import is_provider_failure, is_rate_limit_429
+from .unal_rag.utils.json_store import SharedJsonStore, stats_flush_interval_s
+
+
+T = TypeVar("T")
+
+DEFAULT_RATE_LIMIT = ProviderRateLimit(
+    requests_per_minute=30,
+    tokens_per_minute=60000,
+    max_queue_wait_s=15.0,
+)
+# Replayed responses do not touch provider quotas.
+REPLAY_RATE_LIMIT = ProviderRateLimit(
+    requests_per_minute=60000,
+    tokens_per_minute=10**9,
+    max_queue_wait_s=15.0,
+)
+# Output tokens also count against TPM quotas; reserve a typical answer size.
+EXPECTED_OUTPUT_TOKENS = 256
+MAX_LATENCY_SAMPLES = 50
+
+_SCHEDULERS: Dict[str, ProviderScheduler] = {}
+_SCHEDULERS_LOCK = threading.Lock()
+_BREAKERS: Dict[tuple[str, str], CircuitBreaker] = {}
+# Live traffic state; record/replay runs get their own files (see ``_mode_store``).
+_BREAKER_STORE = BreakerStateStore()
+_HEDGE_STORE = SharedJsonStore(DEFAULT_HEDGE_STATS_PATH, flush_interval_s=stats_flush_interval_s())
+_MODE_STORES: Dict[tuple[Path, str], SharedJsonStore] = {}
+_FIXTURE_STORE: FixtureStore | None = None
+_USAGE_STORE = UsageStore()
+# Collects stats of calls made outside graph nodes (tools) for the node that runs them.
+_CAPTURED_CALLS: ContextVar[List[Dict[str, Any]] | None] = ContextVar(
+    "unal_rag_captured_llm_calls", default=None
+)
+_LATENCY_SAMPLERS: Dict[str, LatencySampler] = {}
+_CHAT_MODELS: Dict[tuple[str, str], Any] = {}
+# Fraction of each provider quota this process may use (pre-forked workers split it).
+_RATE_LIMIT_SHARE = 1.0
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def llm_mode() -> str:
+    """``live``, ``record`` or ``replay`` (see ``LLM_REPLAY``)."""
+    mode = os.getenv("UNAL_RAG_LLM_MODE", LLM_REPLAY.mode).strip().lower()
+    return mode if mode in ("live", "record", "replay") else "live"
+
+
+def fixture_store() -> FixtureStore:
+    global _FIXTURE_STORE
+    with _SCHEDULERS_LOCK:
+        path = Path(os.getenv("UNAL_RAG_LLM_FIXTURES", LLM_REPLAY.fixture_path))
+        if _FIXTURE_STORE is None or _FIXTURE_STORE.path != path:
+            _FIXTURE_STORE = FixtureStore(path)
+        return _FIXTURE_STORE
+
+
+def _mode_store(live: SharedJsonStore) -> SharedJsonStore:
+    """``live`` in live mode; in record/replay a store at ``<name>.<mode>.json`` next to it.
+
+    Replayed failures and synthetic latencies must not open breakers or skew
+    hedge delays for real traffic sharing the ``db/`` directory.
+    """
+    mode = llm_mode()
+    if mode == "live":
+        return live
+    with _SCHEDULERS_LOCK:
+        store = _MODE_STORES.get((live.path, mode))
+        if store is None:
+            path = live.path.with_name(f"{live.path.stem}.{mode}{live.path.suffix}")
+            store = type(live)(path, flush_interval_s=live.flush_interval_s)
+            _MODE_STORES[(live.path, mode)] = store
+        return store
+
+
+def _latency_sampler(role: LLMRoleConfig) -> LatencySampler | None:
+    profile = LLM_REPLAY.latency.get(role.name)
+    if profile is None:
+        return None
+    with _SCHEDULERS_LOCK:
+        sampler = _LATENCY_SAMPLERS.get(role.name)
+        if sampler is None:
+            sampler = LatencySampler(
+                profile.p50_s,
+                profile.p95_s,
+                scale=_env_number("UNAL_RAG_REPLAY_LATENCY_SCALE", 1.0),
+                rng=random.Random(f"{LLM_REPLAY.seed}:{role.name}"),
+            )
+            _LATENCY_SAMPLERS[role.name] = sampler
+        return sampler
+
+
+def build_chat_model(role: LLMRoleConfig):
+    """Instantiate the chat model for ``role``, honouring the record/replay mode."""
+    mode = llm_mode()
+    if mode == "replay":
+        return ReplayChatModel(role.name, fixture_store(), latency=_latency_sampler(role))
+    model = _build_provider_model(role)
+    if mode == "record":
+        return RecordingChatModel(model, role.name, fixture_store())
+    return model
+
+
+def chat_model(role: LLMRoleConfig):
+    """Process-wide chat model for ``role``; provider clients keep their HTTP connections."""
+    key = (role.name, llm_mode())
+    with _SCHEDULERS_LOCK:
+        model = _CHAT_MODELS.get(key)
+    if model is None:
+        model = build_chat_model(role)
+        with _SCHEDULERS_LOCK:
+            model = _CHAT_MODELS.setdefault(key, model)
+    return model
+
+
+def reset_chat_models() -> None:
+    with _SCHEDULERS_LOCK:
+        _CHAT_MODELS.clear()
+
+
+def _build_provider_model(role: LLMRoleConfig):
+    if role.provider == "groq":
+        from langchain_groq import ChatGroq
+
+        return ChatGroq(model=role.model, temperature=role.temperature)
+    if role.provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(
+            model=role.model,
+            temperature=role.temperature,
+            # google-genai treats 0 as falsy and falls back to default retries
+            max_retries=1,
+        )
+    raise ValueError(f"Unsupported LLM provider: {role.provider}")
+
+
+def set_rate_limit_share(share: float) -> None:
+    """Scale the RPM/TPM of schedulers created from now on (``1 / workers`` in a worker pool)."""
+    global _RATE_LIMIT_SHARE
+    with _SCHEDULERS_LOCK:
+        _RATE_LIMIT_SHARE = min(1.0, max(0.0, float(share)))
+        _SCHEDULERS.clear()
+
+
+def get_scheduler(provider: str) -> ProviderScheduler:
+    """Return the process-wide scheduler for ``provider``."""
+    with _SCHEDULERS_LOCK:
+        scheduler = _SCHEDULERS.get(provider)
+        if scheduler is None:
+            if llm_mode() == "replay":
+                limit = REPLAY_RATE_LIMIT
+            else:
+                limit = PROVIDER_RATE_LIMITS.get(provider, DEFAULT_RATE_LIMIT)
+            prefix = f"UNAL_RAG_{provider.upper()}"
+            scheduler = ProviderScheduler(
+                provider,
+                requests_per_minute=max(
+                    1, int(_env_number(f"{prefix}_RPM", limit.requests_per_minute) * _RATE_LIMIT_SHARE)
+                ),
+                tokens_per_minute=max(
+                    1, int(_env_number(f"{prefix}_TPM", limit.tokens_per_minute) * _RATE_LIMIT_SHARE)
+                ),
+                max_queue_wait_s=_env_number(f"{prefix}_MAX_WAIT", limit.max_queue_wait_s),
+                max_attempts=limit.max_attempts,
+            )
+            _SCHEDULERS[provider] = scheduler
+        return scheduler
+
+
+def get_breaker(role: LLMRoleConfig) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for ``role`` in the current LLM mode."""
+    store = _mode_store(_BREAKER_STORE)
+    key = (role.name, llm_mode())
+    with _SCHEDULERS_LOCK:
+        breaker = _BREAKERS.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                role.name,
+                failure_threshold=int(
+                    _env_number("UNAL_RAG_BREAKER_THRESHOLD", CIRCUIT_BREAKER.failure_threshold)
+                ),
+                cooldown_s=_env_number("UNAL_RAG_BREAKER_COOLDOWN", CIRCUIT_BREAKER.cooldown_s),
+                store=store,
+            )
+            _BREAKERS[key] = breaker
+        return breaker
+
+
+def is_circuit_open(role: LLMRoleConfig) -> bool:
+    """True when every candidate model of ``role`` is short-circuited."""
+    return all(get_breaker(candidate).is_open() for candidate in role.candidates)
+
+
+def skipped_call(role: LLMRoleConfig) -> Dict[str, Any]:
+    """Trace entry for a call that was not attempted because the breaker is open."""
+    return {
+        "role": role.name,
+        "provider": role.provider,
+        "model": role.model,
+        "outcome": "circuit_open",
+        "breaker": get_breaker(role).snapshot(),
+    }
+
+
+def deadline_at(budget_s: float | None = None, now: float | None = None) -> float:
+    """Absolute wall-clock deadline for a request (0.0 = none).
+
+    Wall-clock time is used because the deadline travels in checkpointed
+    state; ``None`` falls back to ``UNAL_RAG_DEADLINE`` / ``DEADLINE.default_s``.
+    """
+    if budget_s is None:
+        budget_s = _env_number("UNAL_RAG_DEADLINE", DEADLINE.default_s)
+    if budget_s <= 0:
+        return 0.0
+    return (time.time() if now is None else now) + budget_s
+
+
+def request_deadline(state: Mapping[str, Any]) -> float:
+    try:
+        return float(state.get("deadline_at", 0.0) or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def remaining_s(state: Mapping[str, Any], now: float | None = None) -> float | None:
+    """Seconds left before the request deadline, or ``None`` without one."""
+    deadline = request_deadline(state)
+    if deadline <= 0:
+        return None
+    return deadline - (time.time() if now is None else now)
+
+
+def has_budget(state: Mapping[str, Any], needed_s: float) -> bool:
+    remaining = remaining_s(state)
+    return remaining is None or remaining >= needed_s
+
+
+def record_degradation(state: Mapping[str, Any], name: str) -> List[str]:
+    """The ``degradations`` update for ``name``: ``[name]`` the first time in a request, else ``[]``."""
+    return [] if name in (state.get("degradations") or []) else [name]
+
+
+def deadline_degradation(state: Mapping[str, Any], exc: BaseException) -> List[str]:
+    """``record_degradation(state, "deadline_exceeded")`` when ``exc`` is a call cut off by the deadline."""
+    if isinstance(exc, DeadlineExceededError):
+        return record_degradation(state, "deadline_exceeded")
+    return []
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for quota accounting.
+    return max(1, len(text or "") // 4)
+
+
+def _response_text(result: Any) -> str:
+    content = getattr(result, "content", None)
+    if content is not None:
+        return content if isinstance(content, str) else str(content)
+    if hasattr(result, "model_dump_json"):
+        return result.model_dump_json()
+    return str(result)
+
+
+def _call_usage(reported: Dict[str, int] | None, prompt: str, result: Any) -> Dict[str, Any]:
+    """Provider-reported token usage, or an estimate when none was reported."""
+    if reported is None:
+        return {
+            "input_tokens": estimate_tokens(prompt),
+            "output_tokens": estimate_tokens(_response_text(result)),
+            "source": "estimate",
+        }
+    return {**reported, "source": "provider"}
+
+
+def _outcome(exc: Exception) -> str:
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, CallCancelledError):
+        return "cancelled"
+    if isinstance(exc, QueueTimeoutError):
+        return "queue_timeout"
+    if isinstance(exc, DeadlineExceededError):
+        return "deadline_exceeded"
+    if isinstance(exc, ReplayMissError):
+        return "replay_miss"
+    if is_rate_limit_429(exc):
+        return "rate_limit_429"
+    return "error"
+
+
+def invoke_llm(
+    role: LLMRoleConfig,
+    fn: Callable[[], T],
+    *,
+    prompt: str,
+    stats: Dict[str, Any] | None = None,
+    cancelled: threading.Event | None = None,
+    deadline: float = 0.0,
+) -> T:
+    """Run an LLM call for ``role`` through its circuit breaker and provider scheduler.
+
+    Raises ``CircuitOpenError`` without contacting the provider while the
+    role's breaker is open. ``deadline`` is the request's wall-clock deadline
+    (see ``deadline_at``); it caps queueing and 429 retries, and each provider
+    call is abandoned with ``DeadlineExceededError`` once it passes. Only provider
+    failures (see ``is_provider_failure``) count against the breaker; local
+    queue timeouts and cancellations give the admitted call back.
+    """
+    stats = {} if stats is None else stats
+    stats.update({"role": role.name, "provider": role.provider, "model": role.model})
+    breaker = get_breaker(role)
+    if not breaker.allow():
+        stats.update({"outcome": "circuit_open", "breaker": breaker.snapshot()})
+        raise CircuitOpenError(f"Circuit breaker open for role {role.name}.")
+    captured = _CAPTURED_CALLS.get()
+    if captured is not None:
+        captured.append(stats)
+    scheduler = get_scheduler(role.provider)
+    queue_deadline = None
+    if deadline > 0:
+        budget = min(scheduler.max_queue_wait_s, max(0.0, deadline - time.time()))
+        queue_deadline = time.monotonic() + budget
+    reported: Dict[str, Dict[str, int] | None] = {}
+
+    def _call() -> T:
+        # Re-read per attempt: 429 retries and queueing already spent part of the budget.
+        timeout_s = deadline - time.time() if deadline > 0 else None
+        value, reported["usage"] = run_with_timeout(lambda: run_with_usage(fn), timeout_s)
+        return value
+
+    try:
+        result = scheduler.run(
+            _call,
+            tokens=estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS,
+            deadline=queue_deadline,
+            stats=stats,
+            cancelled=cancelled,
+        )
+    except CallCancelledError:
+        breaker.release()
+        stats.update({"outcome": "cancelled"})
+        raise
+    except (QueueTimeoutError, DeadlineExceededError) as exc:
+        # Our own queue or the request budget ran out; the provider was never judged.
+        breaker.release()
+        stats.update({"outcome": _outcome(exc), "breaker": breaker.snapshot()})
+        raise
+    except Exception as exc:
+        # A replay miss is a gap in the fixtures, not an unhealthy provider.
+        if is_provider_failure(exc) and not isinstance(exc, ReplayMissError):
+            breaker.record_failure()
+        else:
+            breaker.release()
+        stats.update({"outcome": _outcome(exc), "breaker": breaker.snapshot()})
+        raise
+    breaker.record_success()
+    usage = _call_usage(reported.get("usage"), prompt, result)
+    price = MODEL_PRICING.get(role.model)
+    stats.update(
+        {
+            "outcome": "ok",
+            "breaker": breaker.snapshot(),
+            "usage": usage,
+            "cost_usd": round(call_cost(usage, price.input_per_mtok, price.output_per_mtok), 8)
+            if price
+            else 0.0,
+        }
+    )
+    return result
+
+
+def _hedge_delay(role: LLMRoleConfig) -> float | None:
+    if os.getenv("UNAL_RAG_HEDGING", "1" if HEDGING.enabled else "0") in ("0", "false", "no"):
+        return None
+    samples = (_mode_store(_HEDGE_STORE).get(role.name) or {}).get("latencies", [])
+    if len(samples) < HEDGING.min_samples:
+        return HEDGING.default_delay_s
+    q = _env_number("UNAL_RAG_HEDGE_PERCENTILE", HEDGING.percentile)
+    return max(HEDGING.min_delay_s, percentile(samples, q) or HEDGING.default_delay_s)
+
+
+def _record_hedge(role: LLMRoleConfig, *, winner: str | None, hedged: bool) -> Dict[str, Any]:
+    def _mutate(data: Dict[str, Any]) -> Dict[str, Any]:
+        data["requests"] = int(data.get("requests", 0)) + 1
+        data["hedged"] = int(data.get("hedged", 0)) + int(hedged)
+        wins = dict(data.get("wins", {}))
+        if winner is not None:
+            wins[winner] = int(wins.get(winner, 0)) + 1
+        else:
+            data["failures"] = int(data.get("failures", 0)) + 1
+        data["wins"] = wins
+        return data
+
+    return _mode_store(_HEDGE_STORE).update(role.name, _mutate)
+
+
+def _primary_latency_recorder(role: LLMRoleConfig) -> Callable[[float, bool], None]:
+    """Sample the primary's latency into the store the hedge delay is read from.
+
+    Censored samples (a primary abandoned for a hedge that never answered)
+    are kept at the time waited, a lower bound, so the percentile is not
+    computed on the fast calls only.
+    """
+    store = _mode_store(_HEDGE_STORE)
+
+    def _record(latency: float, censored: bool) -> None:
+        def _mutate(data: Dict[str, Any]) -> Dict[str, Any]:
+            samples = list(data.get("latencies", [])) + [round(latency, 3)]
+            data["latencies"] = samples[-MAX_LATENCY_SAMPLES:]
+            data["censored"] = int(data.get("censored", 0)) + int(censored)
+            return data
+
+        store.update(role.name, _mutate)
+
+    return _record
+
+
+def invoke_with_fallbacks(
+    role: LLMRoleConfig,
+    make_call: Callable[[LLMRoleConfig], T],
+    *,
+    prompt: str,
+    stats: Dict[str, Any] | None = None,
+    is_valid: Callable[[T], bool] = lambda value: value is not None,
+    deadline: float = 0.0,
+) -> T:
+    """Call ``role`` with hedging and failover across ``role.candidates``.
+
+    Candidates whose breaker is open are skipped. If the primary has not
+    answered by the configured latency percentile, the next candidate is fired
+    and the first valid response wins. Hedge and win counts plus primary
+    latency samples are persisted for tuning. An invalid response from the
+    only callable candidate raises ``NoValidResponseError``, as in the hedged
+    path.
+    """
+    stats = {} if stats is None else stats
+    candidates = [candidate for candidate in role.candidates if not is_circuit_open(candidate)]
+    if len(candidates) <= 1:
+        target = candidates[0] if candidates else role
+        result = invoke_llm(
+            target, lambda: make_call(target), prompt=prompt, stats=stats, deadline=deadline
+        )
+        if not is_valid(result):
+            raise NoValidResponseError(f"{target.name} returned an invalid response.")
+        return result
+
+    delay = _hedge_delay(role)
+    call_stats: List[Dict[str, Any]] = [{} for _ in candidates]
+    calls = [
+        lambda cancelled, c=candidate, s=call_stat: invoke_llm(
+            c, lambda: make_call(c), prompt=prompt, stats=s, cancelled=cancelled, deadline=deadline
+        )
+        for candidate, call_stat in zip(candidates, call_stats)
+    ]
+    primary_is_role = candidates[0] is role
+    outcome = run_hedged(
+        calls,
+        hedge_delay_s=delay,
+        is_valid=is_valid,
+        # Only the role's own primary; a fallback standing in for it has other latencies.
+        on_primary_latency=_primary_latency_recorder(role) if primary_is_role else None,
+        censor_after_s=HEDGING.censor_after_s,
+    )
+
+    winner = candidates[outcome.index] if outcome.index is not None else None
+    totals = _record_hedge(role, winner=winner.name if winner else None, hedged=outcome.hedged)
+    requests = max(1, int(totals.get("requests", 1)))
+    base = call_stats[outcome.index] if outcome.index is not None else call_stats[0]
+    stats.update(base)
+    stats.update(
+        {
+            "role": role.name,
+            "hedge": {
+                "candidates": [candidate.name for candidate in candidates],
+                "winner": winner.name if winner else None,
+                "hedged": outcome.hedged,
+                "primary_won": outcome.index == 0 and primary_is_role,
+                "delay_s": None if delay is None else round(delay, 3),
+                "started": outcome.started,
+                "cancelled": [candidates[idx].name for idx in outcome.cancelled],
+                "calls": [dict(entry) for entry in call_stats if entry],
+                "hedge_rate": round(int(totals.get("hedged", 0)) / requests, 3),
+            },
+        }
+    )
+    if outcome.error is not None:
+        raise outcome.error
+    return outcome.value
+
+
+def record_llm_call(state: Mapping[str, Any], stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The ``llm_calls`` update for one call's scheduler stats (empty when there was no call)."""
+    if not stats:
+        return []
+    return [{**stats, "iteration": int(state.get("iteration_count", 0) or 0)}]
+
+
+@contextmanager
+def capture_llm_calls() -> Iterator[List[Dict[str, Any]]]:
+    """Collect stats of ``invoke_llm`` calls made in this context (e.g. inside tools)."""
+    calls: List[Dict[str, Any]] = []
+    token = _CAPTURED_CALLS.set(calls)
+    try:
+        yield calls
+    finally:
+        _CAPTURED_CALLS.reset(token)
+
+
+def record_request_usage(state: Mapping[str, Any], *, thread_id: str = "default") -> None:
+    """Append the request's LLM usage to the cumulative usage log."""
+    try:
+        _USAGE_STORE.append(
+            request_records(state.get("llm_calls", []), intent=state.get("intent"), thread_id=thread_id)
+        )
+    except OSError:
+        pass
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import Callable
 import atexit
+import sqlite3
 
 from langgraph.graph import END, START, StateGraph
 
@@ -14,54 +16,101 @@ except Exception:  # pragma: no cover - optional dependency
 from langgraph.checkpoint.memory import MemorySaver
 
 from .nodes.evaluator import evaluate_grounding_node, route_after_evaluation
+from .nodes.followup import followup_node
 from .nodes.generator import direct_llm_node, rag_generator_node
 from .nodes.memory import memory_load_node, memory_update_node
-from .nodes.retriever import retriever_node, select_k_node
+from .nodes.retriever import documents_by_chunk_id, retriever_node, select_k_node
 from .nodes.router import classify_intent, route_by_intent
 from .nodes.tools_pre import tools_pre_node
 from .nodes.tools_post import tools_post_node
 from .state import AgentState
+from .unal_rag.checkpoints import (
+    SlimSerializer,
+    compact_checkpoints,
+    keep_checkpoints_from_env,
+    max_threads_from_env,
+    tune_connection,
+)
 
 
-def build_workflow():
-    checkpoint_path = Path("db") / "langgraph_checkpoints.sqlite"
+DEFAULT_CHECKPOINT_PATH = Path("db") / "langgraph_checkpoints.sqlite"
+
+
+def open_checkpointer(checkpoint_path: Path = DEFAULT_CHECKPOINT_PATH, *, keep_last: int | None = None):
+    """Open the graph checkpointer; returns ``(checkpointer, close)``.
+
+    Checkpoints store chunk references and compressed prompts
+    (``SlimSerializer``); ``close`` keeps the newest ``keep_last`` checkpoints
+    per thread (``UNAL_RAG_CHECKPOINT_KEEP``) of the most recently active
+    threads (``UNAL_RAG_CHECKPOINT_THREADS``) and truncates the WAL.
+    Long-lived sessions also compact periodically (``RAGSession``).
+    """
+    checkpoint_path = Path(checkpoint_path)
     checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
-    if SqliteSaver is not None:
-        cm = SqliteSaver.from_conn_string(str(checkpoint_path))
-        checkpointer = cm.__enter__()
-        atexit.register(cm.__exit__, None, None, None)
-    else:
-        checkpointer = MemorySaver()
+    serde = SlimSerializer(documents_by_chunk_id)
+    if SqliteSaver is None:
+        return MemorySaver(serde=serde), lambda: None
+    keep_last = keep_checkpoints_from_env() if keep_last is None else keep_last
+    conn = tune_connection(sqlite3.connect(str(checkpoint_path), check_same_thread=False))
+    checkpointer = SqliteSaver(conn, serde=serde)
+
+    def close() -> None:
+        try:
+            compact_checkpoints(conn, keep_last=keep_last, max_threads=max_threads_from_env())
+        finally:
+            conn.close()
+
+    return checkpointer, close
+
+
+def build_workflow(
+    node_wrapper: Callable[[str, Callable], Callable] | None = None,
+    checkpointer=None,
+):
+    """Compile the graph; ``node_wrapper(name, fn)`` can instrument every node.
+
+    Without ``checkpointer`` the default SQLite checkpointer is opened and
+    closed at interpreter exit.
+    """
+    if checkpointer is None:
+        checkpointer, close = open_checkpointer()
+        atexit.register(close)
 
     workflow = StateGraph(AgentState)
 
-    workflow.add_node("memory_load", memory_load_node)
-    workflow.add_node("memory_update", memory_update_node)
-    workflow.add_node("tools_pre", tools_pre_node)
-    workflow.add_node("intent_router", classify_intent)
-    workflow.add_node("k_selector", select_k_node)
-    workflow.add_node("retriever", retriever_node)
-    workflow.add_node("tools_post", tools_post_node)
-    workflow.add_node("rag_generator", rag_generator_node)
-    workflow.add_node("evaluator", evaluate_grounding_node)
-    workflow.add_node("direct_llm", direct_llm_node)
+    def add_node(name: str, fn: Callable) -> None:
+        workflow.add_node(name, node_wrapper(name, fn) if node_wrapper else fn)
+
+    add_node("memory_load", memory_load_node)
+    add_node("memory_update", memory_update_node)
+    add_node("tools_pre", tools_pre_node)
+    add_node("followup", followup_node)
+    add_node("intent_router", classify_intent)
+    add_node("k_selector", select_k_node)
+    add_node("retriever", retriever_node)
+    add_node("tools_post", tools_post_node)
+    add_node("rag_generator", rag_generator_node)
+    add_node("evaluator", evaluate_grounding_node)
+    add_node("direct_llm", direct_llm_node)
 
     workflow.add_edge(START, "memory_load")
     workflow.add_edge("memory_load", "memory_update")
     workflow.add_edge("memory_update", "tools_pre")
     workflow.add_conditional_edges(
         "tools_pre",
-        lambda state: "end" if state.get("tool_handled") else "intent_router",
+        lambda state: "end" if state.get("tool_handled") else "followup",
         {
             "end": END,
-            "intent_router": "intent_router",
+            "followup": "followup",
         },
     )
+    workflow.add_edge("followup", "intent_router")
     workflow.add_conditional_edges(
         "intent_router",
         route_by_intent,
         {
             "k_selector": "k_selector",
+            "retriever": "retriever",
             "direct_llm": "direct_llm",
         },
     )
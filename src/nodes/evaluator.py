@@ -1,25 +1,64 @@
 from __future__ import annotations
 
-from typing import Literal
+from typing import TYPE_CHECKING, Callable, Literal
+import atexit
 import logging
+import os
+import random
+import threading
 
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field
 
-from ..llm_config import GROUNDING_EVALUATOR_LLM
+from ..llm_config import DEADLINE, GROUNDING_EVALUATOR_LLM, RAG_GENERATION_LLM, LLMRoleConfig
+from ..llm_runtime import (
+    chat_model,
+    deadline_degradation,
+    has_budget,
+    invoke_with_fallbacks,
+    is_circuit_open,
+    record_degradation,
+    record_llm_call,
+    request_deadline,
+    skipped_call,
+)
 from ..prompt_loader import load_prompt
 from ..state import AgentState
-from .retriever import DEFAULT_K, MAX_K, MIN_K
+from .retriever import DEFAULT_K, MAX_K, MIN_K, load_embedder
+from ..unal_rag.llm.rate_limit import DeadlineExceededError
+from ..unal_rag.retrieval.context import PackedContext, default_token_counter, reuse_or_pack
+from ..unal_rag.retrieval.verifier import (
+    ACCEPT,
+    DEFAULT_PRECHECK_STATS_PATH,
+    ESCALATE,
+    PrecheckResult,
+    cited_doc_ids,
+    precheck_grounding,
+    update_precheck_stats,
+)
+from ..unal_rag.utils.json_store import SharedJsonStore, stats_flush_interval_s
 from ..unal_rag.utils.errors import is_rate_limit_429
 
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
 
 DEFAULT_MAX_ITERATIONS = 2
 RETRY_K_STEP = 2
-MAX_DOC_CHARS = 1200
+# Minimum per-claim local support score to accept without the LLM evaluator.
+PRECHECK_ACCEPT_THRESHOLD = 0.75
+# Share of local accepts re-checked by the LLM evaluator off the response
+# path, so the stats hold labelled accepts (false accepts) to tune on.
+PRECHECK_SHADOW_RATE = 0.1
+# How long process exit waits for an in-flight shadow check.
+SHADOW_EXIT_WAIT_S = 10.0
 
 load_dotenv()
 logger = logging.getLogger(__name__)
+_PRECHECK_STORE = SharedJsonStore(DEFAULT_PRECHECK_STATS_PATH, flush_interval_s=stats_flush_interval_s())
+# One shadow check at a time per process; accepts arriving meanwhile are not sampled.
+_SHADOW_SLOT = threading.BoundedSemaphore(1)
+_SHADOW_THREAD: threading.Thread | None = None
 
 
 class GroundingEvaluation(BaseModel):
@@ -36,13 +75,8 @@ class GroundingEvaluation(BaseModel):
     )
 
 
-def _evaluator_llm() -> ChatGoogleGenerativeAI:
-    return ChatGoogleGenerativeAI(
-        model=GROUNDING_EVALUATOR_LLM.model,
-        temperature=GROUNDING_EVALUATOR_LLM.temperature,
-        # google-genai treats 0 as falsy and falls back to default retries
-        max_retries=1,
-    )
+def _evaluator_llm(role: LLMRoleConfig = GROUNDING_EVALUATOR_LLM) -> BaseChatModel:
+    return chat_model(role)
 
 
 def _safe_int(value: object, default: int) -> int:
@@ -56,13 +90,6 @@ def _clamp_k(k_value: int) -> int:
     return max(MIN_K, min(MAX_K, k_value))
 
 
-def _truncate(text: str, max_chars: int = MAX_DOC_CHARS) -> str:
-    normalized = " ".join(text.split())
-    if len(normalized) <= max_chars:
-        return normalized
-    return f"{normalized[:max_chars].rstrip()}..."
-
-
 def _insufficient_evidence_answer(question: str, reason: str) -> str:
     return (
         "Evidencia insuficiente para responder con certeza usando solo el contexto recuperado.\n"
@@ -73,7 +100,6 @@ def _insufficient_evidence_answer(question: str, reason: str) -> str:
 
 
 def _append_iteration_history(
-    state: AgentState,
     *,
     iteration_count: int,
     k_value: int,
@@ -81,8 +107,8 @@ def _append_iteration_history(
     decision: str,
     reason: str,
 ) -> list[dict]:
-    history = list(state.get("iteration_history", []))
-    history.append(
+    """The ``iteration_history`` entry to append (the state reducer extends the list)."""
+    return [
         {
             "iteration": iteration_count,
             "k_value": k_value,
@@ -90,8 +116,169 @@ def _append_iteration_history(
             "decision": decision,
             "reason": reason,
         }
+    ]
+
+
+def _embed_texts(texts: list[str]) -> list[list[float]]:
+    return load_embedder().embed_documents(texts)
+
+
+def _local_precheck(state: AgentState, packed: PackedContext) -> PrecheckResult | None:
+    """Score generator claims and answer text against the cited chunks; None when disabled."""
+    if os.getenv("UNAL_RAG_PRECHECK", "1").lower() in ("0", "false", "no"):
+        return None
+    try:
+        threshold = float(os.getenv("UNAL_RAG_PRECHECK_ACCEPT", PRECHECK_ACCEPT_THRESHOLD))
+    except ValueError:
+        threshold = PRECHECK_ACCEPT_THRESHOLD
+    answer = state.get("grounded_answer")
+    if answer is None:
+        return PrecheckResult(ESCALATE, 0.0, threshold, reason="Sin texto de respuesta para verificar.")
+    support_texts = {block.number: block.text for block in packed.blocks}
+    return precheck_grounding(
+        state.get("grounded_claims", []) or [],
+        support_texts,
+        accept_threshold=threshold,
+        embed=_embed_texts,
+        answer=answer,
+    )
+
+
+def _record_precheck(
+    precheck: PrecheckResult | None, *, llm_grounded: bool | None, shadow: bool = False
+) -> None:
+    if precheck is None:
+        return
+    try:
+        _PRECHECK_STORE.update(
+            "grounding_evaluator",
+            lambda data: update_precheck_stats(data, precheck, llm_grounded=llm_grounded, shadow=shadow),
+        )
+    except Exception as exc:
+        logger.debug("Could not record grounding pre-check stats.", exc_info=exc)
+
+
+def _shadow_rate() -> float:
+    try:
+        rate = float(os.getenv("UNAL_RAG_PRECHECK_SHADOW", PRECHECK_SHADOW_RATE))
+    except ValueError:
+        rate = PRECHECK_SHADOW_RATE
+    return max(0.0, min(1.0, rate))
+
+
+def _cited_blocks(state: AgentState) -> set[int]:
+    """[DOC n] numbers the answer relies on: claim supports and citations in its text."""
+    cited = {
+        int(doc_id)
+        for claim in state.get("grounded_claims") or []
+        for doc_id in claim.get("support_doc_ids", [])
+    }
+    return cited | cited_doc_ids(state.get("grounded_answer") or "")
+
+
+def _evaluator_prompt(state: AgentState, question: str, packed: PackedContext, generation: str) -> str:
+    # Every cited block stays in, whatever the evaluator's budget; otherwise a
+    # claim supported by a trailing block would look unsupported.
+    context = packed.render(
+        max_tokens=GROUNDING_EVALUATOR_LLM.context_token_budget, keep=_cited_blocks(state)
+    )
+    return load_prompt("evaluator").format(question=question, context=context, answer=generation)
+
+
+def _run_evaluator(prompt: str, *, stats: dict, deadline: float) -> GroundingEvaluation:
+    return invoke_with_fallbacks(
+        GROUNDING_EVALUATOR_LLM,
+        lambda role: _evaluator_llm(role).with_structured_output(GroundingEvaluation).invoke(prompt),
+        prompt=prompt,
+        stats=stats,
+        deadline=deadline,
     )
-    return history
+
+
+def _shadow_verify(precheck: PrecheckResult, prompt: str) -> None:
+    try:
+        evaluation = _run_evaluator(prompt, stats={}, deadline=0.0)
+        verdict: bool | None = bool(evaluation.is_grounded and evaluation.citation_compliance)
+    except Exception as exc:
+        logger.debug("Shadow grounding check failed.", exc_info=exc)
+        verdict = None
+    finally:
+        _SHADOW_SLOT.release()
+    _record_precheck(precheck, llm_grounded=verdict, shadow=True)
+    if verdict is False:
+        logger.info(
+            "Local pre-check accepted an answer the LLM evaluator rejects (min_score=%.3f).", precheck.min_score
+        )
+
+
+def _start_shadow_check(precheck: PrecheckResult, prompt_fn: Callable[[], str]) -> bool:
+    """Re-check a sampled local accept with the LLM evaluator in the background.
+
+    Runs outside the request (its own thread and context, no deadline) and
+    records the verdict with the accept. False when not sampled or not possible.
+    """
+    global _SHADOW_THREAD
+    if random.random() >= _shadow_rate() or is_circuit_open(GROUNDING_EVALUATOR_LLM):
+        return False
+    if not _SHADOW_SLOT.acquire(blocking=False):
+        return False
+    try:
+        thread = threading.Thread(
+            target=_shadow_verify, args=(precheck, prompt_fn()), name="unal-rag-shadow-check", daemon=True
+        )
+        thread.start()
+    except Exception as exc:
+        _SHADOW_SLOT.release()
+        logger.debug("Could not start the shadow grounding check.", exc_info=exc)
+        return False
+    _SHADOW_THREAD = thread
+    return True
+
+
+@atexit.register
+def _wait_for_shadow_check() -> None:
+    if _SHADOW_THREAD is not None:
+        _SHADOW_THREAD.join(SHADOW_EXIT_WAIT_S)
+
+
+def _deadline_blocks_retry(state: AgentState, iteration_count: int, max_iterations: int) -> bool:
+    """True when a retry is still allowed by the loop but not by the request deadline."""
+    return iteration_count < max_iterations and not has_budget(state, DEADLINE.retry_min_s)
+
+
+def _skipped_evaluation(
+    state: AgentState,
+    *,
+    iteration_count: int,
+    max_iterations: int,
+    k_value: int,
+    reason: str,
+    call_stats: dict,
+    updates: AgentState,
+) -> AgentState:
+    """End the loop keeping the draft answer, flagged as not verified."""
+    iteration_history = _append_iteration_history(
+        iteration_count=iteration_count,
+        k_value=k_value,
+        is_grounded=False,
+        decision="end",
+        reason=reason,
+    )
+    evaluation_result = {"is_grounded": None, "skipped": True, "reason": reason}
+    return {
+        **updates,
+        "is_grounded": False,
+        "evaluation_skipped": True,
+        "evaluation_decision": "end",
+        "iteration_count": iteration_count,
+        "max_iterations": max_iterations,
+        "evaluation_result": evaluation_result,
+        "critique_result": evaluation_result,
+        "retry_count": iteration_count,
+        "iteration_history": iteration_history,
+        "evaluator_prompt": "",
+        "llm_calls": record_llm_call(state, call_stats),
+    }
 
 
 def evaluate_grounding_node(state: AgentState) -> AgentState:
@@ -100,12 +287,13 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
     generation = state.get("generation", "").strip()
     documents = state.get("documents", [])
     k_value = _clamp_k(_safe_int(state.get("k_value", DEFAULT_K), DEFAULT_K))
+    # Keys set along the way (degradations, pre-check) that every later return carries.
+    updates: AgentState = {}
 
     if state.get("llm_failure"):
         reason = "Fallo de conexion con LLM; no se reintenta."
         iteration_count = max(0, _safe_int(state.get("iteration_count", 0), 0))
         iteration_history = _append_iteration_history(
-            state,
             iteration_count=iteration_count,
             k_value=k_value,
             is_grounded=False,
@@ -113,7 +301,6 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             reason=reason,
         )
         return {
-            **state,
             "is_grounded": False,
             "evaluation_decision": "end",
             "evaluation_result": {"is_grounded": False, "reason": reason},
@@ -133,7 +320,6 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
         decision = "end"
         reason = "No hay pregunta o respuesta para verificar."
         iteration_history = _append_iteration_history(
-            state,
             iteration_count=iteration_count,
             k_value=k_value,
             is_grounded=False,
@@ -141,7 +327,6 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             reason=reason,
         )
         return {
-            **state,
             "is_grounded": False,
             "evaluation_decision": decision,
             "iteration_count": iteration_count,
@@ -158,13 +343,15 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
         }
 
     if not documents:
-        if iteration_count < max_iterations:
+        retry_blocked = _deadline_blocks_retry(state, iteration_count, max_iterations)
+        if retry_blocked:
+            updates["degradations"] = record_degradation(state, "skip_retry")
+        if iteration_count < max_iterations and not retry_blocked:
             next_iteration = iteration_count + 1
             next_k = _clamp_k(k_value + RETRY_K_STEP)
             decision = "retry"
             reason = "Sin documentos recuperados; se reintenta con k mas alto."
             iteration_history = _append_iteration_history(
-                state,
                 iteration_count=next_iteration,
                 k_value=next_k,
                 is_grounded=False,
@@ -172,7 +359,7 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
                 reason=reason,
             )
             return {
-                **state,
+                **updates,
                 "is_grounded": False,
                 "evaluation_decision": decision,
                 "iteration_count": next_iteration,
@@ -193,7 +380,6 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
         )
         decision = "end"
         iteration_history = _append_iteration_history(
-            state,
             iteration_count=iteration_count,
             k_value=k_value,
             is_grounded=False,
@@ -201,7 +387,7 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             reason=reason,
         )
         return {
-            **state,
+            **updates,
             "is_grounded": False,
             "evaluation_decision": decision,
             "iteration_count": iteration_count,
@@ -214,26 +400,84 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             "evaluator_prompt": "",
         }
 
-    context_blocks = []
-    for idx, doc in enumerate(documents, start=1):
-        source = str(doc.metadata.get("source", "unknown_source"))
-        context_blocks.append(
-            f"[DOC {idx}] Fuente: {source}\\n"
-            f"Contenido: {_truncate(doc.page_content)}"
+    # Same [DOC n] blocks the generator saw; the evaluator's budget only trims uncited ones.
+    packed = reuse_or_pack(
+        state.get("packed_context"),
+        documents,
+        budget_tokens=RAG_GENERATION_LLM.context_token_budget,
+    )
+
+    # Cheap local check first; the LLM evaluator only sees uncertain answers.
+    precheck = _local_precheck(state, packed)
+    if precheck is not None:
+        updates["grounding_precheck"] = precheck.to_dict()
+    if precheck is not None and precheck.decision == ACCEPT:
+        if not _start_shadow_check(precheck, lambda: _evaluator_prompt(state, question, packed, generation)):
+            _record_precheck(precheck, llm_grounded=None)
+        evaluation_result = {
+            "is_grounded": True,
+            "citation_compliance": True,
+            "reason": precheck.reason,
+            "unsupported_claims": [],
+            "verifier": "local_precheck",
+        }
+        iteration_history = _append_iteration_history(
+            iteration_count=iteration_count,
+            k_value=k_value,
+            is_grounded=True,
+            decision="end",
+            reason=precheck.reason,
         )
-    context = "\\n\\n".join(context_blocks)
+        return {
+            **updates,
+            "is_grounded": True,
+            "evaluation_decision": "end",
+            "iteration_count": iteration_count,
+            "max_iterations": max_iterations,
+            "evaluation_result": evaluation_result,
+            "critique_result": evaluation_result,
+            "retry_count": iteration_count,
+            "iteration_history": iteration_history,
+            "evaluator_prompt": "",
+        }
 
-    prompt = load_prompt("evaluator").format(
-        question=question,
-        context=context,
-        answer=generation,
-    )
+    if not has_budget(state, DEADLINE.evaluator_min_s):
+        _record_precheck(precheck, llm_grounded=None)
+        return _skipped_evaluation(
+            state,
+            iteration_count=iteration_count,
+            max_iterations=max_iterations,
+            k_value=k_value,
+            reason="Sin tiempo restante antes del deadline; respuesta sin verificar.",
+            call_stats={},
+            updates={**updates, "degradations": record_degradation(state, "skip_evaluator")},
+        )
 
+    if is_circuit_open(GROUNDING_EVALUATOR_LLM):
+        _record_precheck(precheck, llm_grounded=None)
+        return _skipped_evaluation(
+            state,
+            iteration_count=iteration_count,
+            max_iterations=max_iterations,
+            k_value=k_value,
+            reason="Evaluador no disponible (circuit breaker abierto); respuesta sin verificar.",
+            call_stats=skipped_call(GROUNDING_EVALUATOR_LLM),
+            updates=updates,
+        )
+
+    prompt = _evaluator_prompt(state, question, packed, generation)
+    prompt_tokens = {
+        **(state.get("prompt_tokens") or {}),
+        GROUNDING_EVALUATOR_LLM.name: default_token_counter().count(prompt),
+    }
+
+    call_stats: dict = {}
     try:
-        evaluation = _evaluator_llm().with_structured_output(GroundingEvaluation).invoke(prompt)
+        evaluation = _run_evaluator(prompt, stats=call_stats, deadline=request_deadline(state))
         is_grounded = bool(evaluation.is_grounded and evaluation.citation_compliance)
         reason = evaluation.reason.strip()
         unsupported_claims = [claim.strip() for claim in evaluation.unsupported_claims if claim.strip()]
+        _record_precheck(precheck, llm_grounded=is_grounded)
         evaluation_result = {
             "is_grounded": bool(evaluation.is_grounded),
             "citation_compliance": bool(evaluation.citation_compliance),
@@ -248,6 +492,18 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             GROUNDING_EVALUATOR_LLM.model,
             exc_info=exc,
         )
+        _record_precheck(precheck, llm_grounded=None)
+        if isinstance(exc, DeadlineExceededError):
+            # The draft is still usable; deliver it unverified instead of failing the request.
+            return _skipped_evaluation(
+                state,
+                iteration_count=iteration_count,
+                max_iterations=max_iterations,
+                k_value=k_value,
+                reason="El evaluador no termino antes del deadline; respuesta sin verificar.",
+                call_stats=call_stats,
+                updates={**updates, "degradations": deadline_degradation(state, exc)},
+            )
         is_grounded = False
         reason = "No fue posible ejecutar verificacion estructurada."
         unsupported_claims = []
@@ -260,7 +516,6 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
         # Do not retry on connection failure.
         iteration_count = max(0, _safe_int(state.get("iteration_count", 0), 0))
         iteration_history = _append_iteration_history(
-            state,
             iteration_count=iteration_count,
             k_value=k_value,
             is_grounded=False,
@@ -271,7 +526,7 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             "rate_limit_429" if is_rate_limit_429(exc) else "evaluator_connection_failure"
         )
         return {
-            **state,
+            **updates,
             "is_grounded": False,
             "evaluation_decision": "end",
             "iteration_count": iteration_count,
@@ -280,6 +535,8 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             "retry_count": iteration_count,
             "iteration_history": iteration_history,
             "evaluator_prompt": prompt,
+            "llm_calls": record_llm_call(state, call_stats),
+            "prompt_tokens": prompt_tokens,
             "llm_failure": True,
             "llm_failure_reason": failure_reason,
             "llm_failure_source": f"{GROUNDING_EVALUATOR_LLM.provider}:{GROUNDING_EVALUATOR_LLM.model}",
@@ -288,7 +545,6 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
     if is_grounded:
         decision = "end"
         iteration_history = _append_iteration_history(
-            state,
             iteration_count=iteration_count,
             k_value=k_value,
             is_grounded=True,
@@ -296,7 +552,7 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             reason=reason,
         )
         return {
-            **state,
+            **updates,
             "is_grounded": True,
             "evaluation_decision": decision,
             "iteration_count": iteration_count,
@@ -306,14 +562,18 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             "retry_count": iteration_count,
             "iteration_history": iteration_history,
             "evaluator_prompt": prompt,
+            "llm_calls": record_llm_call(state, call_stats),
+            "prompt_tokens": prompt_tokens,
         }
 
-    if iteration_count < max_iterations:
+    retry_blocked = _deadline_blocks_retry(state, iteration_count, max_iterations)
+    if retry_blocked:
+        updates["degradations"] = record_degradation(state, "skip_retry")
+    if iteration_count < max_iterations and not retry_blocked:
         next_iteration = iteration_count + 1
         next_k = _clamp_k(k_value + RETRY_K_STEP)
         decision = "retry"
         iteration_history = _append_iteration_history(
-            state,
             iteration_count=next_iteration,
             k_value=next_k,
             is_grounded=False,
@@ -321,7 +581,7 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             reason=reason,
         )
         return {
-            **state,
+            **updates,
             "is_grounded": False,
             "evaluation_decision": decision,
             "iteration_count": next_iteration,
@@ -332,6 +592,8 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
             "retry_count": next_iteration,
             "iteration_history": iteration_history,
             "evaluator_prompt": prompt,
+            "llm_calls": record_llm_call(state, call_stats),
+            "prompt_tokens": prompt_tokens,
         }
 
     final_generation = generation
@@ -344,7 +606,6 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
     )
     decision = "end"
     iteration_history = _append_iteration_history(
-        state,
         iteration_count=iteration_count,
         k_value=k_value,
         is_grounded=False,
@@ -353,7 +614,7 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
     )
 
     return {
-        **state,
+        **updates,
         "is_grounded": False,
         "evaluation_decision": decision,
         "iteration_count": iteration_count,
@@ -364,6 +625,8 @@ def evaluate_grounding_node(state: AgentState) -> AgentState:
         "retry_count": iteration_count,
         "iteration_history": iteration_history,
         "evaluator_prompt": prompt,
+        "llm_calls": record_llm_call(state, call_stats),
+        "prompt_tokens": prompt_tokens,
     }
 
 
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import logging
+import time
+
+from ..state import AgentState
+from ..unal_rag.retrieval.followup import decide_followup, followup_enabled, followup_thresholds, rerank
+from .retriever import DEFAULT_K, chunk_embeddings, embed_query
+from .router import RETRIEVAL_INTENTS, _is_memory_update
+
+
+logger = logging.getLogger(__name__)
+
+
+def _chunk_id(doc) -> str | None:
+    metadata = doc.metadata or {}
+    # Placeholders for chunks that could not be rehydrated have no content.
+    if metadata.get("rehydrated") is False:
+        return None
+    chunk_id = metadata.get("chunk_id")
+    return str(chunk_id) if chunk_id else None
+
+
+def followup_node(state: AgentState) -> AgentState:
+    """Detect follow-ups to the previous turn so retrieval can reuse its candidates.
+
+    Compares the question embedding with the previous question's and with the
+    stored embeddings of the cached candidate chunks. On a follow-up the
+    previous k is kept; the router still classifies the question and only the
+    k-selector is skipped (see ``route_by_intent``). Both questions are embedded
+    through the in-process cache, so no vector is written to the checkpoint.
+    """
+    started = time.time()
+    question = str(state.get("question", "")).strip()
+    last_turn = state.get("last_turn") or {}
+    candidates = [doc for doc in state.get("retrieval_candidates") or [] if _chunk_id(doc)]
+    followup = {"started_at": started, "reuse": False}
+
+    reason = ""
+    if not followup_enabled():
+        reason = "disabled"
+    elif not question or state.get("memory_updated") or _is_memory_update(question.lower()):
+        reason = "not_a_retrieval_turn"
+    elif not last_turn.get("question") or last_turn.get("intent") not in RETRIEVAL_INTENTS:
+        reason = "no_previous_turn"
+    elif not candidates:
+        reason = "no_candidates"
+    if reason:
+        return {"followup": {**followup, "reason": reason}}
+
+    try:
+        vector = embed_query(question)
+        previous_vector = embed_query(str(last_turn["question"]))
+        stored = chunk_embeddings([_chunk_id(doc) for doc in candidates])
+    except Exception as exc:
+        logger.warning("Follow-up detection failed; using fresh retrieval.", exc_info=exc)
+        return {"followup": {**followup, "reason": "error"}}
+
+    candidates = [doc for doc in candidates if _chunk_id(doc) in stored]
+    decision = decide_followup(
+        question,
+        vector,
+        previous_vector,
+        [stored[_chunk_id(doc)] for doc in candidates],
+        thresholds=followup_thresholds(),
+    )
+    followup.update(decision.to_dict())
+    followup["detect_ms"] = round(1000 * (time.time() - started), 1)
+    if not decision.reuse:
+        return {"followup": followup}
+
+    ranked = rerank(candidates, decision.chunk_similarities, len(candidates))
+    followup["ranking"] = [_chunk_id(doc) for doc in ranked]
+    return {
+        "followup": followup,
+        "k_value": last_turn.get("k_value", DEFAULT_K),
+        "selected_k_source": "followup",
+        "selected_k_reason": "Pregunta de seguimiento; se reutilizan los candidatos del turno anterior.",
+    }
+
@@ -1,37 +1,48 @@
 from __future__ import annotations
 
+from typing import TYPE_CHECKING
+
 from dotenv import load_dotenv
 import logging
 from langchain_core.documents import Document
-from langchain_groq import ChatGroq
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field
 
-from ..llm_config import DIRECT_LLM, RAG_GENERATION_LLM
+from ..llm_config import DEADLINE, DIRECT_LLM, RAG_GENERATION_LLM, LLMRoleConfig
+from ..llm_runtime import (
+    chat_model,
+    deadline_degradation,
+    has_budget,
+    invoke_llm,
+    invoke_with_fallbacks,
+    record_llm_call,
+    request_deadline,
+)
 from ..prompt_loader import load_prompt
 from ..state import AgentState
 from ..tools.plan import clarificar_plan
 from ..tools.academic_status import verificar_perdida_calidad_estudiante
+from ..unal_rag.llm.circuit_breaker import CircuitOpenError
+from ..unal_rag.llm.rate_limit import DeadlineExceededError
+from ..unal_rag.retrieval.context import default_token_counter, pack_context
 from ..unal_rag.utils.errors import is_rate_limit_429
 
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 MAX_QUOTE_CHARS = 220
-MAX_CONTEXT_CHARS = 1800
+UNREACHABLE_ANSWER = "No fue posible contactar el modelo en este momento."
+DEADLINE_ANSWER = "No alcance a generar una respuesta dentro del tiempo disponible."
 
 
-def _direct_llm() -> ChatGroq:
-    return ChatGroq(model=DIRECT_LLM.model, temperature=DIRECT_LLM.temperature)
+def _direct_llm() -> BaseChatModel:
+    return chat_model(DIRECT_LLM)
 
 
-def _rag_llm() -> ChatGoogleGenerativeAI:
-    return ChatGoogleGenerativeAI(
-        model=RAG_GENERATION_LLM.model,
-        temperature=RAG_GENERATION_LLM.temperature,
-        # google-genai treats 0 as falsy and falls back to default retries
-        max_retries=1,
-    )
+def _rag_llm(role: LLMRoleConfig = RAG_GENERATION_LLM) -> BaseChatModel:
+    return chat_model(role)
 
 
 def _source_from_doc(doc: Document) -> str:
@@ -45,13 +56,6 @@ def _quote_from_doc(doc: Document, max_chars: int = MAX_QUOTE_CHARS) -> str:
     return f"{text[:max_chars].rstrip()}..."
 
 
-def _truncate(text: str, max_chars: int = MAX_CONTEXT_CHARS) -> str:
-    normalized = " ".join(text.split())
-    if len(normalized) <= max_chars:
-        return normalized
-    return f"{normalized[:max_chars].rstrip()}..."
-
-
 def _insufficient_evidence_answer() -> str:
     return (
         "Evidencia insuficiente para responder con certeza usando solo el contexto recuperado.\n"
@@ -59,6 +63,23 @@ def _insufficient_evidence_answer() -> str:
     )
 
 
+def _require_budget(state: AgentState) -> None:
+    if not has_budget(state, DEADLINE.generator_min_s):
+        raise DeadlineExceededError("Not enough time left before the request deadline to generate.")
+
+
+def _failure_reason(exc: Exception, connection_reason: str) -> str:
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, DeadlineExceededError):
+        return "deadline_exceeded"
+    return "rate_limit_429" if is_rate_limit_429(exc) else connection_reason
+
+
+def _failure_answer(exc: Exception) -> str:
+    return DEADLINE_ANSWER if isinstance(exc, DeadlineExceededError) else UNREACHABLE_ANSWER
+
+
 def _glossary_block(memory: dict) -> str:
     glossary = memory.get("glossary") if isinstance(memory, dict) else None
     if not glossary:
@@ -152,7 +173,7 @@ def direct_llm_node(state: AgentState) -> AgentState:
     """Answer directly with an LLM, without retrieval context."""
     question = state.get("question", "").strip()
     if not question:
-        return {**state, "generation": "No recibi una pregunta para responder.", "sources": []}
+        return {"generation": "No recibi una pregunta para responder.", "sources": []}
     if _is_quality_loss_query(question):
         memory = state.get("memory", {}) or {}
         papa_value = _extract_numeric_value(question)
@@ -161,7 +182,6 @@ def direct_llm_node(state: AgentState) -> AgentState:
         result = verificar_perdida_calidad_estudiante.invoke({"papa": papa_value})
         if not result.get("tiene_dato"):
             return {
-                **state,
                 "generation": (
                     "Necesito tu PAPA actual para verificar la perdida de calidad de estudiante."
                 ),
@@ -179,7 +199,6 @@ def direct_llm_node(state: AgentState) -> AgentState:
                 f"No. Con PAPA {papa_value:.2f} (>= 3.0) no has perdido la calidad de estudiante."
             )
         return {
-            **state,
             "generation": msg,
             "sources": [],
             "generator_prompt": "",
@@ -187,7 +206,6 @@ def direct_llm_node(state: AgentState) -> AgentState:
         }
     if state.get("memory_updated"):
         return {
-            **state,
             "generation": "Listo. He guardado esa informacion en tu perfil.",
             "sources": [],
             "generator_prompt": "",
@@ -198,8 +216,16 @@ def direct_llm_node(state: AgentState) -> AgentState:
         f"{question}\n\n{glossary_block}" if glossary_block else question
     )
     prompt = load_prompt("direct_llm").format(question=question_with_glossary)
+    call_stats: dict = {}
     try:
-        response = _direct_llm().invoke(prompt)
+        _require_budget(state)
+        response = invoke_llm(
+            DIRECT_LLM,
+            lambda: _direct_llm().invoke(prompt),
+            prompt=prompt,
+            stats=call_stats,
+            deadline=request_deadline(state),
+        )
         answer = response.content if isinstance(response.content, str) else str(response.content)
     except Exception as exc:
         logger.warning(
@@ -209,26 +235,25 @@ def direct_llm_node(state: AgentState) -> AgentState:
             DIRECT_LLM.model,
             exc_info=exc,
         )
-        failure_reason = (
-            "rate_limit_429" if is_rate_limit_429(exc) else "direct_llm_connection_failure"
-        )
+        failure_reason = _failure_reason(exc, "direct_llm_connection_failure")
         return {
-            **state,
-            "generation": "No fue posible contactar el modelo en este momento.",
+            "generation": _failure_answer(exc),
             "sources": [],
             "generator_prompt": prompt,
             "final_prompt": prompt,
             "llm_failure": True,
             "llm_failure_reason": failure_reason,
             "llm_failure_source": f"{DIRECT_LLM.provider}:{DIRECT_LLM.model}",
+            "llm_calls": record_llm_call(state, call_stats),
+            "degradations": deadline_degradation(state, exc),
         }
 
     return {
-        **state,
         "generation": answer,
         "sources": [],
         "generator_prompt": prompt,
         "final_prompt": prompt,
+        "llm_calls": record_llm_call(state, call_stats),
     }
 
 
@@ -238,29 +263,27 @@ def rag_generator_node(state: AgentState) -> AgentState:
     documents = state.get("documents", [])
     retrieval_trace = state.get("retrieval_trace", [])
     if not question:
-        return {**state, "generation": "No recibi una pregunta para responder."}
+        return {"generation": "No recibi una pregunta para responder."}
     if not documents:
         return {
-            **state,
             "generation": _insufficient_evidence_answer(),
             "sources": [],
             "generator_prompt": "",
             "final_prompt": "",
         }
 
-    doc_map: dict[int, Document] = {}
-    context_blocks = []
-    for idx, doc in enumerate(documents, start=1):
-        doc_map[idx] = doc
-        source = _source_from_doc(doc)
-        chunk_id = doc.metadata.get("chunk_id", "unknown_chunk")
-        doc_id = doc.metadata.get("doc_id", source)
-        title = doc.metadata.get("title", source)
-        context_blocks.append(
-            f"[DOC {idx}] title={title} | source={source} | doc_id={doc_id} | chunk_id={chunk_id}\n"
-            f"Contenido:\n{_truncate(doc.page_content)}"
-        )
-    context = "\n\n".join(context_blocks)
+    # Packed once per iteration; the evaluator reuses it from state.
+    packed = pack_context(documents, budget_tokens=RAG_GENERATION_LLM.context_token_budget)
+    doc_map: dict[int, Document] = {
+        block.number: documents[block.doc_indices[0]] for block in packed.blocks
+    }
+    context = packed.render()
+    context_state = {
+        "packed_context": packed.to_dict(),
+        "context_trace": packed.trace(),
+        "grounded_claims": [],
+        "grounded_answer": None,
+    }
 
     # Clarify plan if multiple plan codes appear in retrieved context.
     memory = state.get("memory", {}) or {}
@@ -282,7 +305,7 @@ def rag_generator_node(state: AgentState) -> AgentState:
             "Indica el plan (por ejemplo, 3306 o 3302) y continúo."
         )
         return {
-            **state,
+            **context_state,
             "generation": clarification,
             "sources": list(dict.fromkeys(state.get("sources", []))),
             "generator_prompt": "",
@@ -296,9 +319,21 @@ def rag_generator_node(state: AgentState) -> AgentState:
         f"{question}\n\n{glossary_block}" if glossary_block else question
     )
     prompt = load_prompt(prompt_name).format(question=question_with_glossary, context=context)
+    context_state["prompt_tokens"] = {
+        **(state.get("prompt_tokens") or {}),
+        RAG_GENERATION_LLM.name: default_token_counter().count(prompt),
+    }
 
+    call_stats: dict = {}
     try:
-        parsed = _rag_llm().with_structured_output(GroundedResponse).invoke(prompt)
+        _require_budget(state)
+        parsed = invoke_with_fallbacks(
+            RAG_GENERATION_LLM,
+            lambda role: _rag_llm(role).with_structured_output(GroundedResponse).invoke(prompt),
+            prompt=prompt,
+            stats=call_stats,
+            deadline=request_deadline(state),
+        )
     except Exception as exc:
         logger.warning(
             "RAG generation LLM failed (possible rate limit or connection issue). "
@@ -307,18 +342,18 @@ def rag_generator_node(state: AgentState) -> AgentState:
             RAG_GENERATION_LLM.model,
             exc_info=exc,
         )
-        failure_reason = (
-            "rate_limit_429" if is_rate_limit_429(exc) else "rag_generation_connection_failure"
-        )
+        failure_reason = _failure_reason(exc, "rag_generation_connection_failure")
         return {
-            **state,
-            "generation": "No fue posible contactar el modelo en este momento.",
+            **context_state,
+            "generation": _failure_answer(exc),
             "sources": [],
             "generator_prompt": prompt,
             "final_prompt": prompt,
             "llm_failure": True,
             "llm_failure_reason": failure_reason,
             "llm_failure_source": f"{RAG_GENERATION_LLM.provider}:{RAG_GENERATION_LLM.model}",
+            "llm_calls": record_llm_call(state, call_stats),
+            "degradations": deadline_degradation(state, exc),
         }
 
     validated_claims = []
@@ -329,14 +364,19 @@ def rag_generator_node(state: AgentState) -> AgentState:
             cleaned_claim = _replace_doc_citations(claim.claim.strip(), doc_map)
             validated_claims.append((cleaned_claim, valid_ids))
             used_doc_ids.update(valid_ids)
+            # Raw claim (without title substitution) for the local grounding pre-check.
+            context_state["grounded_claims"].append(
+                {"claim": claim.claim.strip(), "support_doc_ids": valid_ids}
+            )
 
     if parsed.insufficient_evidence or not validated_claims:
         return {
-            **state,
+            **context_state,
             "generation": _insufficient_evidence_answer(),
             "sources": [],
             "generator_prompt": prompt,
             "final_prompt": prompt,
+            "llm_calls": record_llm_call(state, call_stats),
         }
 
     claim_lines = []
@@ -356,6 +396,8 @@ def rag_generator_node(state: AgentState) -> AgentState:
         sources.append(source)
         quote_lines.append(f'> [{title}] "{_quote_from_doc(doc)}" (source: {source})')
 
+    # Raw text (with [DOC n] citations) so the pre-check can verify the prose too.
+    context_state["grounded_answer"] = parsed.answer.strip()
     answer_text = _replace_doc_citations(parsed.answer.strip(), doc_map)
     final_answer = (
         f"{answer_text}\n\n"
@@ -367,9 +409,10 @@ def rag_generator_node(state: AgentState) -> AgentState:
     )
 
     return {
-        **state,
+        **context_state,
         "generation": final_answer,
         "sources": list(dict.fromkeys(sources)),
         "generator_prompt": prompt,
         "final_prompt": prompt,
+        "llm_calls": record_llm_call(state, call_stats),
     }
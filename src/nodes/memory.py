@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+import atexit
+import os
 import re
 from typing import Any, Dict
 
-from ..unal_rag.memory import MemoryStore
+from ..unal_rag.memory import (
+    DEFAULT_FLUSH_INTERVAL_S,
+    DEFAULT_MAX_CACHED_PROFILES,
+    DEFAULT_MAX_STALENESS_S,
+    DEFAULT_USER_ID,
+    CachedMemoryStore,
+    SqliteMemoryStore,
+)
 from ..state import AgentState
+from .retriever import start_warmup
 
 
 _PROMEDIO_RE = re.compile(
@@ -25,6 +35,32 @@ _MEMORY_INTENT_RE = re.compile(
 )
 
 
+_DEFAULT_MEMORY = {
+    "glossary": {
+        "PAPA": "Promedio Aritmético Ponderado Acumulado",
+    }
+}
+
+# Profiles are read from an in-process cache and written behind; the
+# interval can be set to 0 to write through.
+_MEMORY_STORE = CachedMemoryStore(
+    SqliteMemoryStore(),
+    flush_interval_s=float(os.getenv("UNAL_RAG_MEMORY_FLUSH_S", DEFAULT_FLUSH_INTERVAL_S)),
+    max_staleness_s=float(os.getenv("UNAL_RAG_MEMORY_STALENESS_S", DEFAULT_MAX_STALENESS_S)),
+    max_entries=int(os.getenv("UNAL_RAG_MEMORY_CACHE_SIZE", DEFAULT_MAX_CACHED_PROFILES)),
+)
+atexit.register(_MEMORY_STORE.close)
+
+
+def flush_memory() -> None:
+    """Write pending profile changes now (session shutdown)."""
+    _MEMORY_STORE.flush()
+
+
+def _user_id(state: AgentState) -> str:
+    return str(state.get("user_id") or DEFAULT_USER_ID)
+
+
 def _normalize_float(value: str) -> float:
     return float(value.replace(",", "."))
 
@@ -92,18 +128,24 @@ def _is_self_profile_update(question: str) -> bool:
     return False
 
 
+def load_profile(user_id: str = DEFAULT_USER_ID) -> Dict[str, Any]:
+    """The profile ``memory_load`` would put in state for ``user_id``."""
+    memory = _MEMORY_STORE.load(user_id)
+    return memory or {key: dict(value) for key, value in _DEFAULT_MEMORY.items()}
+
+
+def updates_memory(question: str) -> bool:
+    """True when ``memory_update`` would extract something from ``question``."""
+    return bool(_extract_profile(question) or _extract_glossary(question) or _extract_plan_code(question))
+
+
 def memory_load_node(state: AgentState) -> AgentState:
-    """Load persisted memory profile from disk into state."""
-    store = MemoryStore()
-    memory = store.load()
-    if not memory:
-        memory = {
-            "glossary": {
-                "PAPA": "Promedio Aritmético Ponderado Acumulado",
-            }
-        }
-        store.save(memory)
-    return {**state, "memory": memory}
+    """Load the user's persisted memory profile into state."""
+    # First node of every request: load the embedder and index while the
+    # router and k-selector wait on the LLM.
+    start_warmup()
+    # The default glossary is only persisted along with a real update.
+    return {"memory": load_profile(_user_id(state))}
 
 
 def memory_update_node(state: AgentState) -> AgentState:
@@ -130,6 +172,7 @@ def memory_update_node(state: AgentState) -> AgentState:
         memory["plan_code"] = plan_code
         memory_updated = memory_intent
     if updates or glossary_updates or plan_code:
-        MemoryStore().save(memory)
+        # No-op unless a value actually changed.
+        _MEMORY_STORE.save(_user_id(state), memory)
 
-    return {**state, "memory": memory, "memory_updated": memory_updated}
+    return {"memory": memory, "memory_updated": memory_updated}
@@ -1,21 +1,46 @@
 ﻿from __future__ import annotations
 
-from typing import Any
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable
 import logging
+import threading
+import time
 
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
 from pydantic import BaseModel, Field
 
-from ..llm_config import K_SELECTOR_LLM
+from ..llm_config import DEADLINE, K_SELECTOR_LLM
+from ..llm_runtime import (
+    chat_model,
+    deadline_degradation,
+    has_budget,
+    invoke_llm,
+    is_circuit_open,
+    record_degradation,
+    record_llm_call,
+    request_deadline,
+    skipped_call,
+)
 from ..prompt_loader import load_prompt
 from ..state import AgentState
+from ..unal_rag.config.settings import EMBEDDING_MODEL
+from ..unal_rag.retrieval.batching import (
+    MicroBatcher,
+    batch_window_ms_from_env,
+    cache_size_from_env,
+    max_batch_from_env,
+)
+from ..unal_rag.retrieval.followup import FOLLOWUP_EXTRA_CANDIDATES, ReuseStats
+from ..unal_rag.retrieval.warmup import WarmUp, prefetch_files, warmup_enabled
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+    from langchain_core.language_models import BaseChatModel
+    from langchain_huggingface import HuggingFaceEmbeddings
 
 
 PERSIST_DIRECTORY = "db/chroma_db"
-EMBEDDING_MODEL = "intfloat/multilingual-e5-small"
 DEFAULT_K = 4
 MIN_K = 2
 MAX_K = 8
@@ -33,13 +58,135 @@ class KSelection(BaseModel):
     )
 
 
-def _build_vectorstore() -> Chroma:
-    embeddings = HuggingFaceEmbeddings(model=EMBEDDING_MODEL)
-    return Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
+# The warm-up thread and the nodes may ask for the model or the collection at
+# the same time; the lock makes sure each is built once.
+_LOAD_LOCK = threading.RLock()
+
+
+@lru_cache(maxsize=1)
+def _load_embeddings() -> HuggingFaceEmbeddings:
+    # Imported here so compiling the graph does not pull in torch.
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model=EMBEDDING_MODEL)
+
+
+def load_embedder() -> HuggingFaceEmbeddings:
+    """The process-wide embedding model, loaded on first use.
+
+    Shared by retrieval, the local grounding pre-check and ``serve``, which
+    loads it before forking so workers share the weights.
+    """
+    with _LOAD_LOCK:
+        return _load_embeddings()
+
+
+@lru_cache(maxsize=1)
+def _load_vectorstore() -> Chroma:
+    from langchain_chroma import Chroma
+
+    return Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=load_embedder())
+
+
+def _vectorstore() -> Chroma:
+    with _LOAD_LOCK:
+        return _load_vectorstore()
+
+
+def _embed_queries(texts: list[str]) -> list[list[float]]:
+    # No query-specific encode kwargs are configured, so one embed_documents
+    # call gives each text the vector embed_query would.
+    return load_embedder().embed_documents(texts)
+
+
+_QUERY_BATCHER = MicroBatcher(
+    _embed_queries,
+    window_ms=batch_window_ms_from_env(),
+    max_batch=max_batch_from_env(),
+    cache_size=cache_size_from_env(),
+)
+
+
+def embed_query(text: str) -> list[float]:
+    """Embed a question, batched with the questions other requests embed concurrently.
+
+    Recent questions are cached in process, so nodes re-embed instead of
+    carrying vectors in checkpointed state.
+    """
+    return _QUERY_BATCHER.embed(text)
+
+
+def embedding_stats() -> Dict[str, Any]:
+    """Query embedding batch sizes, added latency and throughput in this process."""
+    return _QUERY_BATCHER.stats()
+
+
+def _warm_index() -> None:
+    # The first query loads the HNSW segment into memory.
+    _vectorstore().similarity_search_by_vector(load_embedder().embed_query("warmup"), k=1)
+
+
+_WARMUP = WarmUp(
+    [
+        ("page_cache", lambda: prefetch_files(Path(PERSIST_DIRECTORY))),
+        ("embedder", lambda: load_embedder().embed_query("warmup")),
+        ("index", _warm_index),
+    ]
+)
+
+
+def documents_by_chunk_id(chunk_ids: Iterable[str]) -> Dict[str, Any]:
+    """Fetch indexed chunks by their ``chunk_id`` metadata (checkpoint rehydration)."""
+    from langchain_core.documents import Document
 
+    chunk_ids = list(chunk_ids)
+    if not chunk_ids:
+        return {}
+    result = _vectorstore().get(where={"chunk_id": {"$in": chunk_ids}}, include=["documents", "metadatas"])
+    return {
+        str(metadata.get("chunk_id")): Document(page_content=text, metadata=dict(metadata))
+        for text, metadata in zip(result.get("documents") or [], result.get("metadatas") or [])
+        if metadata
+    }
+
+
+def chunk_embeddings(chunk_ids: Iterable[str]) -> Dict[str, list[float]]:
+    """Stored index embeddings by ``chunk_id`` (follow-up re-ranking, no re-embedding)."""
+    chunk_ids = list(chunk_ids)
+    if not chunk_ids:
+        return {}
+    result = _vectorstore().get(where={"chunk_id": {"$in": chunk_ids}}, include=["embeddings", "metadatas"])
+    embeddings = result.get("embeddings")
+    if embeddings is None:
+        return {}
+    return {
+        str(metadata.get("chunk_id")): [float(value) for value in vector]
+        for vector, metadata in zip(embeddings, result.get("metadatas") or [])
+        if metadata
+    }
+
+
+_REUSE_STATS = ReuseStats()
+
+
+def reuse_stats() -> Dict[str, Any]:
+    """Follow-up reuse rate and latency saved in this process."""
+    return _REUSE_STATS.snapshot()
+
+
+def start_warmup() -> bool:
+    """Load the embedder and the index in the background (once per process)."""
+    if not warmup_enabled():
+        return False
+    return _WARMUP.start()
+
+
+def warmup_status() -> Dict[str, Any]:
+    return _WARMUP.status()
 
-def _k_selector_llm() -> ChatGroq:
-    return ChatGroq(model=K_SELECTOR_LLM.model, temperature=K_SELECTOR_LLM.temperature)
+
+def _k_selector_llm() -> BaseChatModel:
+    return chat_model(K_SELECTOR_LLM)
 
 
 def _safe_int(value: object, default: int) -> int:
@@ -71,15 +218,33 @@ def select_k_node(state: AgentState) -> AgentState:
         "busqueda": 4,
     }
     fallback_k = fallback_by_intent.get(intent, DEFAULT_K)
+    call_stats: dict = {}
+    degradations: list[str] = []
 
     if not question:
         selected_k = fallback_k
         selected_k_source = "fallback"
         selected_k_reason = "Consulta vacia; se usa k por defecto segun intent."
+    elif is_circuit_open(K_SELECTOR_LLM):
+        call_stats = skipped_call(K_SELECTOR_LLM)
+        selected_k = fallback_k
+        selected_k_source = "fallback"
+        selected_k_reason = "Circuit breaker abierto para el selector LLM; se usa k segun intent."
+    elif not has_budget(state, DEADLINE.k_selector_min_s):
+        degradations = record_degradation(state, "skip_k_selector")
+        selected_k = fallback_k
+        selected_k_source = "deadline"
+        selected_k_reason = "Poco tiempo restante antes del deadline; se usa k segun intent."
     else:
         prompt = load_prompt("k_selector").format(intent=intent, question=question)
         try:
-            result = _k_selector_llm().with_structured_output(KSelection).invoke(prompt)
+            result = invoke_llm(
+                K_SELECTOR_LLM,
+                lambda: _k_selector_llm().with_structured_output(KSelection).invoke(prompt),
+                prompt=prompt,
+                stats=call_stats,
+                deadline=request_deadline(state),
+            )
             selected_k = _clamp_k(result.k_value)
             selected_k_source = "llm"
             selected_k_reason = "K sugerido por LLM segun intent y complejidad de la consulta."
@@ -91,6 +256,7 @@ def select_k_node(state: AgentState) -> AgentState:
                 K_SELECTOR_LLM.model,
                 exc_info=exc,
             )
+            degradations = deadline_degradation(state, exc)
             selected_k = fallback_k
             selected_k_source = "fallback"
             selected_k_reason = "Fallo selector LLM; se usa k por defecto segun intent."
@@ -99,12 +265,13 @@ def select_k_node(state: AgentState) -> AgentState:
     max_iterations = _safe_int(state.get("max_iterations", DEFAULT_MAX_ITERATIONS), DEFAULT_MAX_ITERATIONS)
 
     return {
-        **state,
         "k_value": selected_k,
         "selected_k_reason": selected_k_reason,
         "selected_k_source": selected_k_source,
         "iteration_count": max(0, iteration_count),
         "max_iterations": max(0, max_iterations),
+        "llm_calls": record_llm_call(state, call_stats),
+        "degradations": degradations,
     }
 
 
@@ -112,16 +279,35 @@ def retriever_node(state: AgentState) -> AgentState:
     """Retrieve relevant documents from vector DB for RAG intents."""
     question = state.get("question", "").strip()
     if not question:
-        return {**state, "documents": [], "sources": [], "retrieval_trace": []}
+        return {"documents": [], "sources": [], "retrieval_trace": []}
 
     k_value = _clamp_k(_safe_int(state.get("k_value", DEFAULT_K), DEFAULT_K))
+    iteration_count = _safe_int(state.get("iteration_count", 0), 0)
+    followup = dict(state.get("followup") or {})
+    fresh = False
+    # Retries after a failed evaluation always search again with the larger k.
+    reuse = bool(followup.get("reuse")) and iteration_count == 0
+    candidates: list = []
 
-    try:
-        vectorstore = _build_vectorstore()
-        documents = vectorstore.similarity_search(question, k=k_value)
-    except Exception as exc:
-        logger.warning("Vectorstore retrieval failed.", exc_info=exc)
-        documents = []
+    if reuse:
+        cached = {
+            str((doc.metadata or {}).get("chunk_id")): doc for doc in state.get("retrieval_candidates") or []
+        }
+        candidates = [cached[chunk_id] for chunk_id in followup.get("ranking", []) if chunk_id in cached]
+    else:
+        try:
+            vectorstore = _vectorstore()
+            # Usually cached: the follow-up node embedded the question already.
+            vector = embed_query(question)
+            # A few extra candidates so a follow-up turn can re-rank them.
+            candidates = vectorstore.similarity_search_by_vector(
+                vector, k=k_value + FOLLOWUP_EXTRA_CANDIDATES
+            )
+            fresh = True
+        except Exception as exc:
+            logger.warning("Vectorstore retrieval failed.", exc_info=exc)
+            candidates = []
+    documents = candidates[:k_value]
 
     raw_sources = [str(doc.metadata.get("source", "unknown_source")) for doc in documents]
     sources = list(dict.fromkeys(raw_sources))
@@ -141,10 +327,34 @@ def retriever_node(state: AgentState) -> AgentState:
             }
         )
 
-    return {
-        **state,
+    update: AgentState = {
         "documents": documents,
         "sources": sources,
         "k_value": k_value,
         "retrieval_trace": retrieval_trace,
     }
+    if not reuse:
+        update["retrieval_candidates"] = candidates
+
+    last_turn = dict(state.get("last_turn") or {})
+    if iteration_count == 0:
+        started_at = followup.get("started_at")
+        elapsed_ms = 1000 * (time.time() - started_at) if started_at else None
+        if reuse:
+            saved_ms = max(0.0, float(last_turn.get("fresh_ms") or 0.0) - (elapsed_ms or 0.0))
+            followup["saved_ms"] = round(saved_ms, 1)
+            _REUSE_STATS.record(True, saved_ms)
+        else:
+            _REUSE_STATS.record(False)
+            if elapsed_ms is not None:
+                # Route + k-select + search: what the next follow-up saves.
+                last_turn["fresh_ms"] = round(elapsed_ms, 1)
+    # The question the candidates were fetched for; the next turn re-embeds it
+    # (from the in-process cache) instead of storing a vector in the checkpoint.
+    last_turn.pop("question_embedding", None)
+    if fresh:
+        last_turn["question"] = question
+    last_turn.update({"intent": state.get("intent"), "k_value": k_value})
+    update["last_turn"] = last_turn
+    update["followup"] = followup
+    return update
@@ -1,16 +1,29 @@
 from __future__ import annotations
 
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 import logging
 
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from pydantic import BaseModel, Field
 
-from ..llm_config import ROUTER_LLM
+from ..llm_config import DEADLINE, ROUTER_LLM
+from ..llm_runtime import (
+    chat_model,
+    deadline_degradation,
+    has_budget,
+    invoke_llm,
+    is_circuit_open,
+    record_degradation,
+    record_llm_call,
+    request_deadline,
+    skipped_call,
+)
 from ..prompt_loader import load_prompt
 from ..state import AgentState
 
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
 
 RETRIEVAL_INTENTS = {"busqueda", "resumen", "comparacion"}
 VALID_INTENTS = RETRIEVAL_INTENTS | {"general"}
@@ -34,8 +47,8 @@ class IntentClassification(BaseModel):
     )
 
 
-def _router_llm() -> ChatGroq:
-    return ChatGroq(model=ROUTER_LLM.model, temperature=ROUTER_LLM.temperature)
+def _router_llm() -> BaseChatModel:
+    return chat_model(ROUTER_LLM)
 
 
 def _is_memory_update(normalized: str) -> bool:
@@ -114,42 +127,64 @@ def classify_intent(state: AgentState) -> AgentState:
     """Classify the user question and store normalized intent in state."""
     question = state.get("question", "").strip()
     if not question:
-        return {**state, "intent": "general"}
+        return {"intent": "general"}
 
     if _is_memory_update(question.lower()):
-        return {**state, "intent": "general"}
+        return {"intent": "general"}
 
-    llm = _router_llm().with_structured_output(IntentClassification)
     prompt = load_prompt("router").format(question=question)
-    try:
-        result = llm.invoke(prompt)
-        normalized = _normalize_intent(result.intent)
-    except Exception as exc:
-        logger.warning(
-            "LLM router failed (possible rate limit or connection issue). "
-            "provider=%s model=%s. Falling back to heuristic.",
-            ROUTER_LLM.provider,
-            ROUTER_LLM.model,
-            exc_info=exc,
-        )
+    call_stats: dict = {}
+    degradations: list[str] = []
+    if is_circuit_open(ROUTER_LLM):
+        # Provider is failing; go straight to the local heuristic.
+        call_stats = skipped_call(ROUTER_LLM)
         normalized = "general"
+    elif not has_budget(state, DEADLINE.router_min_s):
+        degradations = record_degradation(state, "skip_router")
+        normalized = "general"
+    else:
+        try:
+            result = invoke_llm(
+                ROUTER_LLM,
+                lambda: _router_llm().with_structured_output(IntentClassification).invoke(prompt),
+                prompt=prompt,
+                stats=call_stats,
+                deadline=request_deadline(state),
+            )
+            normalized = _normalize_intent(result.intent)
+        except Exception as exc:
+            logger.warning(
+                "LLM router failed (possible rate limit or connection issue). "
+                "provider=%s model=%s. Falling back to heuristic.",
+                ROUTER_LLM.provider,
+                ROUTER_LLM.model,
+                exc_info=exc,
+            )
+            degradations = deadline_degradation(state, exc)
+            normalized = "general"
     if normalized == "general":
         heuristic = _heuristic_intent(question)
         if heuristic:
             normalized = heuristic
-    return {**state, "intent": normalized}
+    return {
+        "intent": normalized,
+        "llm_calls": record_llm_call(state, call_stats),
+        "degradations": degradations,
+    }
+
 
+def route_by_intent(state: AgentState) -> Literal["k_selector", "retriever", "direct_llm"]:
+    """Route retrieval intents to k_selector, otherwise answer directly.
 
-def route_by_intent(state: AgentState) -> Literal["k_selector", "direct_llm"]:
-    """Route retrieval intents to k_selector, otherwise answer directly."""
+    Follow-ups the ``followup`` node chose to reuse keep the previous k and go
+    straight to the retriever.
+    """
     intent = _normalize_intent(str(state.get("intent", "")))
     question = str(state.get("question", "")).strip().lower()
     if _is_memory_update(question):
         return "direct_llm"
     if state.get("memory_updated"):
         return "direct_llm"
-    if intent in RETRIEVAL_INTENTS:
-        return "k_selector"
-    if _heuristic_intent(question) in RETRIEVAL_INTENTS:
-        return "k_selector"
+    if intent in RETRIEVAL_INTENTS or _heuristic_intent(question) in RETRIEVAL_INTENTS:
+        return "retriever" if (state.get("followup") or {}).get("reuse") else "k_selector"
     return "direct_llm"
@@ -3,6 +3,7 @@ from __future__ import annotations
 import re
 from typing import Dict
 
+from ..llm_runtime import capture_llm_calls, record_llm_call
 from ..state import AgentState
 from ..tools.academics import contar_menciones_norma, verificar_requisitos
 from ..tools.summary import resumir_norma
@@ -44,7 +45,7 @@ def tools_post_node(state: AgentState) -> AgentState:
     intent = str(state.get("intent", "")).strip().lower()
     documents = state.get("documents", [])
     if not question or not documents:
-        return {**state, "tool_handled": False}
+        return {"tool_handled": False}
 
     context = _build_context(documents)
     lowered = question.lower()
@@ -53,7 +54,6 @@ def tools_post_node(state: AgentState) -> AgentState:
         term = _extract_term(question)
         if not term:
             return {
-                **state,
                 "generation": "Indica el termino exacto a contar, por ejemplo: \"cancelacion\".",
                 "tool_handled": True,
                 "tool_name": "contar_menciones_norma",
@@ -62,7 +62,6 @@ def tools_post_node(state: AgentState) -> AgentState:
             }
         count = contar_menciones_norma.invoke({"texto": context, "termino": term})
         return {
-            **state,
             "generation": f'El termino "{term}" aparece {count} veces en el contexto recuperado.',
             "tool_handled": True,
             "tool_name": "contar_menciones_norma",
@@ -71,9 +70,10 @@ def tools_post_node(state: AgentState) -> AgentState:
         }
 
     if intent == "resumen":
-        summary = resumir_norma.invoke({"contexto": context, "pregunta": question})
+        with capture_llm_calls() as calls:
+            summary = resumir_norma.invoke({"contexto": context, "pregunta": question})
         return {
-            **state,
+            "llm_calls": [entry for call_stats in calls for entry in record_llm_call(state, call_stats)],
             "generation": summary,
             "tool_handled": True,
             "tool_name": "resumir_norma",
@@ -91,7 +91,6 @@ def tools_post_node(state: AgentState) -> AgentState:
         }
         if not requisitos or all(v is None for v in perfil.values()):
             return {
-                **state,
                 "generation": "No tengo suficientes datos de requisitos o tu perfil para verificar.",
                 "tool_handled": True,
                 "tool_name": "verificar_requisitos",
@@ -105,7 +104,6 @@ def tools_post_node(state: AgentState) -> AgentState:
             faltantes = ", ".join(result.get("faltantes", []))
             msg = f"No cumples los requisitos. Faltantes: {faltantes}."
         return {
-            **state,
             "generation": msg,
             "tool_handled": True,
             "tool_name": "verificar_requisitos",
@@ -113,4 +111,4 @@ def tools_post_node(state: AgentState) -> AgentState:
             "final_prompt": "tool: verificar_requisitos",
         }
 
-    return {**state, "tool_handled": False}
+    return {"tool_handled": False}
@@ -58,7 +58,7 @@ def _is_personal_query(text: str) -> bool:
 def tools_pre_node(state: AgentState) -> AgentState:
     question = str(state.get("question", "")).strip()
     if not question:
-        return {**state, "tool_handled": False}
+        return {"tool_handled": False}
 
     lowered = question.lower()
 
@@ -77,7 +77,6 @@ def tools_pre_node(state: AgentState) -> AgentState:
         result = verificar_perdida_calidad_estudiante.invoke({"papa": papa_value})
         if not result.get("tiene_dato"):
             return {
-                **state,
                 "generation": (
                     "Necesito tu PAPA actual para verificar la perdida de calidad de estudiante."
                 ),
@@ -96,7 +95,6 @@ def tools_pre_node(state: AgentState) -> AgentState:
                 f"No. Con PAPA {papa_value:.2f} (>= 3.0) no has perdido la calidad de estudiante."
             )
         return {
-            **state,
             "generation": msg,
             "tool_handled": True,
             "tool_name": "verificar_perdida_calidad_estudiante",
@@ -110,7 +108,6 @@ def tools_pre_node(state: AgentState) -> AgentState:
         if len(nums) >= 2:
             value = calcular_promedio.invoke({"notas": nums})
             return {
-                **state,
                 "generation": f"El promedio es {value:.2f}.",
                 "tool_handled": True,
                 "tool_name": "calcular_promedio",
@@ -123,7 +120,6 @@ def tools_pre_node(state: AgentState) -> AgentState:
         req, ap = _extract_creditos(lowered)
         if req is None or ap is None:
             return {
-                **state,
                 "generation": (
                     "Indica creditos requeridos y creditos aprobados para calcular faltantes."
                 ),
@@ -136,7 +132,6 @@ def tools_pre_node(state: AgentState) -> AgentState:
             {"creditos_requeridos": req, "creditos_aprobados": ap}
         )
         return {
-            **state,
             "generation": f"Te faltan {faltan} creditos.",
             "tool_handled": True,
             "tool_name": "calcular_creditos_faltantes",
@@ -153,7 +148,6 @@ def tools_pre_node(state: AgentState) -> AgentState:
             dias = int(nums[-1])
         if not fecha or dias is None:
             return {
-                **state,
                 "generation": "Indica fecha de inicio (YYYY-MM-DD) y numero de dias.",
                 "tool_handled": True,
                 "tool_name": "calcular_plazo",
@@ -162,7 +156,6 @@ def tools_pre_node(state: AgentState) -> AgentState:
             }
         fecha_limite = calcular_plazo.invoke({"fecha_inicio": fecha, "dias": dias})
         return {
-            **state,
             "generation": f"La fecha limite es {fecha_limite}.",
             "tool_handled": True,
             "tool_name": "calcular_plazo",
@@ -170,4 +163,4 @@ def tools_pre_node(state: AgentState) -> AgentState:
             "final_prompt": "tool: calcular_plazo",
         }
 
-    return {**state, "tool_handled": False}
+    return {"tool_handled": False}
@@ -1,18 +1,32 @@
-from typing import Any, Dict, List, TypedDict
+from typing import Annotated, Any, Dict, List, TypedDict
 
 from langchain_core.documents import Document
 
+from .unal_rag.utils.traces import extend_trace
+
 
 class AgentState(TypedDict, total=False):
     # User question
     question: str
 
+    # Owner of the memory profile (defaults to the conversation thread)
+    user_id: str
+
     # Classified intent: busqueda, resumen, comparacion, general
     intent: str
 
     # Retrieved chunks from the vector DB
     documents: List[Document]
 
+    # Candidate pool of the last fresh search (k plus a few extra), kept across
+    # turns so a follow-up question can re-rank it instead of searching again
+    retrieval_candidates: List[Document]
+
+    # Previous retrieval turn (question text, intent, k, fresh-path latency; no
+    # vectors) and this turn's follow-up decision (reuse, similarities, saved_ms)
+    last_turn: Dict[str, Any]
+    followup: Dict[str, Any]
+
     # LLM-generated answer
     generation: str
 
@@ -37,17 +51,32 @@ class AgentState(TypedDict, total=False):
     # Retrieved chunk-level traceability
     retrieval_trace: List[Dict[str, Any]]
 
+    # Token-budgeted context packed once per iteration (shared by generator/evaluator)
+    packed_context: Dict[str, Any]
+    context_trace: Dict[str, Any]
+    prompt_tokens: Dict[str, int]
+
     # Final prompt sent to generator/evaluator
     generator_prompt: str
     evaluator_prompt: str
 
+    # Claims with their [DOC n] support, the raw answer text they accompany
+    # (None when the generator produced no grounded answer), and the local
+    # pre-check verdict on both
+    grounded_claims: List[Dict[str, Any]]
+    grounded_answer: str | None
+    grounding_precheck: Dict[str, Any]
+
+    # True when the evaluator did not run and the answer is unverified
+    evaluation_skipped: bool
+
     # Last evaluator output for auditing
     evaluation_result: Dict[str, Any]
     critique_result: Dict[str, Any]
     retry_count: int
 
-    # Per-iteration loop history
-    iteration_history: List[Dict[str, Any]]
+    # Per-iteration loop history (append-only)
+    iteration_history: Annotated[List[Dict[str, Any]], extend_trace]
 
     # Final prompt used for generation (direct or RAG)
     final_prompt: str
@@ -65,3 +94,12 @@ class AgentState(TypedDict, total=False):
     llm_failure: bool
     llm_failure_reason: str
     llm_failure_source: str
+
+    # Wall-clock request deadline (epoch seconds, 0 = none) and the
+    # degradations fired to meet it: skip_router, skip_k_selector, skip_retry,
+    # skip_evaluator, deadline_exceeded (a provider call was abandoned)
+    deadline_at: float
+    degradations: Annotated[List[str], extend_trace]
+
+    # Per-call LLM scheduling trace (role, queue depth, wait time, attempts), append-only
+    llm_calls: Annotated[List[Dict[str, Any]], extend_trace]
@@ -2,9 +2,9 @@ from __future__ import annotations
 
 from langchain_core.tools import tool
 import logging
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 from ..llm_config import RAG_GENERATION_LLM
+from ..llm_runtime import chat_model, invoke_llm
 from ..unal_rag.utils.errors import is_rate_limit_429
 from ..prompt_loader import load_prompt
 
@@ -13,15 +13,10 @@ from ..prompt_loader import load_prompt
 def resumir_norma(contexto: str, pregunta: str) -> str:
     """Genera un resumen usando el contexto recuperado."""
     logger = logging.getLogger(__name__)
-    llm = ChatGoogleGenerativeAI(
-        model=RAG_GENERATION_LLM.model,
-        temperature=RAG_GENERATION_LLM.temperature,
-        # google-genai treats 0 as falsy and falls back to default retries
-        max_retries=1,
-    )
+    llm = chat_model(RAG_GENERATION_LLM)
     prompt = load_prompt("rag_summary").format(question=pregunta, context=contexto)
     try:
-        response = llm.invoke(prompt)
+        response = invoke_llm(RAG_GENERATION_LLM, lambda: llm.invoke(prompt), prompt=prompt)
         return response.content if isinstance(response.content, str) else str(response.content)
     except Exception as exc:
         logger.warning(
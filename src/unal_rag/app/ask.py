@@ -1,17 +1,17 @@
 from __future__ import annotations
 
-import sys
 import json
 from pathlib import Path
 
 from ..config.settings import Settings
+from ..llm.usage import usage_totals
+from ..session import DraftAnswer, RAGSession
+from ..utils.metrics import format_table
+from ..utils.profiling import Profiler, default_profile_prefix
+from ..utils.resources import MemoryTracker, checkpoint_sizes, memory_summary
 
 
-def _ensure_repo_root_on_path() -> None:
-    # Add repo root so `import src.main` works when running CLI from repo.
-    repo_root = Path(__file__).resolve().parents[3]
-    if str(repo_root) not in sys.path:
-        sys.path.insert(0, str(repo_root))
+PROFILE_COLUMNS = ("section", "calls", "wall_ms", "cpu_ms", "share", "samples", "top")
 
 
 def run_ask(
@@ -20,37 +20,52 @@ def run_ask(
     question: str | None,
     max_iterations: int,
     trace: bool = False,
+    memory_trace: bool = False,
     reset_memory: bool = False,
+    deadline_s: float | None = None,
+    profile: str | None = None,
+    profile_output: str | None = None,
+    two_phase: bool = False,
 ) -> int:
     _ = settings
     if not question or not question.strip():
         print("Provide a question, e.g. `unal-rag ask \"Tu pregunta\"`.")
         return 1
 
-    _ensure_repo_root_on_path()
+    if reset_memory:
+        _reset_memory_storage()
+
+    # tracemalloc slows every allocation, so per-node tracking is opt-in.
+    trace = trace or memory_trace
+    memory = MemoryTracker() if memory_trace else None
     try:
-        from src.main import build_workflow
+        session = RAGSession(
+            max_iterations=max_iterations,
+            deadline_s=deadline_s,
+            profile=profile,
+            profile_output=profile_output or default_profile_prefix("ask"),
+            node_wrapper=memory.wrap if memory else None,
+        )
     except Exception as exc:
         print(f"Failed to import workflow: {exc}")
         return 1
 
-    if reset_memory:
-        _reset_memory_storage()
+    with session:
+        if memory:
+            memory.start()
+        answer = session.ask(question, on_draft=_print_draft if two_phase else None)
+        if memory:
+            memory.stop()
+        result = answer.state
+        started, request_deadline = answer.started_at, answer.deadline_at
+        checkpoints = checkpoint_sizes(session.graph, session.config()) if trace else []
 
-    graph = build_workflow()
-    result = graph.invoke(
-        {
-            "question": question.strip(),
-            "iteration_count": 0,
-            "max_iterations": max(0, int(max_iterations)),
-            "llm_failure": False,
-            "llm_failure_reason": "",
-            "llm_failure_source": "",
-        },
-        config={"configurable": {"thread_id": "default"}},
-    )
-
-    print(result.get("generation", ""))
+    if answer.draft is not None:
+        _print_verdict(answer.verdict, replaced=answer.draft_replaced, answer=answer.answer)
+    else:
+        print(result.get("generation", ""))
+    if result.get("evaluation_skipped"):
+        print("\n(Respuesta sin verificacion de grounding.)")
     sources = result.get("sources", [])
     if sources:
         print("\nSources:")
@@ -63,21 +78,66 @@ def run_ask(
             "selected_k_reason": result.get("selected_k_reason"),
             "selected_k_source": result.get("selected_k_source"),
             "retrieved_chunks": result.get("retrieval_trace", []),
+            "context": result.get("context_trace"),
+            "prompt_tokens": result.get("prompt_tokens", {}),
             "final_prompt": result.get("final_prompt") or result.get("generator_prompt"),
             "critique_result": result.get("critique_result") or result.get("evaluation_result"),
+            "grounding_precheck": result.get("grounding_precheck"),
             "retry_count": result.get("retry_count", result.get("iteration_count")),
+            "llm_calls": result.get("llm_calls", []),
+            "usage": usage_totals(result.get("llm_calls", [])),
+            "evaluation_skipped": bool(result.get("evaluation_skipped")),
+            "verdict": answer.verdict,
+            "draft": answer.draft.to_dict() if answer.draft else None,
+            "deadline": {
+                "budget_s": round(request_deadline - started, 3) if request_deadline else None,
+                "elapsed_s": round(answer.elapsed_s, 3),
+                "degradations": result.get("degradations", []),
+            },
+            "warmup": session.warmup_status(),
+            "embedding": session.embedding_stats(),
+            "followup": {
+                **(result.get("followup") or {}),
+                "stats": session.followup_stats(),
+            },
+            "memory": memory_summary(memory, checkpoints),
         }
+        if session.profiler:
+            trace_payload["profile"] = session.profiler.breakdown()
         print("\nTrace:")
         print(json.dumps(trace_payload, ensure_ascii=False, indent=2))
+    if session.profiler:
+        _report_profile(session.profiler, session.profile_paths)
     return 0
 
 
-def _reset_memory_storage() -> None:
-    from pathlib import Path
+def _print_draft(draft: DraftAnswer) -> None:
+    print(draft.answer)
+    print(f"\n(Borrador pendiente de verificacion, {draft.elapsed_s:.1f}s.)", flush=True)
 
-    memory_path = Path("db") / "memory.json"
-    checkpoint_path = Path("db") / "langgraph_checkpoints.sqlite"
-    for path in (memory_path, checkpoint_path):
+
+def _print_verdict(verdict: str | None, *, replaced: bool, answer: str) -> None:
+    if not replaced:
+        if verdict == "grounded":
+            print("\nVerificacion: respuesta fundamentada en las fuentes.")
+        return
+    print("\nVerificacion: el borrador no se pudo sustentar; respuesta final:\n")
+    print(answer)
+
+
+def _report_profile(profiler: Profiler, written: list[Path]) -> None:
+    print(f"\nProfile ({profiler.mode}, {profiler.elapsed_s:.2f}s):")
+    print(format_table(profiler.breakdown(), PROFILE_COLUMNS))
+    for path in written:
+        print(f"Profile written to {path}")
+
+
+def _reset_memory_storage() -> None:
+    paths = [Path("db") / "memory.json"]
+    # SQLite WAL databases leave -wal/-shm sidecars that a fresh file must not inherit.
+    for database in (Path("db") / "memory.sqlite3", Path("db") / "langgraph_checkpoints.sqlite"):
+        paths += [database, database.with_name(f"{database.name}-wal"), database.with_name(f"{database.name}-shm")]
+    for path in paths:
         try:
             if path.exists():
                 path.unlink()
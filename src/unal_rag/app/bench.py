@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, TypeVar
+
+from ..config.settings import Settings
+from ..retrieval.batching import MicroBatcher, batch_window_ms_from_env, max_batch_from_env
+from ..session import runtime
+from ..utils.metrics import format_table, latency_summary
+
+
+T = TypeVar("T")
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+DEFAULT_BENCH_DIR = Path("db") / "bench"
+DEFAULT_BENCH_KS = (1, 4, 8, 16)
+DEFAULT_REPEAT = 10
+# Warm import budget per CLI entry point (the handler module of each subcommand)
+# and for the compiled graph; a probe over budget fails the bench.
+IMPORT_TARGETS = {
+    "import_cli": ("unal_rag.app.cli", 0.3),
+    "import_doctor": ("unal_rag.app.doctor", 0.3),
+    "import_ingest": ("unal_rag.app.ingest", 0.3),
+    "import_ask": ("unal_rag.app.ask", 0.3),
+    "import_eval_retrieval": ("unal_rag.app.eval_retrieval", 0.3),
+    "import_usage": ("unal_rag.app.usage", 0.3),
+    "import_graph": ("src.main", 3.0),
+}
+PROVIDER_KEYS = {"groq": "GROQ_API_KEY", "gemini": "GOOGLE_API_KEY"}
+PROBE_QUERY = "requisitos para cancelar el semestre"
+# Simultaneous questions in the micro-batched embedding probe.
+CONCURRENT_QUERIES = 16
+TABLE_COLUMNS = ("probe", "cold_ms", "p50_ms", "p95_ms", "n", "note")
+
+
+def _timed(fn: Callable[[], T]) -> tuple[T, float]:
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def probe_row(name: str, cold_s: float | None, warm_s: Sequence[float] = (), note: str = "") -> Dict[str, Any]:
+    """One report row: the first (cold) timing plus warm percentiles."""
+    summary = latency_summary(warm_s)
+    return {
+        "probe": name,
+        "cold_ms": None if cold_s is None else round(1000 * cold_s, 2),
+        "p50_ms": summary["p50_ms"],
+        "p95_ms": summary["p95_ms"],
+        "n": summary["count"],
+        "note": note,
+    }
+
+
+def _error_row(name: str, exc: BaseException) -> Dict[str, Any]:
+    return {**probe_row(name, None), "note": f"error: {exc}", "error": True}
+
+
+def _import_seconds(module: str) -> float:
+    """Import ``module`` in a fresh interpreter so nothing is already loaded."""
+    code = f"import time; s = time.perf_counter(); import {module}; print(time.perf_counter() - s)"
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(REPO_ROOT), str(REPO_ROOT / "src"), env.get("PYTHONPATH", "")]
+    ).rstrip(os.pathsep)
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=str(REPO_ROOT),
+        env=env,
+        check=False,
+    )
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines() or ["import failed"]
+        raise RuntimeError(lines[-1])
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+def bench_imports(repeat: int) -> List[Dict[str, Any]]:
+    rows = []
+    for name, (module, budget_s) in IMPORT_TARGETS.items():
+        try:
+            # The first run also pays for reading .py/.pyc files from a cold page cache.
+            samples = [_import_seconds(module) for _ in range(max(2, min(repeat, 5)))]
+        except Exception as exc:
+            rows.append(_error_row(name, exc))
+            continue
+        row = probe_row(name, samples[0], samples[1:], note=f"{module} budget={1000 * budget_s:.0f}ms")
+        if row["p50_ms"] > 1000 * budget_s:
+            row.update({"note": f"{row['note']} OVER BUDGET", "error": True})
+        rows.append(row)
+    return rows
+
+
+def bench_retrieval(settings: Settings, repeat: int, ks: Sequence[int]) -> List[Dict[str, Any]]:
+    from ..config.settings import EMBEDDING_MODEL
+
+    rows = []
+    try:
+        start = time.perf_counter()
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        rows.append(probe_row("import_embedder", time.perf_counter() - start, note="langchain_huggingface"))
+        embeddings, load_s = _timed(lambda: HuggingFaceEmbeddings(model=EMBEDDING_MODEL))
+        rows.append(probe_row("model_load", load_s, note=EMBEDDING_MODEL))
+        vector, cold_s = _timed(lambda: embeddings.embed_query(PROBE_QUERY))
+        warm = [_timed(lambda: embeddings.embed_query(PROBE_QUERY))[1] for _ in range(repeat)]
+        rows.append(probe_row("embed_query", cold_s, warm, note=f"dim={len(vector)}"))
+        rows.append(bench_query_batching(embeddings, repeat))
+    except Exception as exc:
+        rows.append(_error_row("embedder", exc))
+        return rows
+
+    index_path = settings.vectorstore_path
+    if not index_path.exists():
+        rows.append({**probe_row("vector_search", None), "note": f"skipped: no index at {index_path}"})
+        return rows
+    try:
+        from langchain_chroma import Chroma
+
+        vectorstore, open_s = _timed(
+            lambda: Chroma(persist_directory=str(index_path), embedding_function=embeddings)
+        )
+        rows.append(probe_row("index_open", open_s, note=str(index_path)))
+        for k in sorted(set(ks)):
+            # Search by vector so the timing excludes query embedding.
+            _, cold_s = _timed(lambda: vectorstore.similarity_search_by_vector(vector, k=k))
+            warm = [_timed(lambda: vectorstore.similarity_search_by_vector(vector, k=k))[1] for _ in range(repeat)]
+            rows.append(probe_row(f"vector_search_k{k}", cold_s, warm))
+    except Exception as exc:
+        rows.append(_error_row("vector_search", exc))
+    return rows
+
+
+def bench_query_batching(embeddings: Any, repeat: int, concurrency: int = CONCURRENT_QUERIES) -> Dict[str, Any]:
+    """Time a burst of ``concurrency`` simultaneous questions through the query micro-batcher."""
+    batcher = MicroBatcher(
+        embeddings.embed_documents, window_ms=batch_window_ms_from_env(), max_batch=max_batch_from_env()
+    )
+    questions = [f"{PROBE_QUERY} {index}" for index in range(concurrency)]
+
+    def _burst() -> None:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(batcher.embed, questions))
+
+    _, cold_s = _timed(_burst)
+    warm = [_timed(_burst)[1] for _ in range(repeat)]
+    stats = batcher.stats()
+    note = (
+        f"batch mean={stats['mean_batch']} added_ms={stats['added_ms_mean']} "
+        f"texts/s={stats['texts_per_s']}"
+    )
+    return probe_row(f"embed_query_x{concurrency}", cold_s, warm, note=note)
+
+
+def bench_checkpointer(checkpoint_path: Path, repeat: int) -> List[Dict[str, Any]]:
+    if not checkpoint_path.exists():
+        return [{**probe_row("checkpointer_open", None), "note": f"skipped: {checkpoint_path} not found"}]
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except Exception as exc:
+        return [_error_row("checkpointer_open", exc)]
+
+    def _open_and_read() -> None:
+        with SqliteSaver.from_conn_string(str(checkpoint_path)) as saver:
+            saver.get_tuple({"configurable": {"thread_id": "default"}})
+
+    try:
+        _, cold_s = _timed(_open_and_read)
+        warm = [_timed(_open_and_read)[1] for _ in range(repeat)]
+    except Exception as exc:
+        return [_error_row("checkpointer_open", exc)]
+    return [probe_row("checkpointer_open", cold_s, warm, note="open + latest checkpoint")]
+
+
+def bench_llm_roles() -> List[Dict[str, Any]]:
+    """One round trip per configured role whose provider key is set."""
+    try:
+        roles = runtime("llm_config").LLM_ROLES
+        build_chat_model = runtime("llm_runtime").build_chat_model
+    except Exception as exc:
+        return [_error_row("llm", exc)]
+
+    rows = []
+    for role in roles:
+        name = f"llm_{role.name}"
+        key = PROVIDER_KEYS.get(role.provider)
+        if key and not os.getenv(key):
+            rows.append({**probe_row(name, None), "note": f"skipped: {key} not set"})
+            continue
+        try:
+            model = build_chat_model(role)
+            _, round_trip_s = _timed(lambda: model.invoke("Responde solo con la palabra: ok"))
+        except Exception as exc:
+            rows.append(_error_row(name, exc))
+            continue
+        rows.append(probe_row(name, round_trip_s, note=f"{role.provider}/{role.model}"))
+    return rows
+
+
+def host_info() -> Dict[str, Any]:
+    return {
+        "hostname": socket.gethostname(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_bench(
+    settings: Settings,
+    *,
+    repeat: int = DEFAULT_REPEAT,
+    ks: Sequence[int] = DEFAULT_BENCH_KS,
+    llm: bool = True,
+    output: str | None = None,
+) -> int:
+    repeat = max(1, int(repeat))
+    rows = bench_imports(repeat)
+    rows += bench_retrieval(settings, repeat, ks)
+    rows += bench_checkpointer(Path("db") / "langgraph_checkpoints.sqlite", repeat)
+    if llm:
+        rows += bench_llm_roles()
+
+    print(format_table(rows, TABLE_COLUMNS))
+    print(f"\ncold = first call in this process (imports: first fresh interpreter); p50/p95 over {repeat} warm calls.")
+
+    host = host_info()
+    output_path = (
+        Path(output)
+        if output
+        else DEFAULT_BENCH_DIR / f"doctor-bench-{host['hostname']}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(
+        json.dumps({"host": host, "repeat": repeat, "probes": rows}, ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    print(f"Report written to {output_path}")
+    return 1 if any(row.get("error") for row in rows) else 0
@@ -5,29 +5,64 @@ import sys
 
 from ..config.settings import load_settings
 from ..config.logging import configure_logging
-from ..config.logging import configure_logging
-from .ask import run_ask
-from .doctor import run_doctor
-from .ingest import run_ingest
+from ..utils.profiling import PROFILE_MODES
+# Only constants at module level: subcommand implementations are imported in
+# their handlers so `unal-rag doctor` does not pay for ingestion or the graph.
+from .eval_retrieval import DEFAULT_FETCH_K, RETRIEVAL_MODES
+from .usage import GROUP_KEYS
 
 
 def _handle_doctor(args: argparse.Namespace) -> int:
+    from .doctor import run_doctor
+
     settings = load_settings()
-    return run_doctor(settings, strict=args.strict)
+    return run_doctor(
+        settings,
+        strict=args.strict,
+        resources=args.resources,
+        bench=args.bench,
+        bench_options={
+            "repeat": args.repeat,
+            "ks": [int(k) for k in args.k.split(",") if k.strip()],
+            "llm": not args.no_llm,
+            "output": args.output,
+        },
+    )
 
 
 def _handle_ingest(args: argparse.Namespace) -> int:
     settings = load_settings()
+    if args.sweep:
+        from .ingest_sweep import run_ingest_sweep
+
+        return run_ingest_sweep(
+            settings,
+            docs_path=args.docs_path,
+            vectorstore_path=args.vectorstore_path,
+            chunk_sizes=args.chunk_sizes,
+            chunk_overlaps=args.chunk_overlaps,
+            sweep_dir=args.sweep_dir,
+            questions_path=args.questions,
+            k=args.k,
+            promote=args.promote,
+            output=args.output,
+        )
+    from .ingest import run_ingest
+
     return run_ingest(
         settings,
         docs_path=args.docs_path,
         vectorstore_path=args.vectorstore_path,
         chunk_size=args.chunk_size,
         chunk_overlap=args.chunk_overlap,
+        profile=args.profile_mode if args.profile else None,
+        profile_output=args.profile_output,
     )
 
 
 def _handle_ask(args: argparse.Namespace) -> int:
+    from .ask import run_ask
+
     settings = load_settings()
     configure_logging(verbose_http=args.trace)
     return run_ask(
@@ -35,7 +70,73 @@ def _handle_ask(args: argparse.Namespace) -> int:
         question=args.question,
         max_iterations=args.max_iterations,
         trace=args.trace,
+        memory_trace=args.memory,
         reset_memory=args.reset_memory,
+        deadline_s=args.deadline,
+        two_phase=args.two_phase,
+        profile=args.profile_mode if args.profile else None,
+        profile_output=args.profile_output,
+    )
+
+
+def _handle_serve(args: argparse.Namespace) -> int:
+    from .serve import run_serve
+
+    settings = load_settings()
+    return run_serve(
+        settings,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        threads=args.threads,
+        max_iterations=args.max_iterations,
+        deadline_s=args.deadline,
+    )
+
+
+def _handle_eval_retrieval(args: argparse.Namespace) -> int:
+    from .eval_retrieval import run_eval_retrieval
+
+    settings = load_settings()
+    return run_eval_retrieval(
+        settings,
+        questions_path=args.questions,
+        index_paths=args.index,
+        ks=args.k,
+        modes=args.mode,
+        fetch_k=args.fetch_k,
+        output=args.output,
+        followup_pairs_path=args.followup_pairs,
+    )
+
+
+def _handle_usage(args: argparse.Namespace) -> int:
+    from .usage import run_usage_report
+
+    settings = load_settings()
+    return run_usage_report(
+        settings,
+        by=[key.strip() for key in args.by.split(",") if key.strip()],
+        days=args.days,
+    )
+
+
+def _add_profile_arguments(parser: argparse.ArgumentParser, kind: str) -> None:
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the run and print a per-stage breakdown.",
+    )
+    parser.add_argument(
+        "--profile-mode",
+        choices=PROFILE_MODES,
+        default="sampling",
+        help="Stack-sampling profiler or deterministic cProfile.",
+    )
+    parser.add_argument(
+        "--profile-output",
+        help=f"Profile path prefix (defaults to db/profiles/{kind}-<timestamp>); "
+        "writes .folded (sampling) or .pstats (cprofile) plus .json.",
     )
 
 
@@ -51,6 +152,36 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Exit non-zero when docs_count is below the minimum.",
     )
+    doctor_parser.add_argument(
+        "--resources",
+        action="store_true",
+        help="Load the embedder and index and report their resident memory.",
+    )
+    doctor_parser.add_argument(
+        "--bench",
+        action="store_true",
+        help="Measure cold/warm latency of imports, embedder, index, checkpointer and LLM roles.",
+    )
+    doctor_parser.add_argument(
+        "--repeat",
+        type=int,
+        default=10,
+        help="Bench: warm repetitions per probe.",
+    )
+    doctor_parser.add_argument(
+        "--k",
+        default="1,4,8,16",
+        help="Bench: comma-separated k values for vector search.",
+    )
+    doctor_parser.add_argument(
+        "--no-llm",
+        action="store_true",
+        help="Bench: skip the LLM round trip per role.",
+    )
+    doctor_parser.add_argument(
+        "--output",
+        help="Bench: JSON report path (defaults to db/bench/doctor-bench-<host>-<timestamp>.json).",
+    )
     doctor_parser.set_defaults(func=_handle_doctor)
 
     ingest_parser = subparsers.add_parser(
@@ -76,6 +207,41 @@ def build_parser() -> argparse.ArgumentParser:
         default=48,
         help="Chunk overlap for splitting documents.",
     )
+    ingest_parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="Build temporary indexes for a grid of chunk settings and compare them.",
+    )
+    ingest_parser.add_argument(
+        "--chunk-sizes",
+        default="128,256,512",
+        help="Sweep: comma-separated chunk sizes.",
+    )
+    ingest_parser.add_argument(
+        "--chunk-overlaps",
+        default="0,48",
+        help="Sweep: comma-separated chunk overlaps.",
+    )
+    ingest_parser.add_argument(
+        "--sweep-dir",
+        help="Sweep: where temporary indexes are built (defaults to db/ingest_sweep).",
+    )
+    ingest_parser.add_argument(
+        "--questions",
+        help="Sweep: labelled questions for recall (defaults to benchmarks/golden_questions.json).",
+    )
+    ingest_parser.add_argument(
+        "--k",
+        type=int,
+        default=4,
+        help="Sweep: k used for recall, MRR and query latency.",
+    )
+    ingest_parser.add_argument(
+        "--promote",
+        help="Sweep: copy SIZE:OVERLAP (or 'best') to the live index after measuring.",
+    )
+    ingest_parser.add_argument("--output", help="Sweep: write the JSON report here.")
+    _add_profile_arguments(ingest_parser, "ingest")
     ingest_parser.set_defaults(func=lambda args: _handle_ingest(args))
 
     ask_parser = subparsers.add_parser(
@@ -93,13 +259,118 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Print traceability data for debugging and audits.",
     )
+    ask_parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Add RSS and Python allocations per node to the trace with tracemalloc "
+        "(implies --trace; slows every node).",
+    )
     ask_parser.add_argument(
         "--reset-memory",
         action="store_true",
         help="Clear persisted memory and checkpoints before running.",
     )
+    ask_parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Response time budget in seconds; optional steps are skipped to meet it "
+        "(defaults to UNAL_RAG_DEADLINE, 0 disables).",
+    )
+    ask_parser.add_argument(
+        "--two-phase",
+        action="store_true",
+        help="Print the cited draft as soon as it is generated, then the grounding verdict.",
+    )
+    _add_profile_arguments(ask_parser, "ask")
     ask_parser.set_defaults(func=lambda args: _handle_ask(args))
 
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Answer questions over HTTP from pre-forked workers that share the loaded embedder.",
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on.")
+    serve_parser.add_argument("--port", type=int, default=8765, help="TCP port.")
+    serve_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (defaults to the CPU count).",
+    )
+    serve_parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Torch threads per worker (defaults to CPU count / workers).",
+    )
+    serve_parser.add_argument(
+        "--max-iterations",
+        type=int,
+        default=2,
+        help="Maximum retrieval retries for grounding.",
+    )
+    serve_parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Per-request time budget in seconds (defaults to UNAL_RAG_DEADLINE).",
+    )
+    serve_parser.set_defaults(func=lambda args: _handle_serve(args))
+
+    eval_parser = subparsers.add_parser(
+        "eval-retrieval",
+        help="Measure recall@k, MRR and latency of the local index on a labelled question set.",
+    )
+    eval_parser.add_argument(
+        "--questions",
+        help="Labelled questions JSON (defaults to benchmarks/golden_questions.json).",
+    )
+    eval_parser.add_argument(
+        "--index",
+        action="append",
+        help="Vector index to evaluate; repeat to compare indexes (defaults to UNAL_RAG_VECTORSTORE_PATH).",
+    )
+    eval_parser.add_argument(
+        "--k",
+        default="2,4,6,8",
+        help="Comma-separated k values to sweep.",
+    )
+    eval_parser.add_argument(
+        "--mode",
+        nargs="+",
+        choices=RETRIEVAL_MODES,
+        default=["similarity"],
+        help="Retrieval modes to sweep.",
+    )
+    eval_parser.add_argument(
+        "--fetch-k",
+        type=int,
+        default=DEFAULT_FETCH_K,
+        help="Candidate pool for MMR.",
+    )
+    eval_parser.add_argument(
+        "--followup-pairs",
+        help="Labelled follow-up/topic-change pairs JSON; calibrates the follow-up thresholds "
+        "(e.g. benchmarks/followup_pairs.json).",
+    )
+    eval_parser.add_argument("--output", help="Write the JSON report here.")
+    eval_parser.set_defaults(func=lambda args: _handle_eval_retrieval(args))
+
+    usage_parser = subparsers.add_parser(
+        "usage", help="Report cumulative LLM token usage and cost."
+    )
+    usage_parser.add_argument(
+        "--by",
+        default="day,role,intent",
+        help=f"Comma-separated grouping keys ({', '.join(GROUP_KEYS)}).",
+    )
+    usage_parser.add_argument(
+        "--days",
+        type=int,
+        help="Only include the last N days.",
+    )
+    usage_parser.set_defaults(func=lambda args: _handle_usage(args))
+
     return parser
 
 
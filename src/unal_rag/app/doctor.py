@@ -1,11 +1,19 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Sequence
+from typing import Any, Dict, Sequence
 
 from ..config.settings import Settings
+from ..llm.circuit_breaker import DEFAULT_BREAKER_STATE_PATH, OPEN, load_breaker_states
+from ..llm.hedging import DEFAULT_HEDGE_STATS_PATH
+from ..retrieval.verifier import ACCEPT, DEFAULT_PRECHECK_STATS_PATH, ESCALATE
+from ..utils.json_store import load_json_states
+from ..utils.metrics import available_memory_mb, current_rss_mb, path_size_bytes, peak_rss_mb
+from ..utils.resources import module_parameter_bytes
+from .bench import run_bench
 
 
 @dataclass(frozen=True)
@@ -17,6 +25,9 @@ class DoctorReport:
     env_missing: tuple[str, ...]
     index_path: Path
     index_present: bool
+    circuit_breakers: Dict[str, str] = field(default_factory=dict)
+    hedging: Dict[str, str] = field(default_factory=dict)
+    grounding_precheck: Dict[str, str] = field(default_factory=dict)
 
     @property
     def meets_doc_requirement(self) -> bool:
@@ -47,6 +58,48 @@ def check_vector_index(index_path: Path) -> bool:
     return any(index_path.iterdir())
 
 
+def describe_breakers(states: Dict[str, Dict[str, Any]], now: float | None = None) -> Dict[str, str]:
+    now = time.time() if now is None else now
+    described = {}
+    for name, data in sorted(states.items()):
+        state = str(data.get("state", "closed"))
+        if state == OPEN:
+            remaining = float(data.get("opened_at", 0.0)) + float(data.get("cooldown_s", 0.0)) - now
+            state = f"open (retry in {remaining:.0f}s)" if remaining > 0 else "half_open"
+        described[name] = state
+    return described
+
+
+def describe_hedging(stats: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    described = {}
+    for role, data in sorted(stats.items()):
+        requests = int(data.get("requests", 0))
+        if not requests:
+            continue
+        wins = data.get("wins", {}) or {}
+        primary_wins = int(wins.get(role, 0))
+        described[role] = (
+            f"requests={requests} hedge_rate={int(data.get('hedged', 0)) / requests:.2f} "
+            f"primary_win_rate={primary_wins / requests:.2f}"
+        )
+    return described
+
+
+def describe_precheck(stats: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    described = {}
+    for role, data in sorted(stats.items()):
+        accepted = int(data.get(ACCEPT, 0))
+        total = accepted + int(data.get(ESCALATE, 0))
+        if not total:
+            continue
+        summary = f"checks={total} accept_rate={accepted / total:.2f} escalate_rate={1 - accepted / total:.2f}"
+        shadowed = int(data.get("shadow_checked", 0))
+        if shadowed:
+            summary += f" shadow_checked={shadowed} false_accept_rate={int(data.get('false_accepts', 0)) / shadowed:.2f}"
+        described[role] = summary
+    return described
+
+
 def build_report(settings: Settings) -> DoctorReport:
     docs_path = settings.docs_path
     docs_path_exists = docs_path.exists()
@@ -62,6 +115,9 @@ def build_report(settings: Settings) -> DoctorReport:
         env_missing=env_missing,
         index_path=settings.vectorstore_path,
         index_present=index_present,
+        circuit_breakers=describe_breakers(load_breaker_states(DEFAULT_BREAKER_STATE_PATH)),
+        hedging=describe_hedging(load_json_states(DEFAULT_HEDGE_STATS_PATH)),
+        grounding_precheck=describe_precheck(load_json_states(DEFAULT_PRECHECK_STATS_PATH)),
     )
 
 
@@ -77,7 +133,16 @@ def format_report(report: DoctorReport) -> str:
         f"index_path: {report.index_path}",
         f"index_present: {'yes' if report.index_present else 'no'}",
         f"missing_env: {', '.join(report.env_missing) if report.env_missing else 'none'}",
+        "circuit_breakers: "
+        + (
+            ", ".join(f"{name}={state}" for name, state in report.circuit_breakers.items())
+            or "none recorded"
+        ),
     ]
+    for role, summary in report.hedging.items():
+        lines.append(f"hedging[{role}]: {summary}")
+    for role, summary in report.grounding_precheck.items():
+        lines.append(f"precheck[{role}]: {summary}")
 
     if not report.docs_path_exists:
         lines.append("WARNING: docs_path does not exist.")
@@ -89,13 +154,102 @@ def format_report(report: DoctorReport) -> str:
         lines.append("WARNING: missing env vars detected.")
     if not report.index_present:
         lines.append("WARNING: vector index not found.")
+    if any(state.startswith("open") for state in report.circuit_breakers.values()):
+        lines.append("WARNING: open circuit breakers; LLM roles are degraded to local fallbacks.")
+
+    return "\n".join(lines)
+
+
+def _mib(value: int | None) -> float | None:
+    return None if value is None else round(value / (1024 * 1024), 1)
+
 
+def measure_resources(settings: Settings) -> Dict[str, Any]:
+    """Resident cost of loading the embedder and the index in this process.
+
+    Figures are RSS deltas, so they include imports (torch, chromadb) pulled in by
+    each step; ``worker_rss_mb`` is what one serving process needs before handling
+    requests.
+    """
+    from ..config.settings import EMBEDDING_MODEL
+
+    resources: Dict[str, Any] = {"baseline_rss_mb": current_rss_mb()}
+    embeddings = None
+    rss = current_rss_mb()
+    start = time.perf_counter()
+    try:
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        embeddings = HuggingFaceEmbeddings(model=EMBEDDING_MODEL)
+        embeddings.embed_query("warmup")
+    except Exception as exc:
+        resources["model_error"] = str(exc)
+    else:
+        after = current_rss_mb()
+        resources.update(
+            {
+                "model": EMBEDDING_MODEL,
+                "model_load_s": round(time.perf_counter() - start, 2),
+                "model_rss_mb": round(after - rss, 1) if after is not None and rss is not None else None,
+                "model_params_mb": _mib(module_parameter_bytes(getattr(embeddings, "_client", None))),
+            }
+        )
+
+    index_path = settings.vectorstore_path
+    resources["index_disk_mb"] = _mib(path_size_bytes(index_path)) if index_path.exists() else None
+    if embeddings is not None and check_vector_index(index_path):
+        rss = current_rss_mb()
+        try:
+            from langchain_chroma import Chroma
+
+            vectorstore = Chroma(persist_directory=str(index_path), embedding_function=embeddings)
+            # The HNSW segment is only loaded into memory by the first query.
+            vectorstore.similarity_search("warmup", k=1)
+            resources["index_chunks"] = vectorstore._collection.count()
+        except Exception as exc:
+            resources["index_error"] = str(exc)
+        else:
+            after = current_rss_mb()
+            resources["index_rss_mb"] = (
+                round(after - rss, 1) if after is not None and rss is not None else None
+            )
+
+    checkpoint_path = Path("db") / "langgraph_checkpoints.sqlite"
+    resources["checkpoint_db_mb"] = _mib(path_size_bytes(checkpoint_path)) if checkpoint_path.exists() else None
+    resources["worker_rss_mb"] = current_rss_mb()
+    resources["peak_rss_mb"] = peak_rss_mb()
+    resources["available_mb"] = available_memory_mb()
+    if resources["worker_rss_mb"] and resources["available_mb"]:
+        resources["workers_fit"] = int(resources["available_mb"] // resources["worker_rss_mb"])
+    return resources
+
+
+def format_resources(resources: Dict[str, Any]) -> str:
+    lines = [f"resources.{key}: {'-' if value is None else value}" for key, value in resources.items()]
+    if "workers_fit" in resources:
+        lines.append(
+            "NOTE: workers_fit assumes no copy-on-write sharing; add per-request peaks "
+            "from `ask --trace` (memory.nodes) when sizing."
+        )
     return "\n".join(lines)
 
 
-def run_doctor(settings: Settings, *, strict: bool = False) -> int:
+def run_doctor(
+    settings: Settings,
+    *,
+    strict: bool = False,
+    resources: bool = False,
+    bench: bool = False,
+    bench_options: Dict[str, Any] | None = None,
+) -> int:
     report = build_report(settings)
     print(format_report(report))
+    if resources:
+        print(format_resources(measure_resources(settings)))
+    if bench:
+        print()
+        if run_bench(settings, **(bench_options or {})) != 0:
+            return 1
 
     if strict and not report.meets_doc_requirement:
         return 1
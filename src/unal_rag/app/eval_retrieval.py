@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from ..config.settings import EMBEDDING_MODEL, Settings
+from ..retrieval.evaluation import (
+    DEFAULT_QUESTIONS_PATH,
+    LabelledPair,
+    LabelledQuestion,
+    aggregate,
+    load_followup_pairs,
+    load_labelled_questions,
+    score_ranking,
+)
+from ..retrieval.followup import (
+    FOLLOWUP_EXTRA_CANDIDATES,
+    PairSimilarity,
+    calibrate_thresholds,
+    followup_thresholds,
+    is_elliptical,
+    score_thresholds,
+)
+from ..utils.metrics import format_table
+from ..utils.text import cosine
+
+
+RETRIEVAL_MODES = ("similarity", "mmr")
+DEFAULT_KS = (2, 4, 6, 8)
+DEFAULT_FETCH_K = 20
+TABLE_COLUMNS = ("index", "mode", "k", "questions", "recall", "mrr", "p50_ms", "p95_ms")
+# What a retrieval turn caches for the next one: the default k plus the extra candidates.
+FOLLOWUP_CANDIDATES = 4 + FOLLOWUP_EXTRA_CANDIDATES
+FOLLOWUP_COLUMNS = (
+    "index",
+    "thresholds",
+    "question",
+    "chunk",
+    "cue_margin",
+    "pairs",
+    "reused",
+    "false_reuse",
+    "missed",
+    "precision",
+    "recall",
+)
+
+
+def _open_index(index_path: Path):
+    from langchain_chroma import Chroma
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    embeddings = HuggingFaceEmbeddings(model=EMBEDDING_MODEL)
+    return Chroma(persist_directory=str(index_path), embedding_function=embeddings)
+
+
+def _search(vectorstore: Any, question: str, *, mode: str, k: int, fetch_k: int) -> list:
+    if mode == "mmr":
+        return vectorstore.max_marginal_relevance_search(question, k=k, fetch_k=max(fetch_k, k))
+    return vectorstore.similarity_search(question, k=k)
+
+
+def evaluate_index(
+    vectorstore: Any,
+    questions: Sequence[LabelledQuestion],
+    *,
+    modes: Sequence[str],
+    ks: Sequence[int],
+    fetch_k: int = DEFAULT_FETCH_K,
+) -> List[Dict[str, Any]]:
+    """Recall@k, MRR and query latency for each retrieval mode and k."""
+    if questions:
+        # Load the embedder and the HNSW index before timing anything.
+        _search(vectorstore, questions[0].question, mode="similarity", k=1, fetch_k=fetch_k)
+    rows = []
+    for mode in modes:
+        for k in sorted(set(ks)):
+            scores, latencies = [], []
+            for item in questions:
+                start = time.perf_counter()
+                documents = _search(vectorstore, item.question, mode=mode, k=k, fetch_k=fetch_k)
+                latencies.append(time.perf_counter() - start)
+                scores.append(score_ranking(item, [doc.metadata or {} for doc in documents], k))
+            rows.append({"mode": mode, "k": k, **aggregate(scores, latencies)})
+    return rows
+
+
+def _stored_embeddings(vectorstore: Any, documents: Sequence[Any]) -> List[List[float]]:
+    chunk_ids = [str(doc.metadata["chunk_id"]) for doc in documents if (doc.metadata or {}).get("chunk_id")]
+    if not chunk_ids:
+        return []
+    result = vectorstore.get(where={"chunk_id": {"$in": chunk_ids}}, include=["embeddings"])
+    embeddings = result.get("embeddings")
+    return [] if embeddings is None else [[float(value) for value in vector] for vector in embeddings]
+
+
+def measure_followup_pairs(
+    vectorstore: Any, pairs: Sequence[LabelledPair], *, candidates: int = FOLLOWUP_CANDIDATES
+) -> List[PairSimilarity]:
+    """The similarities the follow-up node would compute for each labelled pair."""
+    embeddings = vectorstore.embeddings
+    measured = []
+    for pair in pairs:
+        previous = embeddings.embed_query(pair.previous)
+        vector = embeddings.embed_query(pair.question)
+        cached = vectorstore.similarity_search_by_vector(previous, k=candidates)
+        chunks = _stored_embeddings(vectorstore, cached)
+        measured.append(
+            PairSimilarity(
+                followup=pair.followup,
+                cue=is_elliptical(pair.question),
+                question_similarity=cosine(vector, previous),
+                chunk_similarity=max((cosine(vector, chunk) for chunk in chunks), default=-1.0),
+            )
+        )
+    return measured
+
+
+def followup_rows(measured: Sequence[PairSimilarity]) -> List[Dict[str, Any]]:
+    """Current thresholds next to the calibrated ones."""
+    return [
+        {"thresholds": "current", **score_thresholds(measured, followup_thresholds())},
+        {"thresholds": "calibrated", **calibrate_thresholds(measured)},
+    ]
+
+
+def _parse_ks(value: str | Sequence[int] | None) -> List[int]:
+    if value is None:
+        return list(DEFAULT_KS)
+    if isinstance(value, str):
+        return [int(part) for part in value.split(",") if part.strip()]
+    return [int(part) for part in value]
+
+
+def run_eval_retrieval(
+    settings: Settings,
+    *,
+    questions_path: str | None = None,
+    index_paths: Sequence[str] | None = None,
+    ks: str | Sequence[int] | None = None,
+    modes: Sequence[str] | None = None,
+    fetch_k: int = DEFAULT_FETCH_K,
+    output: str | None = None,
+    followup_pairs_path: str | None = None,
+) -> int:
+    questions_file = Path(questions_path) if questions_path else DEFAULT_QUESTIONS_PATH
+    if not questions_file.exists():
+        print(f"Labelled question set not found: {questions_file}")
+        return 1
+    questions = load_labelled_questions(questions_file)
+    if not questions:
+        print(f"No labelled questions (relevant_sources / relevant_doc_ids) in {questions_file}")
+        return 1
+
+    pairs: List[LabelledPair] = []
+    if followup_pairs_path:
+        if not Path(followup_pairs_path).exists():
+            print(f"Follow-up pairs not found: {followup_pairs_path}")
+            return 1
+        pairs = load_followup_pairs(Path(followup_pairs_path))
+        if not pairs:
+            print(f"No labelled pairs (previous / question / followup) in {followup_pairs_path}")
+            return 1
+
+    indexes = [Path(path) for path in index_paths] if index_paths else [settings.vectorstore_path]
+    try:
+        k_values = [k for k in _parse_ks(ks) if k > 0]
+    except ValueError:
+        print(f"Invalid --k list: {ks}")
+        return 1
+
+    rows: List[Dict[str, Any]] = []
+    followup: List[Dict[str, Any]] = []
+    for index_path in indexes:
+        if not index_path.exists():
+            print(f"Vector index not found: {index_path}")
+            return 1
+        try:
+            vectorstore = _open_index(index_path)
+        except Exception as exc:
+            print(f"Failed to open vector index {index_path}: {exc}")
+            return 1
+        for row in evaluate_index(
+            vectorstore,
+            questions,
+            modes=modes or ("similarity",),
+            ks=k_values,
+            fetch_k=fetch_k,
+        ):
+            rows.append({"index": str(index_path), **row})
+        if pairs:
+            measured = measure_followup_pairs(vectorstore, pairs)
+            followup.extend({"index": str(index_path), **row} for row in followup_rows(measured))
+
+    print(format_table(rows, TABLE_COLUMNS))
+    if followup:
+        print()
+        print(format_table(followup, FOLLOWUP_COLUMNS))
+        calibrated = followup[-1]
+        print(
+            "Calibrated thresholds: "
+            f"UNAL_RAG_FOLLOWUP_QUESTION_SIM={calibrated['question']} "
+            f"UNAL_RAG_FOLLOWUP_CHUNK_SIM={calibrated['chunk']} "
+            f"UNAL_RAG_FOLLOWUP_CUE_MARGIN={calibrated['cue_margin']}"
+        )
+    if output:
+        output_path = Path(output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        report: Dict[str, Any] = {"questions": str(questions_file), "results": rows}
+        if followup:
+            report.update(followup_pairs=str(followup_pairs_path), followup=followup)
+        output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Report written to {output_path}")
+    return 0
@@ -1,23 +1,14 @@
 from __future__ import annotations
 
+import contextlib
 import hashlib
 import os
 from datetime import datetime, timezone
 from pathlib import Path
 
-from langchain_community.document_loaders import BSHTMLLoader, DirectoryLoader, TextLoader
-from bs4 import BeautifulSoup
-
-from ..config.settings import Settings
-
-try:
-    from ingestion_pipeline import create_vector_store, split_documents
-except Exception as exc:  # pragma: no cover - runtime import guard
-    create_vector_store = None
-    split_documents = None
-    _INGEST_IMPORT_ERROR = exc
-else:
-    _INGEST_IMPORT_ERROR = None
+from ..config.settings import EMBEDDING_MODEL, Settings
+from ..utils.metrics import format_table
+from ..utils.profiling import Profiler, default_profile_prefix
 
 
 _HTML_EXTS = {".html", ".htm"}
@@ -36,7 +27,17 @@ def _version() -> str:
     return os.getenv("UNAL_RAG_INGEST_VERSION", "v1")
 
 
+def _pipeline():
+    # langchain_community, langchain_huggingface, chromadb and transformers take
+    # seconds to import; only ingestion pays for them.
+    from ingestion_pipeline import create_vector_store, split_documents
+
+    return create_vector_store, split_documents
+
+
 def _load_with_loader(docs_path: Path, pattern: str, loader_cls) -> list:
+    from langchain_community.document_loaders import DirectoryLoader
+
     loader = DirectoryLoader(
         path=str(docs_path),
         glob=pattern,
@@ -47,6 +48,8 @@ def _load_with_loader(docs_path: Path, pattern: str, loader_cls) -> list:
 
 
 def _load_documents(settings: Settings, docs_path: Path) -> list:
+    from langchain_community.document_loaders import BSHTMLLoader, TextLoader
+
     docs = []
     exts = {ext.lower() for ext in settings.supported_extensions}
 
@@ -61,6 +64,8 @@ def _load_documents(settings: Settings, docs_path: Path) -> list:
 
 
 def _override_title_from_info_texto(docs: list) -> None:
+    from bs4 import BeautifulSoup
+
     for doc in docs:
         source = str(doc.metadata.get("source", ""))
         if not source:
@@ -108,6 +113,52 @@ def _enrich_chunks(chunks: list) -> None:
         chunk.metadata = metadata
 
 
+def _stage(profiler: Profiler | None, name: str):
+    return profiler.section(name) if profiler else contextlib.nullcontext()
+
+
+def pipeline_import_error() -> str | None:
+    try:
+        _pipeline()
+    except Exception as exc:
+        return f"Failed to import ingestion pipeline: {exc}"
+    return None
+
+
+def load_corpus(settings: Settings, docs_root: Path, *, profiler: Profiler | None = None) -> list:
+    with _stage(profiler, "load"):
+        documents = _load_documents(settings, docs_root)
+    with _stage(profiler, "titles"):
+        _override_title_from_info_texto(documents)
+    return documents
+
+
+def build_index(
+    documents: list,
+    *,
+    chunk_size: int,
+    chunk_overlap: int,
+    persist_directory: Path,
+    embedding_model=None,
+    profiler: Profiler | None = None,
+):
+    """Split, enrich and index ``documents``; returns ``(chunks, vectorstore)``."""
+    create_vector_store, split_documents = _pipeline()
+    with _stage(profiler, "split"):
+        chunks = split_documents(
+            documents,
+            chunk_size=max(1, int(chunk_size)),
+            chunk_overlap=max(0, int(chunk_overlap)),
+        )
+    with _stage(profiler, "enrich"):
+        _enrich_chunks(chunks)
+    with _stage(profiler, "embed_persist"):
+        vectorstore = create_vector_store(
+            chunks, persist_directory=str(persist_directory), embedding_model=embedding_model
+        )
+    return chunks, vectorstore
+
+
 def run_ingest(
     settings: Settings,
     *,
@@ -115,9 +166,12 @@ def run_ingest(
     vectorstore_path: str | None,
     chunk_size: int,
     chunk_overlap: int,
+    profile: str | None = None,
+    profile_output: str | None = None,
 ) -> int:
-    if create_vector_store is None or split_documents is None:
-        print(f"Failed to import ingestion pipeline: {_INGEST_IMPORT_ERROR}")
+    import_error = pipeline_import_error()
+    if import_error:
+        print(import_error)
         return 1
 
     docs_root = Path(docs_path).expanduser() if docs_path else settings.docs_path
@@ -131,18 +185,38 @@ def run_ingest(
         print(f"Docs path not found: {docs_root}")
         return 1
 
-    documents = _load_documents(settings, docs_root)
-    _override_title_from_info_texto(documents)
-    if not documents:
-        print(f"No supported documents found in {docs_root}")
-        return 1
-
-    chunks = split_documents(
-        documents,
-        chunk_size=max(1, int(chunk_size)),
-        chunk_overlap=max(0, int(chunk_overlap)),
-    )
-    _enrich_chunks(chunks)
-
-    create_vector_store(chunks, persist_directory=str(vectorstore_root))
+    profiler = Profiler(profile) if profile else None
+    if profiler:
+        profiler.start()
+    try:
+        documents = load_corpus(settings, docs_root, profiler=profiler)
+        if not documents:
+            print(f"No supported documents found in {docs_root}")
+            return 1
+
+        embedding_model = None
+        if profiler:
+            # Bill the model load to its own stage instead of embed_persist.
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            with profiler.section("load_embedder"):
+                embedding_model = HuggingFaceEmbeddings(model=EMBEDDING_MODEL)
+        build_index(
+            documents,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            persist_directory=vectorstore_root,
+            embedding_model=embedding_model,
+            profiler=profiler,
+        )
+    finally:
+        # Stop the sampler thread even when loading or indexing raises.
+        if profiler:
+            profiler.stop()
+    if profiler:
+        written = profiler.write(Path(profile_output) if profile_output else default_profile_prefix("ingest"))
+        print(f"\nProfile ({profiler.mode}, {profiler.elapsed_s:.2f}s):")
+        print(format_table(profiler.breakdown(), ("section", "wall_ms", "cpu_ms", "share", "samples", "top")))
+        for path in written:
+            print(f"Profile written to {path}")
     return 0
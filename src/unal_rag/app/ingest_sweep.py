@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from ..config.settings import EMBEDDING_MODEL, Settings
+from ..retrieval.evaluation import DEFAULT_QUESTIONS_PATH, load_labelled_questions
+from ..utils.metrics import format_table, pareto_front, path_size_bytes
+from .ingest import build_index, load_corpus, pipeline_import_error
+from .eval_retrieval import evaluate_index
+
+
+DEFAULT_SWEEP_DIR = Path("db") / "ingest_sweep"
+DEFAULT_CHUNK_SIZES = (128, 256, 512)
+DEFAULT_CHUNK_OVERLAPS = (0, 48)
+TABLE_COLUMNS = (
+    "config",
+    "chunks",
+    "index_mb",
+    "ingest_s",
+    "p50_ms",
+    "p95_ms",
+    "recall",
+    "mrr",
+    "pareto",
+)
+
+
+def config_name(chunk_size: int, chunk_overlap: int) -> str:
+    return f"{chunk_size}:{chunk_overlap}"
+
+
+def sweep_grid(chunk_sizes: Sequence[int], chunk_overlaps: Sequence[int]) -> List[tuple[int, int]]:
+    """Valid (size, overlap) pairs; overlaps must be smaller than the chunk."""
+    return [
+        (size, overlap)
+        for size in sorted(set(chunk_sizes))
+        for overlap in sorted(set(chunk_overlaps))
+        if size > 0 and 0 <= overlap < size
+    ]
+
+
+def _parse_ints(value: str | Sequence[int] | None, default: Sequence[int]) -> List[int]:
+    if value is None:
+        return list(default)
+    if isinstance(value, str):
+        return [int(part) for part in value.split(",") if part.strip()]
+    return [int(part) for part in value]
+
+
+def _pick_promoted(rows: Sequence[Dict[str, Any]], promote: str) -> Dict[str, Any] | None:
+    if promote == "best":
+        # Highest recall on the Pareto front, then the smallest index.
+        front = [row for row in rows if row["pareto"] == "yes"] or list(rows)
+        return max(front, key=lambda row: (row["recall"] or 0.0, -row["index_mb"]), default=None)
+    return next((row for row in rows if row["config"] == promote), None)
+
+
+def release_vectorstore(vectorstore: Any) -> None:
+    """Flush and close a Chroma store so its directory can be copied consistently.
+
+    ``langchain_chroma`` writes through on every add, but the client keeps the
+    SQLite file and HNSW segments open (and cached per path) until its system
+    stops; older ``langchain_community`` stores also need ``persist()``.
+    """
+    persist = getattr(vectorstore, "persist", None)
+    if callable(persist):
+        persist()
+    system = getattr(getattr(vectorstore, "_client", None), "_system", None)
+    if system is not None:
+        system.stop()
+    try:
+        from chromadb.api.client import SharedSystemClient
+    except ImportError:
+        return
+    # Otherwise a later client for the same path reuses the stopped system.
+    SharedSystemClient.clear_system_cache()
+
+
+def promote_index(source: Path, target: Path) -> Path | None:
+    """Replace the live index with ``source``; the previous one is kept as ``<target>.bak``.
+
+    ``source`` must be closed (see ``release_vectorstore``) before it is copied.
+    """
+    backup = None
+    staging = target.with_name(f"{target.name}.promote")
+    if staging.exists():
+        shutil.rmtree(staging)
+    shutil.copytree(source, staging)
+    if target.exists():
+        backup = target.with_name(f"{target.name}.bak")
+        if backup.exists():
+            shutil.rmtree(backup)
+        target.rename(backup)
+    staging.rename(target)
+    return backup
+
+
+def run_ingest_sweep(
+    settings: Settings,
+    *,
+    docs_path: str | None = None,
+    vectorstore_path: str | None = None,
+    chunk_sizes: str | Sequence[int] | None = None,
+    chunk_overlaps: str | Sequence[int] | None = None,
+    sweep_dir: str | None = None,
+    questions_path: str | None = None,
+    k: int = 4,
+    promote: str | None = None,
+    output: str | None = None,
+) -> int:
+    import_error = pipeline_import_error()
+    if import_error:
+        print(import_error)
+        return 1
+    try:
+        grid = sweep_grid(
+            _parse_ints(chunk_sizes, DEFAULT_CHUNK_SIZES),
+            _parse_ints(chunk_overlaps, DEFAULT_CHUNK_OVERLAPS),
+        )
+    except ValueError:
+        print("Chunk sizes and overlaps must be comma-separated integers.")
+        return 1
+    if not grid:
+        print("Empty sweep grid (every overlap must be smaller than its chunk size).")
+        return 1
+    if promote and promote != "best" and promote not in {config_name(*pair) for pair in grid}:
+        print(f"--promote {promote} is not part of the sweep grid.")
+        return 1
+
+    docs_root = Path(docs_path).expanduser() if docs_path else settings.docs_path
+    if not docs_root.exists():
+        print(f"Docs path not found: {docs_root}")
+        return 1
+    documents = load_corpus(settings, docs_root)
+    if not documents:
+        print(f"No supported documents found in {docs_root}")
+        return 1
+
+    questions_file = Path(questions_path) if questions_path else DEFAULT_QUESTIONS_PATH
+    questions = load_labelled_questions(questions_file) if questions_file.exists() else []
+    if not questions:
+        print(f"No labelled questions in {questions_file}; recall will not be reported.")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    # One embedder for every configuration so model loading is not billed to the first one.
+    embeddings = HuggingFaceEmbeddings(model=EMBEDDING_MODEL)
+    root = Path(sweep_dir) if sweep_dir else DEFAULT_SWEEP_DIR
+    rows: List[Dict[str, Any]] = []
+    for chunk_size, chunk_overlap in grid:
+        name = config_name(chunk_size, chunk_overlap)
+        index_dir = root / f"cs{chunk_size}-ov{chunk_overlap}"
+        if index_dir.exists():
+            shutil.rmtree(index_dir)
+        print(f"Building {name} -> {index_dir}")
+        start = time.perf_counter()
+        # The pipeline prints sample chunks; keep the sweep output readable.
+        with contextlib.redirect_stdout(io.StringIO()):
+            chunks, vectorstore = build_index(
+                documents,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                persist_directory=index_dir,
+                embedding_model=embeddings,
+            )
+        ingest_s = time.perf_counter() - start
+
+        row: Dict[str, Any] = {
+            "config": name,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "index_dir": str(index_dir),
+            "chunks": len(chunks),
+            "index_mb": None,
+            "ingest_s": round(ingest_s, 2),
+            "recall": None,
+            "mrr": None,
+            "p50_ms": None,
+            "p95_ms": None,
+        }
+        try:
+            if questions:
+                (scores,) = evaluate_index(vectorstore, questions, modes=("similarity",), ks=(k,))
+                row.update({key: scores[key] for key in ("recall", "mrr", "p50_ms", "p95_ms")})
+        finally:
+            # Nothing may hold the index open when it is copied by ``promote_index``.
+            release_vectorstore(vectorstore)
+        # Measured once closed, when pending writes have reached the files.
+        row["index_mb"] = round(path_size_bytes(index_dir) / (1024 * 1024), 2)
+        rows.append(row)
+
+    flags = pareto_front(rows, maximize=("recall",), minimize=("index_mb", "p50_ms", "ingest_s"))
+    for row, on_front in zip(rows, flags):
+        row["pareto"] = "yes" if on_front else "no"
+
+    print()
+    print(format_table(rows, TABLE_COLUMNS))
+    print(f"\nrecall and MRR at k={k}; pareto = not beaten on recall, index size, query p50 and ingest time.")
+
+    promoted = None
+    if promote:
+        promoted = _pick_promoted(rows, promote)
+        if promoted is None:
+            print("Nothing to promote.")
+            return 1
+        live_index = Path(vectorstore_path).expanduser() if vectorstore_path else settings.vectorstore_path
+        backup = promote_index(Path(promoted["index_dir"]), live_index)
+        print(f"Promoted {promoted['config']} to {live_index}")
+        if backup is not None:
+            print(f"Previous index kept at {backup}")
+
+    if output:
+        output_path = Path(output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"k": k, "results": rows, "promoted": promoted["config"] if promoted else None}
+        output_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Report written to {output_path}")
+    return 0
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+from ..config.settings import Settings
+from ..retrieval.warmup import prefetch_files
+from ..session import DraftAnswer, RAGSession, runtime
+from ..utils.prefork import PreforkSupervisor
+from ..utils.resources import process_memory
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+LISTEN_BACKLOG = 128
+MAX_BODY_BYTES = 64 * 1024
+# How often an idle worker checks whether it was asked to stop.
+POLL_INTERVAL_S = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def handle_ask(
+    session: Any,
+    payload: Any,
+    *,
+    worker: int | None = None,
+    on_draft: Callable[[DraftAnswer], None] | None = None,
+) -> Tuple[int, Dict[str, Any]]:
+    """Run one ``POST /ask`` body through ``session``; returns ``(status, response)``.
+
+    Requests without ``thread_id`` get a thread of their own. ``on_draft`` is
+    handed to ``session.ask`` for two-phase answers.
+    """
+    if not isinstance(payload, dict):
+        return 400, {"error": "Expected a JSON object."}
+    question = payload.get("question")
+    if not isinstance(question, str) or not question.strip():
+        return 400, {"error": "Missing question."}
+    thread_id = str(payload.get("thread_id") or f"serve-{uuid.uuid4().hex[:12]}")
+    max_iterations, deadline_s = payload.get("max_iterations"), payload.get("deadline_s")
+    try:
+        max_iterations = int(max_iterations) if max_iterations is not None else None
+        deadline_s = float(deadline_s) if deadline_s is not None else None
+    except (TypeError, ValueError):
+        return 400, {"error": "max_iterations and deadline_s must be numbers."}
+    user_id = str(payload["user_id"]) if payload.get("user_id") else None
+    try:
+        result = session.ask(
+            question,
+            thread_id=thread_id,
+            user_id=user_id,
+            max_iterations=max_iterations,
+            deadline_s=deadline_s,
+            on_draft=on_draft,
+        )
+    except Exception:
+        # The details (provider errors, paths) stay in the server log.
+        logger.exception("Request on thread %s failed.", thread_id)
+        return 500, {"error": "Internal server error.", "thread_id": thread_id}
+    return 200, {
+        "thread_id": result.thread_id,
+        "answer": result.answer,
+        "sources": list(result.sources),
+        "evaluation_skipped": result.evaluation_skipped,
+        "coalesced": result.coalesced,
+        "verdict": result.verdict,
+        "draft_replaced": result.draft_replaced,
+        "elapsed_s": round(result.elapsed_s, 3),
+        "worker": worker,
+    }
+
+
+def content_length_error(value: str | None) -> Tuple[int, Dict[str, Any]] | None:
+    """The error response for a missing, malformed or oversized ``Content-Length`` (``None`` if usable).
+
+    Only plain decimal digits are accepted: ``int()`` would take ``-1`` (and
+    ``rfile.read(-1)`` then blocks until the client closes) or ``+1_0``.
+    """
+    if value is None or not value.strip():
+        return 411, {"error": "Content-Length required."}
+    value = value.strip()
+    if not (value.isascii() and value.isdigit()):
+        return 400, {"error": "Invalid Content-Length."}
+    if int(value) > MAX_BODY_BYTES:
+        return 413, {"error": "Request body too large."}
+    return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_WorkerServer"
+
+    def _send(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self._send(404, {"error": "Not found."})
+            return
+        session = self.server.session
+        self._send(
+            200,
+            {
+                "pid": os.getpid(),
+                "worker": self.server.slot,
+                "warmup": session.warmup_status().get("state"),
+                "memory": process_memory(),
+                "embedding": session.embedding_stats(),
+                "followup": session.followup_stats(),
+                "coalesce": session.coalesce_stats(),
+            },
+        )
+
+    def do_POST(self) -> None:
+        if self.path != "/ask":
+            self._send(404, {"error": "Not found."})
+            return
+        header = self.headers.get("Content-Length")
+        error = content_length_error(header)
+        if error is not None:
+            self._send(*error)
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(header)) or b"null")
+        except ValueError:
+            self._send(400, {"error": "Invalid JSON."})
+            return
+        if isinstance(payload, dict) and payload.get("two_phase"):
+            self._stream_two_phase(payload)
+            return
+        self._send(*handle_ask(self.server.session, payload, worker=self.server.slot))
+
+    def _start_stream(self, status: int) -> None:
+        # HTTP/1.0: the body ends when the connection closes, one JSON event per line.
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.end_headers()
+
+    def _send_event(self, event: str, payload: Dict[str, Any]) -> None:
+        line = json.dumps({"event": event, **payload}, ensure_ascii=False) + "\n"
+        self.wfile.write(line.encode("utf-8"))
+        self.wfile.flush()
+
+    def _stream_two_phase(self, payload: Dict[str, Any]) -> None:
+        """``draft`` event (pending verification) as soon as it exists, then ``final`` with the verdict."""
+        started = []
+
+        def _on_draft(draft: DraftAnswer) -> None:
+            self._start_stream(200)
+            started.append(True)
+            self._send_event("draft", {**draft.to_dict(), "worker": self.server.slot})
+
+        status, body = handle_ask(self.server.session, payload, worker=self.server.slot, on_draft=_on_draft)
+        if not started:
+            self._start_stream(status)
+        self._send_event("final" if status == 200 else "error", body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+class _WorkerServer(ThreadingHTTPServer):
+    daemon_threads = False
+
+    def __init__(self, listener: socket.socket, session: RAGSession, slot: int) -> None:
+        super().__init__(listener.getsockname()[:2], _Handler, bind_and_activate=False)
+        # Every worker accepts on the socket the parent bound before forking.
+        self.socket.close()
+        self.socket = listener
+        self.session = session
+        self.slot = slot
+
+
+def _preload(workers: int) -> None:
+    """Load what the workers share copy-on-write: graph modules and embedder weights.
+
+    The Chroma client and SQLite connections are opened in each worker (they
+    are not fork-safe); prefetching the index files puts them in the page
+    cache, which every worker shares anyway. Nothing is embedded here, so no
+    torch thread pool exists at fork time.
+    """
+    retriever = runtime("nodes.retriever")
+    runtime("main")
+    runtime("llm_runtime").set_rate_limit_share(1 / workers)
+    prefetch_files(Path(retriever.PERSIST_DIRECTORY))
+    retriever.load_embedder()
+
+
+def _limit_torch_threads(threads: int) -> None:
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(max(1, threads))
+
+
+def _serve_worker(
+    slot: int,
+    *,
+    listener: socket.socket,
+    threads: int,
+    max_iterations: int,
+    deadline_s: float | None,
+) -> None:
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    _limit_torch_threads(threads)
+    with RAGSession(max_iterations=max_iterations, deadline_s=deadline_s) as session:
+        server = _WorkerServer(listener, session, slot)
+        server.timeout = POLL_INTERVAL_S
+        try:
+            while not stop.is_set():
+                server.handle_request()
+        finally:
+            # Waits for in-flight requests before the session flushes and closes.
+            server.server_close()
+
+
+def run_serve(
+    settings: Settings,
+    *,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    workers: int | None = None,
+    threads: int | None = None,
+    max_iterations: int = 2,
+    deadline_s: float | None = None,
+) -> int:
+    _ = settings
+    workers = max(1, workers or default_workers())
+    threads = threads or max(1, default_workers() // workers)
+    try:
+        listener = socket.create_server((host, port), backlog=LISTEN_BACKLOG)
+    except OSError as exc:
+        print(f"Cannot listen on {host}:{port}: {exc}")
+        return 1
+    # Idle workers all wake on a connection; the ones that lose the accept move on.
+    listener.setblocking(False)
+    supervisor = PreforkSupervisor(
+        functools.partial(
+            _serve_worker,
+            listener=listener,
+            threads=threads,
+            max_iterations=max_iterations,
+            deadline_s=deadline_s,
+        ),
+        workers,
+        preload=lambda: _preload(workers),
+    )
+    print(f"Serving on http://{host}:{listener.getsockname()[1]} with {workers} workers x {threads} threads.")
+    try:
+        return supervisor.run()
+    finally:
+        listener.close()
+        print(f"Stopped ({supervisor.stats['restarts']} restarts, {supervisor.stats['crashes']} crashes).")
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Sequence
+
+from ..config.settings import Settings
+from ..llm.usage import DEFAULT_USAGE_PATH, UsageStore, aggregate_usage
+from ..utils.metrics import format_table
+
+
+GROUP_KEYS = ("day", "role", "intent", "model", "iteration")
+VALUE_COLUMNS = ("calls", "input_tokens", "output_tokens", "retry_tokens", "cost_usd", "latency_s")
+
+
+def run_usage_report(
+    settings: Settings,
+    *,
+    by: Sequence[str] = ("day", "role", "intent"),
+    days: int | None = None,
+) -> int:
+    _ = settings
+    unknown = [key for key in by if key not in GROUP_KEYS]
+    if unknown:
+        print(f"Unknown --by keys: {', '.join(unknown)} (choose from {', '.join(GROUP_KEYS)}).")
+        return 1
+
+    records = UsageStore(DEFAULT_USAGE_PATH).read()
+    if days:
+        since = (date.today() - timedelta(days=max(1, days) - 1)).isoformat()
+        records = [record for record in records if str(record.get("day", "")) >= since]
+    if not records:
+        print(f"No LLM usage recorded in {DEFAULT_USAGE_PATH}.")
+        return 0
+
+    rows = aggregate_usage(records, by=by)
+    print(format_table(rows, (*by, *VALUE_COLUMNS)))
+    total = aggregate_usage(records, by=())[0]
+    estimated = sum(1 for record in records if record.get("usage_source") == "estimate")
+    print(
+        f"\ntotal: calls={total['calls']} input_tokens={total['input_tokens']} "
+        f"output_tokens={total['output_tokens']} retry_tokens={total['retry_tokens']} "
+        f"cost_usd={total['cost_usd']}"
+    )
+    if estimated:
+        print(f"{estimated} calls without provider usage metadata were estimated at ~4 chars/token.")
+    return 0
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Mapping, Tuple
+
+
+# Strings longer than this (prompts, packed context) are stored zlib-compressed.
+COMPRESS_MIN_CHARS = 2048
+# Recently checkpointed documents kept in process so loads skip the index.
+DOCUMENT_CACHE_SIZE = 4096
+DEFAULT_KEEP_CHECKPOINTS = 20
+# Most recently active threads kept; serve requests without a thread_id each
+# open a one-shot thread, so this bounds the file on a long-running server.
+DEFAULT_MAX_THREADS = 500
+# A long-lived session compacts after this many requests or seconds, whichever comes first.
+DEFAULT_COMPACT_EVERY_WRITES = 200
+DEFAULT_COMPACT_EVERY_S = 600.0
+BUSY_TIMEOUT_MS = 5000
+# Cap the WAL file after each checkpoint instead of letting it grow to the
+# largest transaction ever written.
+JOURNAL_SIZE_LIMIT = 16 * 1024 * 1024
+
+_CHUNK_MARKER = "__unal_rag_chunk__"
+_ZSTR_MARKER = "__unal_rag_zstr__"
+
+ChunkResolver = Callable[[Iterable[str]], Mapping[str, Any]]
+
+
+def keep_checkpoints_from_env() -> int:
+    """Checkpoints kept per thread (``UNAL_RAG_CHECKPOINT_KEEP``; 0 keeps everything)."""
+    try:
+        return max(0, int(os.getenv("UNAL_RAG_CHECKPOINT_KEEP", DEFAULT_KEEP_CHECKPOINTS)))
+    except ValueError:
+        return DEFAULT_KEEP_CHECKPOINTS
+
+
+def max_threads_from_env() -> int:
+    """Threads kept by compaction (``UNAL_RAG_CHECKPOINT_THREADS``; 0 keeps every thread)."""
+    try:
+        return max(0, int(os.getenv("UNAL_RAG_CHECKPOINT_THREADS", DEFAULT_MAX_THREADS)))
+    except ValueError:
+        return DEFAULT_MAX_THREADS
+
+
+def compactor_from_env(compact: Callable[[], Any]) -> "CheckpointCompactor":
+    """``UNAL_RAG_CHECKPOINT_COMPACT_EVERY`` requests / ``UNAL_RAG_CHECKPOINT_COMPACT_S`` seconds (0 disables either)."""
+    try:
+        every_writes = int(os.getenv("UNAL_RAG_CHECKPOINT_COMPACT_EVERY", DEFAULT_COMPACT_EVERY_WRITES))
+    except ValueError:
+        every_writes = DEFAULT_COMPACT_EVERY_WRITES
+    try:
+        every_s = float(os.getenv("UNAL_RAG_CHECKPOINT_COMPACT_S", DEFAULT_COMPACT_EVERY_S))
+    except ValueError:
+        every_s = DEFAULT_COMPACT_EVERY_S
+    return CheckpointCompactor(compact, every_writes=every_writes, every_s=every_s)
+
+
+def _is_document(value: Any) -> bool:
+    return hasattr(value, "page_content") and isinstance(getattr(value, "metadata", None), dict)
+
+
+def _default_document_factory(page_content: str, metadata: Dict[str, Any]) -> Any:
+    from langchain_core.documents import Document
+
+    return Document(page_content=page_content, metadata=metadata)
+
+
+def _default_inner() -> Any:
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    return JsonPlusSerializer()
+
+
+class SlimSerializer:
+    """Checkpoint serde that stores chunk references and compressed strings.
+
+    Wraps the checkpointer's own serializer. Before dumping, every retrieved
+    ``Document`` with a ``chunk_id`` becomes a ``{chunk_id, content_hash}``
+    reference and every string over ``compress_min_chars`` is zlib-compressed.
+    On load, references are rehydrated from an in-process cache of recently
+    dumped documents and, for the rest, with one ``resolver(chunk_ids)`` call
+    against the index. A chunk that is gone (or re-ingested with other content)
+    comes back with empty text and ``metadata["rehydrated"] = False``.
+    """
+
+    def __init__(
+        self,
+        resolver: ChunkResolver | None = None,
+        *,
+        inner: Any = None,
+        compress_min_chars: int = COMPRESS_MIN_CHARS,
+        document_factory: Callable[[str, Dict[str, Any]], Any] | None = None,
+        cache_size: int = DOCUMENT_CACHE_SIZE,
+    ) -> None:
+        self.inner = inner if inner is not None else _default_inner()
+        self.resolver = resolver
+        self.compress_min_chars = compress_min_chars
+        self.document_factory = document_factory or _default_document_factory
+        self.cache_size = cache_size
+        self._documents: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, chunk_id: str, document: Any) -> None:
+        with self._lock:
+            self._documents[chunk_id] = document
+            self._documents.move_to_end(chunk_id)
+            while len(self._documents) > self.cache_size:
+                self._documents.popitem(last=False)
+
+    def _encode(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if len(value) >= self.compress_min_chars:
+                return {_ZSTR_MARKER: zlib.compress(value.encode("utf-8"))}
+            return value
+        if isinstance(value, dict):
+            return {key: self._encode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._encode(item) for item in value]
+        if isinstance(value, tuple):
+            return tuple(self._encode(item) for item in value)
+        if _is_document(value) and value.metadata.get("chunk_id"):
+            chunk_id = str(value.metadata["chunk_id"])
+            self._remember(chunk_id, value)
+            return {_CHUNK_MARKER: chunk_id, "content_hash": value.metadata.get("content_hash")}
+        return value
+
+    def _collect_refs(self, value: Any, refs: set[str]) -> None:
+        if isinstance(value, dict):
+            if _CHUNK_MARKER in value:
+                refs.add(value[_CHUNK_MARKER])
+                return
+            for item in value.values():
+                self._collect_refs(item, refs)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                self._collect_refs(item, refs)
+
+    def _resolve(self, refs: set[str]) -> Dict[str, Any]:
+        with self._lock:
+            found = {chunk_id: self._documents[chunk_id] for chunk_id in refs if chunk_id in self._documents}
+        missing = refs - found.keys()
+        if missing and self.resolver is not None:
+            try:
+                found.update(self.resolver(sorted(missing)))
+            except Exception:
+                pass
+        return found
+
+    def _decode(self, value: Any, documents: Mapping[str, Any]) -> Any:
+        if isinstance(value, dict):
+            if _ZSTR_MARKER in value and len(value) == 1:
+                return zlib.decompress(value[_ZSTR_MARKER]).decode("utf-8")
+            if _CHUNK_MARKER in value:
+                chunk_id = value[_CHUNK_MARKER]
+                document = documents.get(chunk_id)
+                expected = value.get("content_hash")
+                if document is not None and (not expected or document.metadata.get("content_hash") == expected):
+                    return document
+                return self.document_factory("", {"chunk_id": chunk_id, "rehydrated": False})
+            return {key: self._decode(item, documents) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._decode(item, documents) for item in value]
+        if isinstance(value, tuple):
+            return tuple(self._decode(item, documents) for item in value)
+        return value
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return self.inner.dumps_typed(self._encode(obj))
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        value = self.inner.loads_typed(data)
+        refs: set[str] = set()
+        self._collect_refs(value, refs)
+        return self._decode(value, self._resolve(refs) if refs else {})
+
+    # Older checkpointers call the untyped pair.
+    def dumps(self, obj: Any) -> bytes:
+        return self.inner.dumps(self._encode(obj))
+
+    def loads(self, data: bytes) -> Any:
+        value = self.inner.loads(data)
+        refs: set[str] = set()
+        self._collect_refs(value, refs)
+        return self._decode(value, self._resolve(refs) if refs else {})
+
+
+def tune_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """WAL with ``synchronous=NORMAL``, a busy timeout and a bounded WAL file."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA journal_size_limit={JOURNAL_SIZE_LIMIT}")
+    return conn
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return row is not None
+
+
+def _delete_expired(conn: sqlite3.Connection, stats: Dict[str, int]) -> None:
+    # Called inside the compaction transaction, with temp.expired_checkpoints filled.
+    match = "(thread_id, checkpoint_ns, checkpoint_id) IN (SELECT * FROM temp.expired_checkpoints)"
+    stats["checkpoints_deleted"] += conn.execute(f"DELETE FROM checkpoints WHERE {match}").rowcount
+    if _has_table(conn, "writes"):
+        stats["writes_deleted"] += conn.execute(f"DELETE FROM writes WHERE {match}").rowcount
+    conn.execute("DELETE FROM temp.expired_checkpoints")
+
+
+def compact_checkpoints(
+    conn: sqlite3.Connection,
+    *,
+    keep_last: int = DEFAULT_KEEP_CHECKPOINTS,
+    thread_id: str | None = None,
+    max_threads: int = 0,
+) -> Dict[str, int]:
+    """Keep the newest ``keep_last`` checkpoints of each thread (or of ``thread_id``).
+
+    Deletes older rows from LangGraph's ``checkpoints`` and ``writes`` tables
+    (checkpoint IDs sort by time) and truncates the WAL. ``keep_last <= 0``
+    disables per-thread retention. With ``max_threads > 0`` only the
+    ``max_threads`` most recently checkpointed threads are kept at all.
+    """
+    stats = {"checkpoints_deleted": 0, "writes_deleted": 0, "threads_deleted": 0}
+    if (keep_last <= 0 and max_threads <= 0) or not _has_table(conn, "checkpoints"):
+        return stats
+    where, params = ("WHERE thread_id = ?", (thread_id,)) if thread_id is not None else ("", ())
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS temp.expired_checkpoints")
+        conn.execute(
+            "CREATE TEMP TABLE expired_checkpoints (thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT)"
+        )
+        if max_threads > 0 and thread_id is None:
+            conn.execute(
+                """
+                INSERT INTO temp.expired_checkpoints
+                SELECT thread_id, checkpoint_ns, checkpoint_id FROM checkpoints
+                WHERE thread_id IN (
+                    SELECT thread_id FROM checkpoints GROUP BY thread_id
+                    ORDER BY MAX(checkpoint_id) DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (max_threads,),
+            )
+            stats["threads_deleted"] = conn.execute(
+                "SELECT COUNT(DISTINCT thread_id) FROM temp.expired_checkpoints"
+            ).fetchone()[0]
+            _delete_expired(conn, stats)
+        if keep_last > 0:
+            conn.execute(
+                f"""
+                INSERT INTO temp.expired_checkpoints
+                SELECT thread_id, checkpoint_ns, checkpoint_id FROM (
+                    SELECT thread_id, checkpoint_ns, checkpoint_id,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                           ) AS position
+                    FROM checkpoints {where}
+                ) WHERE position > ?
+                """,
+                (*params, keep_last),
+            )
+            _delete_expired(conn, stats)
+        conn.execute("DROP TABLE temp.expired_checkpoints")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return stats
+
+
+def compact_checkpoint_file(
+    path: Path, *, keep_last: int = DEFAULT_KEEP_CHECKPOINTS, max_threads: int = 0
+) -> Dict[str, int]:
+    """``compact_checkpoints`` on its own short-lived connection to ``path``."""
+    if not Path(path).exists():
+        return {"checkpoints_deleted": 0, "writes_deleted": 0, "threads_deleted": 0}
+    conn = tune_connection(sqlite3.connect(str(path)))
+    try:
+        return compact_checkpoints(conn, keep_last=keep_last, max_threads=max_threads)
+    finally:
+        conn.close()
+
+
+class CheckpointCompactor:
+    """Runs ``compact`` every ``every_writes`` requests or ``every_s`` seconds.
+
+    Long-lived processes (``serve`` workers) rarely reach ``close``, so the
+    session reports each finished request with ``note_write``; when
+    compaction is due it runs on a background thread, one at a time. A
+    failed run is retried when the next one is due.
+    """
+
+    def __init__(
+        self,
+        compact: Callable[[], Any],
+        *,
+        every_writes: int = DEFAULT_COMPACT_EVERY_WRITES,
+        every_s: float = DEFAULT_COMPACT_EVERY_S,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.compact = compact
+        self.every_writes = max(0, int(every_writes))
+        self.every_s = max(0.0, float(every_s))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._last = clock()
+        self._running: threading.Thread | None = None
+        self.runs = 0
+
+    def due(self) -> bool:
+        with self._lock:
+            return (self.every_writes > 0 and self._writes >= self.every_writes) or (
+                self.every_s > 0 and self._writes > 0 and self._clock() - self._last >= self.every_s
+            )
+
+    def note_write(self) -> threading.Thread | None:
+        """Count one request; starts (and returns) the compaction thread when due."""
+        with self._lock:
+            self._writes += 1
+        if not self.due():
+            return None
+        with self._lock:
+            if self._running is not None and self._running.is_alive():
+                return None
+            self._writes = 0
+            self._last = self._clock()
+            self._running = threading.Thread(target=self._run, name="unal-rag-checkpoint-compact", daemon=True)
+            self._running.start()
+            return self._running
+
+    def _run(self) -> None:
+        try:
+            self.compact()
+            self.runs += 1
+        except Exception:
+            pass
+
+    def join(self, timeout: float | None = None) -> None:
+        running = self._running
+        if running is not None:
+            running.join(timeout)
@@ -15,6 +15,8 @@ DEFAULT_MIN_DOCS = 50
 DEFAULT_DOCS_PATH = "docs"
 DEFAULT_VECTORSTORE_PATH = "db/chroma_db"
 REQUIRED_ENV_KEYS = ("GOOGLE_API_KEY", "GROQ_API_KEY", "OPENAI_API_KEY")
+# Embeds the index and the questions; both sides must use the same model.
+EMBEDDING_MODEL = "intfloat/multilingual-e5-small"
 
 
 @dataclass(frozen=True)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from ..utils.json_store import SharedJsonStore, load_json_states
+
+
+DEFAULT_BREAKER_STATE_PATH = Path("db") / "circuit_breakers.json"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is short-circuited because its breaker is open."""
+
+
+def load_breaker_states(path: Path = DEFAULT_BREAKER_STATE_PATH) -> Dict[str, Dict[str, Any]]:
+    return load_json_states(path)
+
+
+class BreakerStateStore(SharedJsonStore):
+    """Shares breaker state between processes through a small JSON file.
+
+    Each CLI invocation is a fresh process, so without persistence a breaker
+    could never observe repeated failures. State changes are written through
+    (``flush_interval_s=0``) so other processes see an open breaker at once.
+    """
+
+    def __init__(self, path: Path = DEFAULT_BREAKER_STATE_PATH, *, flush_interval_s: float = 0.0) -> None:
+        super().__init__(path, flush_interval_s=flush_interval_s)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe.
+
+    ``closed`` lets calls through; after ``failure_threshold`` consecutive
+    failures it turns ``open`` and rejects calls until ``cooldown_s`` has
+    elapsed, then lets one probe through (``half_open``) whose outcome closes
+    or re-opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 3,
+        cooldown_s: float = 60.0,
+        store: BreakerStateStore | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_s = max(0.0, float(cooldown_s))
+        self._store = store
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _sync(self) -> None:
+        if self._store is None:
+            return
+        data = self._store.get(self.name)
+        if not data:
+            return
+        self._state = str(data.get("state", CLOSED))
+        self._failures = int(data.get("failures", 0))
+        self._opened_at = float(data.get("opened_at", 0.0))
+
+    def _persist(self) -> None:
+        if self._store is not None:
+            self._store.put(
+                self.name,
+                {
+                    "state": self._state,
+                    "failures": self._failures,
+                    "opened_at": self._opened_at,
+                    "cooldown_s": self.cooldown_s,
+                },
+            )
+
+    def _cooled_down(self, now: float) -> bool:
+        return now - self._opened_at >= self.cooldown_s
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._sync()
+            if self._state == OPEN and self._cooled_down(self._clock()):
+                return HALF_OPEN
+            return self._state
+
+    def is_open(self) -> bool:
+        """True when a call would be rejected right now (no side effects)."""
+        with self._lock:
+            self._sync()
+            if self._state == CLOSED:
+                return False
+            if self._probe_in_flight:
+                return True
+            return not self._cooled_down(self._clock())
+
+    def allow(self) -> bool:
+        """Admit a call; after the cool-down only one probe is admitted."""
+        with self._lock:
+            self._sync()
+            if self._state == CLOSED:
+                return True
+            if self._probe_in_flight or not self._cooled_down(self._clock()):
+                return False
+            self._state = HALF_OPEN
+            self._probe_in_flight = True
+            return True
+
+    def release(self) -> None:
+        """Give back an admitted call that never reached the provider."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            changed = self._state != CLOSED or self._failures
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+            if changed:
+                self._persist()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._sync()
+            self._failures += 1
+            if self._state != CLOSED or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+            self._persist()
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            retry_in = 0.0
+            if state == OPEN:
+                retry_in = max(0.0, self.cooldown_s - (self._clock() - self._opened_at))
+            return {
+                "name": self.name,
+                "state": state,
+                "failures": self._failures,
+                "retry_in_s": round(retry_in, 1),
+            }
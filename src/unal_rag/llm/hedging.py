@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Generic, List, Sequence, TypeVar
+
+
+T = TypeVar("T")
+
+DEFAULT_HEDGE_STATS_PATH = Path("db") / "llm_hedging.json"
+
+
+class NoValidResponseError(RuntimeError):
+    """Raised when no candidate produced a valid response."""
+
+
+def percentile(samples: Sequence[float], q: float) -> float | None:
+    """Nearest-rank percentile (``q`` in 0..1) of ``samples``."""
+    if not samples:
+        return None
+    ordered = sorted(float(value) for value in samples)
+    rank = min(len(ordered), max(1, math.ceil(q * len(ordered))))
+    return ordered[rank - 1]
+
+
+@dataclass
+class HedgeOutcome(Generic[T]):
+    index: int | None = None
+    value: T | None = None
+    error: BaseException | None = None
+    hedged: bool = False
+    started: int = 0
+    cancelled: List[int] = field(default_factory=list)
+    elapsed_s: float = 0.0
+    # Time for calls[0] to return a valid response; None when it failed or lost.
+    primary_latency_s: float | None = None
+
+
+LatencyCallback = Callable[[float, bool], None]
+
+
+def _watch_abandoned(
+    future: Future,
+    *,
+    start: float,
+    decided_s: float,
+    is_valid: Callable[[T], bool],
+    on_latency: LatencyCallback,
+    censor_after_s: float | None,
+) -> None:
+    """Report the latency of a primary that lost to a hedge, once.
+
+    A valid late response reports its real latency. A failure, a cancel or
+    no answer within ``censor_after_s`` of the decision reports a censored
+    sample: the time waited so far, which is at least ``decided_s``.
+    """
+    lock = threading.Lock()
+    reported: List[bool] = []
+    timer: threading.Timer | None = None
+
+    def _report(latency: float, censored: bool) -> None:
+        with lock:
+            if reported:
+                return
+            reported.append(True)
+        if timer is not None:
+            timer.cancel()
+        on_latency(max(latency, decided_s) if censored else latency, censored)
+
+    def _done(done: Future) -> None:
+        latency = time.monotonic() - start
+        try:
+            valid = is_valid(done.result())
+        except BaseException:
+            valid = False
+        _report(latency, not valid)
+
+    if censor_after_s is not None:
+        timer = threading.Timer(censor_after_s, lambda: _report(time.monotonic() - start, True))
+        timer.daemon = True
+        timer.start()
+    future.add_done_callback(_done)
+
+
+def run_hedged(
+    calls: Sequence[Callable[[threading.Event], T]],
+    *,
+    hedge_delay_s: float | None,
+    is_valid: Callable[[T], bool] = lambda value: value is not None,
+    on_primary_latency: LatencyCallback | None = None,
+    censor_after_s: float | None = None,
+) -> HedgeOutcome[T]:
+    """Run ``calls`` in priority order, hedging slow ones.
+
+    ``calls[0]`` starts immediately. The next candidate starts when every
+    running call has been outstanding for ``hedge_delay_s`` (``None``
+    disables hedging) or as soon as a running call fails, so the list also
+    works as an ordered failover chain. The first valid response wins; the
+    remaining calls get their cancel event set (queued calls stop waiting)
+    and their futures cancelled where they have not started yet.
+
+    ``on_primary_latency(latency_s, censored)`` gets the primary's latency
+    whenever it was still running at the decision: at once when it wins,
+    later (from another thread) when it loses, so slow primaries are not
+    dropped from the sample the hedge delay is computed from.
+    """
+    outcome: HedgeOutcome[T] = HedgeOutcome()
+    if not calls:
+        outcome.error = NoValidResponseError("No candidates to call.")
+        return outcome
+
+    cancels = [threading.Event() for _ in calls]
+    executor = ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="llm-hedge")
+    running: Dict[Future, int] = {}
+    start = time.monotonic()
+
+    def _start_next() -> None:
+        idx = outcome.started
+        if idx < len(calls):
+            running[executor.submit(calls[idx], cancels[idx])] = idx
+            outcome.started += 1
+
+    try:
+        _start_next()
+        while running:
+            can_hedge = hedge_delay_s is not None and outcome.started < len(calls)
+            done, _ = wait(
+                list(running),
+                timeout=hedge_delay_s if can_hedge else None,
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                outcome.hedged = True
+                _start_next()
+                continue
+            for future in done:
+                idx = running.pop(future)
+                try:
+                    value = future.result()
+                except Exception as exc:
+                    outcome.error = exc
+                    _start_next()
+                    continue
+                if not is_valid(value):
+                    outcome.error = NoValidResponseError(f"Candidate {idx} returned an invalid response.")
+                    _start_next()
+                    continue
+                outcome.index = idx
+                outcome.value = value
+                outcome.error = None
+                outcome.elapsed_s = time.monotonic() - start
+                if idx == 0:
+                    outcome.primary_latency_s = outcome.elapsed_s
+                    if on_primary_latency is not None:
+                        on_primary_latency(outcome.elapsed_s, False)
+                for other, other_idx in running.items():
+                    if other_idx == 0 and on_primary_latency is not None:
+                        _watch_abandoned(
+                            other,
+                            start=start,
+                            decided_s=outcome.elapsed_s,
+                            is_valid=is_valid,
+                            on_latency=on_primary_latency,
+                            censor_after_s=censor_after_s,
+                        )
+                    cancels[other_idx].set()
+                    other.cancel()
+                    outcome.cancelled.append(other_idx)
+                return outcome
+        outcome.elapsed_s = time.monotonic() - start
+        return outcome
+    finally:
+        # Do not block on losing calls that are already talking to a provider.
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from typing import Any, Callable, Dict, TypeVar
+
+from ..utils.errors import is_rate_limit_429, retry_after_seconds
+
+
+T = TypeVar("T")
+
+MIN_BACKOFF_S = 1.0
+MAX_BACKOFF_S = 60.0
+MIN_RATE_SCALE = 0.25
+RATE_SCALE_RECOVERY = 0.05
+
+
+class QueueTimeoutError(TimeoutError):
+    """Raised when a request cannot be admitted before its deadline."""
+
+
+class CallCancelledError(RuntimeError):
+    """Raised when a queued request is cancelled before reaching the provider."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a provider call is abandoned because the request deadline passed."""
+
+
+def run_with_timeout(fn: Callable[[], T], timeout_s: float | None) -> T:
+    """Run ``fn`` and wait at most ``timeout_s`` seconds for it (``None`` runs it inline).
+
+    The call runs in a daemon thread with the caller's context variables. On
+    timeout it is abandoned, not interrupted: the thread finishes in the
+    background, its result is dropped and ``DeadlineExceededError`` is raised.
+    """
+    if timeout_s is None:
+        return fn()
+    if timeout_s <= 0:
+        raise DeadlineExceededError("No time left before the request deadline.")
+    context = contextvars.copy_context()
+    done = threading.Event()
+    result: Dict[str, Any] = {}
+
+    def _target() -> None:
+        try:
+            result["value"] = context.run(fn)
+        except BaseException as exc:
+            result["error"] = exc
+        finally:
+            done.set()
+
+    threading.Thread(target=_target, name="llm-call", daemon=True).start()
+    if not done.wait(timeout_s):
+        raise DeadlineExceededError(f"Provider call abandoned after {timeout_s:.1f}s at the request deadline.")
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+class TokenBucket:
+    """Continuous-refill token bucket; ``capacity`` tokens per minute."""
+
+    def __init__(self, capacity: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.capacity = max(1.0, float(capacity))
+        self.scale = 1.0
+        self._clock = clock
+        self._available = self.capacity
+        self._updated = clock()
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity * self.scale / 60.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated)
+        self._available = min(self.capacity, self._available + elapsed * self.refill_per_second)
+        self._updated = now
+
+    def available(self, now: float | None = None) -> float:
+        self._refill(self._clock() if now is None else now)
+        return self._available
+
+    def time_until(self, amount: float, now: float | None = None) -> float:
+        # Requests larger than the bucket are admitted once it is full.
+        amount = min(float(amount), self.capacity)
+        missing = amount - self.available(now)
+        if missing <= 0:
+            return 0.0
+        return missing / self.refill_per_second
+
+    def consume(self, amount: float, now: float | None = None) -> None:
+        self._refill(self._clock() if now is None else now)
+        self._available -= min(float(amount), self.capacity)
+
+
+class ProviderScheduler:
+    """Admission control for one LLM provider.
+
+    Calls wait (up to a deadline) for request and token budget instead of
+    hitting the provider, and 429 responses trigger an adaptive backoff that
+    honours ``retry-after`` hints and temporarily lowers the refill rate.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        *,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_queue_wait_s: float = 30.0,
+        max_attempts: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.provider = provider
+        self.max_queue_wait_s = max(0.0, float(max_queue_wait_s))
+        self.max_attempts = max(1, int(max_attempts))
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(requests_per_minute, clock)
+        self._tokens = TokenBucket(tokens_per_minute, clock)
+        self._backoff_s = 0.0
+        self._blocked_until = 0.0
+        self._waiting = 0
+
+    def _admission_delay(self, tokens: int, now: float) -> float:
+        return max(
+            self._blocked_until - now,
+            self._requests.time_until(1, now),
+            self._tokens.time_until(tokens, now),
+        )
+
+    def _acquire(
+        self, tokens: int, deadline: float, cancelled: threading.Event | None
+    ) -> None:
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                raise CallCancelledError(f"{self.provider}: request cancelled while queued.")
+            with self._lock:
+                now = self._clock()
+                delay = self._admission_delay(tokens, now)
+                if delay <= 0:
+                    self._requests.consume(1, now)
+                    self._tokens.consume(tokens, now)
+                    return
+            if now + delay > deadline:
+                raise QueueTimeoutError(
+                    f"{self.provider}: request could not be admitted before its deadline "
+                    f"(needs {delay:.1f}s, {max(0.0, deadline - now):.1f}s left)."
+                )
+            if cancelled is not None:
+                cancelled.wait(delay)
+            else:
+                self._sleep(delay)
+
+    def _on_throttled(self, exc: Exception) -> float:
+        with self._lock:
+            now = self._clock()
+            self._backoff_s = min(MAX_BACKOFF_S, max(MIN_BACKOFF_S, self._backoff_s * 2))
+            delay = max(self._backoff_s, retry_after_seconds(exc) or 0.0)
+            self._blocked_until = max(self._blocked_until, now + delay)
+            for bucket in (self._requests, self._tokens):
+                bucket.available(now)
+                bucket.scale = max(MIN_RATE_SCALE, bucket.scale / 2)
+            return delay
+
+    def _on_success(self) -> None:
+        with self._lock:
+            now = self._clock()
+            self._backoff_s = self._backoff_s / 2 if self._backoff_s > MIN_BACKOFF_S else 0.0
+            for bucket in (self._requests, self._tokens):
+                bucket.available(now)
+                bucket.scale = min(1.0, bucket.scale + RATE_SCALE_RECOVERY)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            return {
+                "provider": self.provider,
+                "queue_depth": self._waiting,
+                "requests_available": round(self._requests.available(now), 2),
+                "tokens_available": round(self._tokens.available(now), 2),
+                "rate_scale": round(self._requests.scale, 3),
+                "blocked_for_s": round(max(0.0, self._blocked_until - now), 3),
+            }
+
+    def run(
+        self,
+        fn: Callable[[], T],
+        *,
+        tokens: int = 0,
+        deadline: float | None = None,
+        stats: Dict[str, Any] | None = None,
+        cancelled: threading.Event | None = None,
+    ) -> T:
+        """Run ``fn`` once budget is available, retrying throttled calls.
+
+        ``deadline`` is an absolute ``clock()`` value; by default the request
+        may queue for ``max_queue_wait_s``. ``stats`` is filled in place (also
+        when the call fails) with queue depth, wait time and attempts. Setting
+        ``cancelled`` aborts the request while it is still queued.
+        """
+        start = self._clock()
+        if deadline is None:
+            deadline = start + self.max_queue_wait_s
+        with self._lock:
+            self._waiting += 1
+            queue_depth = self._waiting
+        attempts = 0
+        throttled = 0
+        call_s = 0.0
+        try:
+            while True:
+                self._acquire(tokens, deadline, cancelled)
+                attempts += 1
+                call_start = self._clock()
+                try:
+                    result = fn()
+                except Exception as exc:
+                    call_s += self._clock() - call_start
+                    if not is_rate_limit_429(exc) or attempts >= self.max_attempts:
+                        raise
+                    throttled += 1
+                    delay = self._on_throttled(exc)
+                    if self._clock() + delay > deadline:
+                        raise
+                    continue
+                call_s += self._clock() - call_start
+                self._on_success()
+                return result
+        finally:
+            with self._lock:
+                self._waiting -= 1
+            if stats is not None:
+                elapsed = self._clock() - start
+                stats.update(
+                    {
+                        "provider": self.provider,
+                        "queue_depth": queue_depth,
+                        "wait_s": round(max(0.0, elapsed - call_s), 3),
+                        "latency_s": round(call_s, 3),
+                        "attempts": attempts,
+                        "throttled": throttled,
+                    }
+                )
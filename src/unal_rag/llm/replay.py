@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from ..utils.json_store import SharedJsonStore
+
+
+# z-score of the 95th percentile of a standard normal distribution.
+_Z95 = 1.6448536
+
+
+class ReplayMissError(LookupError):
+    """Raised when replay mode has no recorded response for a prompt."""
+
+
+def fixture_key(role_name: str, prompt: str) -> str:
+    normalized = " ".join(str(prompt).split())
+    return hashlib.sha256(f"{role_name}\n{normalized}".encode("utf-8")).hexdigest()[:24]
+
+
+class LatencySampler:
+    """Log-normal latency samples with a given median and p95."""
+
+    def __init__(
+        self,
+        p50_s: float,
+        p95_s: float,
+        *,
+        scale: float = 1.0,
+        rng: random.Random | None = None,
+    ) -> None:
+        p50_s = max(1e-6, float(p50_s))
+        self._mu = math.log(p50_s)
+        self._sigma = max(0.0, math.log(max(p95_s, p50_s) / p50_s) / _Z95)
+        self.scale = max(0.0, float(scale))
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        if self.scale <= 0:
+            return 0.0
+        with self._lock:
+            return self._rng.lognormvariate(self._mu, self._sigma) * self.scale
+
+
+class FixtureStore:
+    """Recorded LLM responses keyed by role and prompt, in one JSON file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._store = SharedJsonStore(self.path)
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    def lookup(self, role_name: str, prompt: str) -> Dict[str, Any]:
+        entry = self._store.get(fixture_key(role_name, prompt))
+        if entry is None:
+            self.misses += 1
+            raise ReplayMissError(f"No recorded response for role {role_name} and this prompt.")
+        self.hits += 1
+        return entry
+
+    def record(self, role_name: str, prompt: str, *, kind: str, payload: Any, schema: str = "") -> None:
+        self._store.put(
+            fixture_key(role_name, prompt),
+            {"role": role_name, "kind": kind, "schema": schema, "payload": payload},
+        )
+        self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "entries": len(self._store.load_all()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+
+def _ai_message(content: str):
+    from langchain_core.messages import AIMessage
+
+    return AIMessage(content=content)
+
+
+class _StructuredReplay:
+    def __init__(self, model: "ReplayChatModel", schema: Any) -> None:
+        self._model = model
+        self._schema = schema
+
+    def invoke(self, prompt: str) -> Any:
+        entry = self._model._lookup(prompt)
+        return self._schema.model_validate(entry["payload"])
+
+
+class ReplayChatModel:
+    """Serves recorded responses for one role with synthetic latency.
+
+    Supports the two call shapes used by the nodes: ``invoke(prompt)`` and
+    ``with_structured_output(schema).invoke(prompt)``.
+    """
+
+    def __init__(
+        self,
+        role_name: str,
+        store: FixtureStore,
+        *,
+        latency: LatencySampler | None = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.role_name = role_name
+        self._store = store
+        self._latency = latency
+        self._sleep = sleep
+
+    def _lookup(self, prompt: str) -> Dict[str, Any]:
+        if self._latency is not None:
+            self._sleep(self._latency.sample())
+        return self._store.lookup(self.role_name, prompt)
+
+    def with_structured_output(self, schema: Any) -> _StructuredReplay:
+        return _StructuredReplay(self, schema)
+
+    def invoke(self, prompt: str):
+        entry = self._lookup(prompt)
+        return _ai_message(str(entry["payload"]))
+
+
+class _StructuredRecorder:
+    def __init__(self, model: "RecordingChatModel", schema: Any) -> None:
+        self._model = model
+        self._schema = schema
+
+    def invoke(self, prompt: str) -> Any:
+        result = self._model._inner.with_structured_output(self._schema).invoke(prompt)
+        if result is not None:
+            self._model._store.record(
+                self._model.role_name,
+                prompt,
+                kind="structured",
+                payload=result.model_dump(mode="json"),
+                schema=getattr(self._schema, "__name__", ""),
+            )
+        return result
+
+
+class RecordingChatModel:
+    """Wraps a live chat model and saves every response for later replay."""
+
+    def __init__(self, inner: Any, role_name: str, store: FixtureStore) -> None:
+        self._inner = inner
+        self.role_name = role_name
+        self._store = store
+
+    def with_structured_output(self, schema: Any) -> _StructuredRecorder:
+        return _StructuredRecorder(self, schema)
+
+    def invoke(self, prompt: str):
+        response = self._inner.invoke(prompt)
+        content = response.content if isinstance(response.content, str) else str(response.content)
+        self._store.record(self.role_name, prompt, kind="text", payload=content)
+        return response
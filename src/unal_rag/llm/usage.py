@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Sequence, TypeVar
+
+
+T = TypeVar("T")
+
+DEFAULT_USAGE_PATH = Path("db") / "llm_usage.jsonl"
+USAGE_FIELDS = ("input_tokens", "output_tokens")
+
+
+def run_with_usage(fn: Callable[[], T]) -> tuple[T, Dict[str, int] | None]:
+    """Run ``fn`` and collect the token usage reported by LangChain chat models.
+
+    Returns ``None`` for the usage when nothing was reported (replayed
+    responses, providers without usage metadata, older ``langchain_core``).
+    """
+    try:
+        from langchain_core.callbacks import get_usage_metadata_callback
+    except ImportError:
+        return fn(), None
+    with get_usage_metadata_callback() as callback:
+        result = fn()
+    reported = list(callback.usage_metadata.values())
+    if not reported:
+        return result, None
+    return result, {
+        field: sum(int(item.get(field, 0) or 0) for item in reported) for field in USAGE_FIELDS
+    }
+
+
+def call_cost(usage: Mapping[str, Any], input_per_mtok: float, output_per_mtok: float) -> float:
+    return (
+        int(usage.get("input_tokens", 0)) * input_per_mtok
+        + int(usage.get("output_tokens", 0)) * output_per_mtok
+    ) / 1_000_000
+
+
+def flatten_calls(llm_calls: Iterable[Mapping[str, Any]]) -> List[Mapping[str, Any]]:
+    """One entry per provider call; hedged requests expand to every candidate that ran."""
+    flat = []
+    for entry in llm_calls or []:
+        hedge = entry.get("hedge") or {}
+        if hedge.get("calls"):
+            for call in hedge["calls"]:
+                flat.append({**call, "iteration": entry.get("iteration", call.get("iteration"))})
+        else:
+            flat.append(entry)
+    return flat
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "latency_s": 0.0}
+
+
+def _add(totals: Dict[str, Any], call: Mapping[str, Any]) -> None:
+    usage = call.get("usage") or {}
+    totals["calls"] += 1
+    for field in USAGE_FIELDS:
+        totals[field] += int(usage.get(field, 0) or 0)
+    totals["cost_usd"] += float(call.get("cost_usd", 0.0) or 0.0)
+    totals["latency_s"] += float(call.get("latency_s", 0.0) or 0.0)
+
+
+def _rounded(totals: Dict[str, Any]) -> Dict[str, Any]:
+    return {**totals, "cost_usd": round(totals["cost_usd"], 6), "latency_s": round(totals["latency_s"], 3)}
+
+
+def usage_totals(llm_calls: Iterable[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Per-request token, cost and latency totals, overall and by role."""
+    total = _empty_totals()
+    by_role: Dict[str, Dict[str, Any]] = {}
+    for call in flatten_calls(llm_calls):
+        if not call.get("usage"):
+            continue
+        _add(total, call)
+        _add(by_role.setdefault(str(call.get("role", "unknown")), _empty_totals()), call)
+    return {
+        "total": _rounded(total),
+        "by_role": {role: _rounded(values) for role, values in sorted(by_role.items())},
+    }
+
+
+class UsageStore:
+    """Append-only JSON-lines log of LLM calls for cumulative usage reports."""
+
+    def __init__(self, path: Path = DEFAULT_USAGE_PATH) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def append(self, records: Sequence[Mapping[str, Any]]) -> None:
+        if not records:
+            return
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # One write per request on an O_APPEND descriptor, so processes do not interleave lines.
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, payload.encode("utf-8"))
+            finally:
+                os.close(fd)
+
+    def read(self) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        records = []
+        with self.path.open(encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records
+
+
+def request_records(
+    llm_calls: Iterable[Mapping[str, Any]],
+    *,
+    intent: str | None,
+    thread_id: str = "default",
+    now: datetime | None = None,
+) -> List[Dict[str, Any]]:
+    """Usage-store records for every provider call of one request."""
+    now = now or datetime.now(timezone.utc)
+    records = []
+    for call in flatten_calls(llm_calls):
+        usage = call.get("usage")
+        if not usage:
+            continue
+        records.append(
+            {
+                "ts": now.isoformat(timespec="seconds"),
+                "day": now.date().isoformat(),
+                "thread_id": thread_id,
+                "intent": intent or "unknown",
+                "role": call.get("role", "unknown"),
+                "model": call.get("model"),
+                "iteration": int(call.get("iteration", 0) or 0),
+                "input_tokens": int(usage.get("input_tokens", 0) or 0),
+                "output_tokens": int(usage.get("output_tokens", 0) or 0),
+                "usage_source": usage.get("source", "provider"),
+                "cost_usd": float(call.get("cost_usd", 0.0) or 0.0),
+                "latency_s": float(call.get("latency_s", 0.0) or 0.0),
+                "outcome": call.get("outcome"),
+            }
+        )
+    return records
+
+
+def aggregate_usage(
+    records: Iterable[Mapping[str, Any]], *, by: Sequence[str] = ("day", "role", "intent")
+) -> List[Dict[str, Any]]:
+    """Sum usage records by the given keys; ``retry_tokens`` counts iterations after the first."""
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for record in records:
+        key = tuple(record.get(field, "unknown") for field in by)
+        group = groups.setdefault(
+            key,
+            {
+                **dict(zip(by, key)),
+                "calls": 0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "retry_tokens": 0,
+                "cost_usd": 0.0,
+                "latency_s": 0.0,
+            },
+        )
+        tokens = int(record.get("input_tokens", 0)) + int(record.get("output_tokens", 0))
+        group["calls"] += 1
+        group["input_tokens"] += int(record.get("input_tokens", 0))
+        group["output_tokens"] += int(record.get("output_tokens", 0))
+        if int(record.get("iteration", 0) or 0) > 0:
+            group["retry_tokens"] += tokens
+        group["cost_usd"] += float(record.get("cost_usd", 0.0))
+        group["latency_s"] += float(record.get("latency_s", 0.0))
+    rows = []
+    for key in sorted(groups, key=lambda item: tuple(str(part) for part in item)):
+        group = groups[key]
+        group["cost_usd"] = round(group["cost_usd"], 4)
+        group["latency_s"] = round(group["latency_s"], 1)
+        rows.append(group)
+    return rows
@@ -1,16 +1,38 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Dict
 
 
 DEFAULT_MEMORY_PATH = Path("db") / "memory.json"
+DEFAULT_MEMORY_DB_PATH = Path("db") / "memory.sqlite3"
+DEFAULT_USER_ID = "default"
+BUSY_TIMEOUT_MS = 5000
+DEFAULT_FLUSH_INTERVAL_S = 1.0
+DEFAULT_MAX_STALENESS_S = 0.5
+DEFAULT_MAX_CACHED_PROFILES = 1024
+MAX_FLUSH_ATTEMPTS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memory (
+    user_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL
+)
+"""
 
 
 @dataclass(frozen=True)
 class MemoryStore:
+    """Legacy single-profile JSON file; only read to migrate into ``SqliteMemoryStore``."""
+
     path: Path = DEFAULT_MEMORY_PATH
 
     def load(self) -> Dict[str, Any]:
@@ -26,3 +48,342 @@ class MemoryStore:
         self.path.write_text(
             json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8"
         )
+
+
+class SqliteMemoryStore:
+    """Per-user memory profiles in SQLite (WAL), one row per user.
+
+    Reads are a primary-key lookup; writes are single-row upserts in their own
+    transaction, so concurrent requests and processes never clobber each
+    other's profiles. Connections are per thread. On first use the legacy
+    ``memory.json`` profile is imported for ``DEFAULT_USER_ID``.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_MEMORY_DB_PATH,
+        *,
+        legacy_path: Path | None = DEFAULT_MEMORY_PATH,
+    ) -> None:
+        self.path = Path(path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    with conn:
+                        conn.execute(_SCHEMA)
+                    self._migrate_legacy(conn)
+                    self._initialized = True
+        return conn
+
+    def _migrate_legacy(self, conn: sqlite3.Connection) -> None:
+        if self.legacy_path is None or not self.legacy_path.exists():
+            return
+        payload = MemoryStore(self.legacy_path).load()
+        if payload:
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO memory (user_id, payload, version, updated_at) VALUES (?, ?, 1, ?)",
+                    (DEFAULT_USER_ID, json.dumps(payload, ensure_ascii=False), time.time()),
+                )
+        try:
+            self.legacy_path.rename(self.legacy_path.with_name(f"{self.legacy_path.name}.migrated"))
+        except OSError:
+            pass
+
+    def load_versioned(self, user_id: str = DEFAULT_USER_ID) -> tuple[Dict[str, Any], int]:
+        """Profile and its version (0 when the user has no row)."""
+        row = self._connect().execute(
+            "SELECT payload, version FROM memory WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return {}, 0
+        try:
+            payload = json.loads(row[0])
+        except json.JSONDecodeError:
+            return {}, int(row[1])
+        return (payload if isinstance(payload, dict) else {}), int(row[1])
+
+    def load(self, user_id: str = DEFAULT_USER_ID) -> Dict[str, Any]:
+        return self.load_versioned(user_id)[0]
+
+    def save(self, user_id: str, payload: Dict[str, Any]) -> int:
+        """Upsert the user's profile; returns the new version."""
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                """
+                INSERT INTO memory (user_id, payload, version, updated_at) VALUES (?, ?, 1, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    payload = excluded.payload,
+                    version = memory.version + 1,
+                    updated_at = excluded.updated_at
+                RETURNING version
+                """,
+                (user_id, json.dumps(payload, ensure_ascii=False), time.time()),
+            ).fetchone()
+        return int(row[0])
+
+    def version(self, user_id: str) -> int:
+        row = self._connect().execute("SELECT version FROM memory WHERE user_id = ?", (user_id,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def compare_and_save(self, user_id: str, payload: Dict[str, Any], expected_version: int) -> int | None:
+        """Write only if the stored version is still ``expected_version``; None on conflict."""
+        data = json.dumps(payload, ensure_ascii=False)
+        conn = self._connect()
+        with conn:
+            if expected_version == 0:
+                row = conn.execute(
+                    """
+                    INSERT INTO memory (user_id, payload, version, updated_at) VALUES (?, ?, 1, ?)
+                    ON CONFLICT(user_id) DO NOTHING
+                    RETURNING version
+                    """,
+                    (user_id, data, time.time()),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    """
+                    UPDATE memory SET payload = ?, version = version + 1, updated_at = ?
+                    WHERE user_id = ? AND version = ?
+                    RETURNING version
+                    """,
+                    (data, time.time(), user_id, expected_version),
+                ).fetchone()
+        return int(row[0]) if row else None
+
+    def delete(self, user_id: str) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM memory WHERE user_id = ?", (user_id,))
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def profile_changes(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Keys of ``new`` that differ from ``old``; dict values (glossary) are diffed one level down."""
+    changes: Dict[str, Any] = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if value == previous:
+            continue
+        if isinstance(value, dict) and isinstance(previous, dict):
+            changes[key] = {sub: item for sub, item in value.items() if previous.get(sub) != item}
+        else:
+            changes[key] = value
+    return changes
+
+
+def apply_changes(base: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(base)
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+@dataclass
+class _CachedProfile:
+    payload: Dict[str, Any] = field(default_factory=dict)
+    version: int = 0
+    checked_at: float = 0.0
+    changes: Dict[str, Any] = field(default_factory=dict)
+    loaded: bool = False
+    # Set when the LRU drops the entry; holders of a stale reference look it up again.
+    evicted: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+
+class CachedMemoryStore:
+    """Write-behind cache in front of ``SqliteMemoryStore``.
+
+    Reads are served from memory; a clean entry older than ``max_staleness_s``
+    is revalidated against the row's version stamp, so profiles written by
+    other worker processes show up within that window. ``save`` only records
+    the changed keys; a background thread flushes them every
+    ``flush_interval_s`` (and ``close`` flushes on shutdown) with a
+    compare-and-swap on the version. On conflict the pending changes are
+    re-applied on top of the newer row.
+
+    The store lock only guards the entry table; SQLite reads and writes run
+    under the entry's own lock, so one slow profile does not stall the rest.
+    At most ``max_entries`` profiles stay cached, least recently used first
+    out; entries with unflushed changes are never evicted.
+    """
+
+    def __init__(
+        self,
+        backend: SqliteMemoryStore,
+        *,
+        flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S,
+        max_staleness_s: float = DEFAULT_MAX_STALENESS_S,
+        max_entries: int = DEFAULT_MAX_CACHED_PROFILES,
+        clock=time.monotonic,
+    ) -> None:
+        self.backend = backend
+        self.flush_interval_s = max(0.0, float(flush_interval_s))
+        self.max_staleness_s = max(0.0, float(max_staleness_s))
+        self.max_entries = max(1, int(max_entries))
+        self._clock = clock
+        self._entries: OrderedDict[str, _CachedProfile] = OrderedDict()
+        self._lock = threading.Lock()
+        self._flusher: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.stats = {
+            "hits": 0,
+            "revalidations": 0,
+            "reloads": 0,
+            "flushes": 0,
+            "conflicts": 0,
+            "evictions": 0,
+        }
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _entry(self, user_id: str) -> _CachedProfile:
+        """The cached entry for ``user_id`` (an unloaded one if new), marked most recently used."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                entry = self._entries[user_id] = _CachedProfile()
+                self._evict(keep=user_id)
+            else:
+                self._entries.move_to_end(user_id)
+            return entry
+
+    def _evict(self, *, keep: str) -> None:
+        # Called with the store lock held; skips dirty entries and entries in use.
+        excess = len(self._entries) - self.max_entries
+        for user_id, entry in list(self._entries.items()):
+            if excess <= 0:
+                return
+            if user_id == keep or entry.changes or not entry.lock.acquire(blocking=False):
+                continue
+            try:
+                if entry.changes:
+                    continue
+                entry.evicted = True
+                del self._entries[user_id]
+                self.stats["evictions"] += 1
+                excess -= 1
+            finally:
+                entry.lock.release()
+
+    def _reload(self, user_id: str, entry: _CachedProfile, now: float) -> None:
+        entry.payload, entry.version = self.backend.load_versioned(user_id)
+        entry.checked_at = now
+        entry.loaded = True
+        self._count("reloads")
+
+    def load(self, user_id: str = DEFAULT_USER_ID) -> Dict[str, Any]:
+        while True:
+            entry = self._entry(user_id)
+            with entry.lock:
+                if entry.evicted:
+                    continue
+                now = self._clock()
+                if entry.loaded and (entry.changes or now - entry.checked_at < self.max_staleness_s):
+                    self._count("hits")
+                elif entry.loaded and self.backend.version(user_id) == entry.version:
+                    self._count("revalidations")
+                    entry.checked_at = now
+                else:
+                    self._reload(user_id, entry, now)
+                return dict(entry.payload)
+
+    def save(self, user_id: str, payload: Dict[str, Any]) -> bool:
+        """Queue the changed keys of ``payload``; returns False when nothing changed."""
+        while True:
+            entry = self._entry(user_id)
+            with entry.lock:
+                if entry.evicted:
+                    continue
+                if not entry.loaded:
+                    self._reload(user_id, entry, self._clock())
+                changes = profile_changes(entry.payload, payload)
+                if not changes:
+                    return False
+                entry.payload = apply_changes(entry.payload, changes)
+                entry.changes = apply_changes(entry.changes, changes)
+                if self.flush_interval_s == 0:
+                    self._flush_entry(user_id, entry)
+            break
+        if self.flush_interval_s > 0:
+            self._ensure_flusher()
+        return True
+
+    def dirty_users(self) -> list[str]:
+        with self._lock:
+            return [user_id for user_id, entry in self._entries.items() if entry.changes]
+
+    def _flush_entry(self, user_id: str, entry: _CachedProfile) -> None:
+        # Called with the entry lock held.
+        for _ in range(MAX_FLUSH_ATTEMPTS):
+            version = self.backend.compare_and_save(user_id, entry.payload, entry.version)
+            if version is not None:
+                entry.version = version
+                entry.changes = {}
+                entry.checked_at = self._clock()
+                self._count("flushes")
+                return
+            # Another process wrote first: re-apply our changes on its row.
+            self._count("conflicts")
+            latest, latest_version = self.backend.load_versioned(user_id)
+            entry.payload = apply_changes(latest, entry.changes)
+            entry.version = latest_version
+
+    def flush(self) -> None:
+        # Snapshot the dirty entries, then write each under its own lock only.
+        with self._lock:
+            dirty = [(user_id, entry) for user_id, entry in self._entries.items() if entry.changes]
+        for user_id, entry in dirty:
+            with entry.lock:
+                if not entry.changes:
+                    continue
+                try:
+                    self._flush_entry(user_id, entry)
+                except sqlite3.Error:
+                    # Keep the changes dirty; the next flush retries.
+                    continue
+
+    def _ensure_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._run_flusher, name="unal-rag-memory-flush", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        while not self._stop.wait(self.flush_interval_s):
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the flusher and write every pending change."""
+        self._stop.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self._flusher = None
+        self.flush()
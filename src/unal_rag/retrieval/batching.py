@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Sequence
+
+
+# One e5-small forward pass costs ~10-20 ms on CPU; waiting a couple of
+# milliseconds for company is cheap next to that.
+DEFAULT_BATCH_WINDOW_MS = 2.0
+DEFAULT_MAX_BATCH = 16
+# Recent question vectors, so later nodes (and the next turn's follow-up check)
+# get them without keeping vectors in checkpointed state.
+DEFAULT_CACHE_SIZE = 256
+
+Vector = List[float]
+BatchFn = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.environ[name]))
+    except (KeyError, ValueError):
+        return default
+
+
+def batch_window_ms_from_env() -> float:
+    """Collection window (``UNAL_RAG_EMBED_BATCH_MS``; 0 embeds every query on its own)."""
+    return _env_float("UNAL_RAG_EMBED_BATCH_MS", DEFAULT_BATCH_WINDOW_MS)
+
+
+def max_batch_from_env() -> int:
+    return max(1, int(_env_float("UNAL_RAG_EMBED_BATCH_MAX", DEFAULT_MAX_BATCH)))
+
+
+def cache_size_from_env() -> int:
+    return int(_env_float("UNAL_RAG_EMBED_CACHE", DEFAULT_CACHE_SIZE))
+
+
+class _Request:
+    __slots__ = ("text", "enqueued", "done", "vector", "error")
+
+    def __init__(self, text: str, enqueued: float) -> None:
+        self.text = text
+        self.enqueued = enqueued
+        self.done = threading.Event()
+        self.vector: Vector | None = None
+        self.error: BaseException | None = None
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-text embedding calls into batched forward passes.
+
+    ``embed`` queues the text and blocks. A background daemon thread (started
+    on first use) takes the oldest request, waits until ``window_ms`` after it
+    was queued or until ``max_batch`` texts are waiting, runs ``batch_fn`` once
+    on all of them and hands each caller its vector (or the batch's exception).
+    Requests that arrive while a batch runs form the next one. With
+    ``window_ms`` 0 or ``max_batch`` 1, ``embed`` calls ``batch_fn`` directly.
+    The last ``cache_size`` texts embedded are answered from memory.
+    """
+
+    def __init__(
+        self,
+        batch_fn: BatchFn,
+        *,
+        window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        cache_size: int = 0,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.batch_fn = batch_fn
+        self.window_s = max(0.0, float(window_ms)) / 1000
+        self.max_batch = max(1, int(max_batch))
+        self.cache_size = max(0, int(cache_size))
+        self._cache: OrderedDict[str, Vector] = OrderedDict()
+        self._cache_hits = 0
+        self._clock = clock
+        self._queue: Deque[_Request] = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._largest = 0
+        self._wait_s = 0.0
+        self._max_wait_s = 0.0
+        self._forward_s = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_s > 0 and self.max_batch > 1
+
+    def embed(self, text: str) -> Vector:
+        with self._stats_lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                self._cache_hits += 1
+                return list(cached)
+        vector = self._embed(text)
+        if self.cache_size:
+            with self._stats_lock:
+                self._cache[text] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return list(vector)
+
+    def _embed(self, text: str) -> Vector:
+        if not self.enabled:
+            return self._run([_Request(text, self._clock())])[0].vector or []
+        request = _Request(text, self._clock())
+        with self._cond:
+            self._ensure_thread()
+            self._queue.append(request)
+            self._cond.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.vector or []
+
+    def _ensure_thread(self) -> None:
+        # A forked child inherits the Thread object but not the thread.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="unal-rag-embed-batch", daemon=True)
+        self._thread.start()
+
+    def _next_batch(self) -> List[_Request]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0].enqueued + self.window_s
+            while len(self._queue) < self.max_batch:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _loop(self) -> None:
+        while True:
+            self._run(self._next_batch())
+
+    def _run(self, batch: List[_Request]) -> List[_Request]:
+        started = self._clock()
+        try:
+            vectors = self.batch_fn([request.text for request in batch])
+            if len(vectors) != len(batch):
+                raise RuntimeError(f"Embedding batch returned {len(vectors)} vectors for {len(batch)} texts.")
+            for request, vector in zip(batch, vectors):
+                request.vector = [float(value) for value in vector]
+        except BaseException as exc:
+            for request in batch:
+                request.error = exc
+            if not self.enabled:
+                raise
+        finally:
+            self._record(batch, started, self._clock())
+            for request in batch:
+                request.done.set()
+        return batch
+
+    def _record(self, batch: List[_Request], started: float, finished: float) -> None:
+        waits = [max(0.0, started - request.enqueued) for request in batch]
+        with self._stats_lock:
+            self._requests += len(batch)
+            self._batches += 1
+            self._largest = max(self._largest, len(batch))
+            self._wait_s += sum(waits)
+            self._max_wait_s = max([self._max_wait_s, *waits])
+            self._forward_s += finished - started
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch sizes, queueing delay added per request and texts embedded per second of compute."""
+        with self._stats_lock:
+            requests, batches = self._requests, self._batches
+            return {
+                "enabled": self.enabled,
+                "window_ms": round(1000 * self.window_s, 2),
+                "max_batch": self.max_batch,
+                "requests": requests,
+                "batches": batches,
+                "mean_batch": round(requests / batches, 2) if batches else 0.0,
+                "largest_batch": self._largest,
+                "added_ms_mean": round(1000 * self._wait_s / requests, 2) if requests else 0.0,
+                "added_ms_max": round(1000 * self._max_wait_s, 2),
+                "forward_ms_mean": round(1000 * self._forward_s / batches, 2) if batches else 0.0,
+                "texts_per_s": round(requests / self._forward_s, 1) if self._forward_s > 0 else 0.0,
+                "cache_hits": self._cache_hits,
+            }
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import re
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Sequence
+
+from ..config.settings import EMBEDDING_MODEL
+
+
+TOKENIZER_MODEL = EMBEDDING_MODEL
+CHARS_PER_TOKEN = 4
+# Do not bother adding a truncated block smaller than this.
+MIN_BLOCK_TOKENS = 48
+MIN_OVERLAP_CHARS = 16
+
+_CHUNK_SEQ_RE = re.compile(r"-(\d+)$")
+
+
+class TokenCounter:
+    """Counts tokens with a Hugging Face tokenizer, or ~4 chars/token without one."""
+
+    def __init__(self, tokenizer: Any = None) -> None:
+        self._tokenizer = tokenizer
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is None:
+            return max(1, len(text) // CHARS_PER_TOKEN)
+        return len(self._tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"])
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self._tokenizer is None:
+            limit = max_tokens * CHARS_PER_TOKEN
+            return text if len(text) <= limit else f"{text[:limit].rstrip()}..."
+        encoded = self._tokenizer(
+            text, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+        )
+        offsets = encoded["offset_mapping"]
+        if len(offsets) <= max_tokens:
+            return text
+        return f"{text[: offsets[max_tokens - 1][1]].rstrip()}..."
+
+
+@lru_cache(maxsize=1)
+def default_token_counter() -> TokenCounter:
+    try:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_MODEL)
+    except Exception:
+        tokenizer = None
+    return TokenCounter(tokenizer)
+
+
+@dataclass
+class ContextBlock:
+    number: int
+    doc_indices: List[int]
+    title: str
+    source: str
+    doc_id: str
+    chunk_ids: List[str]
+    text: str
+    tokens: int = 0
+    truncated: bool = False
+
+    def render(self) -> str:
+        return (
+            f"[DOC {self.number}] title={self.title} | source={self.source} | "
+            f"doc_id={self.doc_id} | chunk_id={', '.join(self.chunk_ids)}\n"
+            f"Contenido:\n{self.text}"
+        )
+
+
+@dataclass
+class PackedContext:
+    """Documents packed in rank order into a token budget.
+
+    ``key`` identifies the retrieved documents the context was built from, so
+    later nodes in the same iteration can reuse it instead of rebuilding.
+    """
+
+    key: List[str]
+    budget_tokens: int
+    blocks: List[ContextBlock] = field(default_factory=list)
+    merged_chunks: int = 0
+    dropped_chunks: int = 0
+    truncated_blocks: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return sum(block.tokens for block in self.blocks)
+
+    def select(self, max_tokens: int | None = None, *, keep: Iterable[int] = ()) -> List[ContextBlock]:
+        """Top-ranked blocks that fit ``max_tokens`` (all blocks when ``None``).
+
+        Blocks numbered in ``keep`` (the ones an answer cites) are always
+        included, even over budget; the rest of the budget is filled in rank
+        order. Blocks keep their rank order and ``[DOC n]`` numbers.
+        """
+        if max_tokens is None or max_tokens <= 0:
+            return list(self.blocks)
+        kept = set(keep)
+        used = sum(block.tokens for block in self.blocks if block.number in kept)
+        chosen = set(kept)
+        for block in self.blocks:
+            if block.number in kept:
+                continue
+            if used + block.tokens > max_tokens and chosen:
+                break
+            chosen.add(block.number)
+            used += block.tokens
+        return [block for block in self.blocks if block.number in chosen]
+
+    def render(self, max_tokens: int | None = None, *, keep: Iterable[int] = ()) -> str:
+        return "\n\n".join(block.render() for block in self.select(max_tokens, keep=keep))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "PackedContext":
+        data = dict(payload)
+        data["blocks"] = [ContextBlock(**block) for block in data.get("blocks", [])]
+        return cls(**data)
+
+    def trace(self) -> Dict[str, Any]:
+        return {
+            "budget_tokens": self.budget_tokens,
+            "context_tokens": self.tokens,
+            "blocks": len(self.blocks),
+            "merged_chunks": self.merged_chunks,
+            "dropped_chunks": self.dropped_chunks,
+            "truncated_blocks": self.truncated_blocks,
+        }
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _chunk_seq(chunk_id: str) -> int | None:
+    match = _CHUNK_SEQ_RE.search(chunk_id)
+    return int(match.group(1)) if match else None
+
+
+def join_overlapping(left: str, right: str) -> str:
+    """Concatenate two adjacent chunks, dropping the text they share."""
+    probe = right[:MIN_OVERLAP_CHARS]
+    if len(probe) == MIN_OVERLAP_CHARS:
+        idx = left.find(probe, max(0, len(left) - len(right)))
+        while idx != -1:
+            if right.startswith(left[idx:]):
+                return left + right[len(left) - idx :]
+            idx = left.find(probe, idx + 1)
+    return f"{left} {right}"
+
+
+def context_key(documents: Sequence[Any]) -> List[str]:
+    return [
+        str((doc.metadata or {}).get("chunk_id", f"rank-{rank}"))
+        for rank, doc in enumerate(documents, start=1)
+    ]
+
+
+def _merge_adjacent(documents: Sequence[Any]) -> List[List[int]]:
+    """Group document indices into runs of consecutive chunks of the same document."""
+    runs: List[List[int]] = []
+    by_doc: Dict[str, List[tuple[int, int]]] = {}
+    for idx, doc in enumerate(documents):
+        metadata = doc.metadata or {}
+        seq = _chunk_seq(str(metadata.get("chunk_id", "")))
+        if seq is None:
+            runs.append([idx])
+            continue
+        doc_id = str(metadata.get("doc_id", metadata.get("source", "unknown_doc")))
+        by_doc.setdefault(doc_id, []).append((seq, idx))
+    for members in by_doc.values():
+        members.sort()
+        run = [members[0][1]]
+        for (prev_seq, _), (seq, idx) in zip(members, members[1:]):
+            if seq == prev_seq + 1:
+                run.append(idx)
+            elif seq != prev_seq:
+                runs.append(run)
+                run = [idx]
+        runs.append(run)
+    # Each run is placed at the rank of its best-ranked chunk.
+    runs.sort(key=min)
+    return runs
+
+
+def pack_context(
+    documents: Sequence[Any],
+    *,
+    budget_tokens: int,
+    counter: TokenCounter | None = None,
+) -> PackedContext:
+    """Merge adjacent chunks and pack them in rank order into ``budget_tokens``.
+
+    A budget of 0 or less disables the limit.
+    """
+    counter = counter or default_token_counter()
+    packed = PackedContext(key=context_key(documents), budget_tokens=budget_tokens)
+    remaining = budget_tokens if budget_tokens > 0 else None
+    for run in _merge_adjacent(documents):
+        first = documents[run[0]]
+        metadata = first.metadata or {}
+        source = str(metadata.get("source", "unknown_source"))
+        text = _normalize(first.page_content)
+        for idx in run[1:]:
+            text = join_overlapping(text, _normalize(documents[idx].page_content))
+        packed.merged_chunks += len(run) - 1
+        block = ContextBlock(
+            number=len(packed.blocks) + 1,
+            doc_indices=sorted(run),
+            title=str(metadata.get("title", source)),
+            source=source,
+            doc_id=str(metadata.get("doc_id", source)),
+            chunk_ids=[
+                str((documents[idx].metadata or {}).get("chunk_id", "unknown_chunk"))
+                for idx in run
+            ],
+            text=text,
+        )
+        header_tokens = counter.count(block.render().split("\n", 1)[0]) + 4
+        block.tokens = header_tokens + counter.count(text)
+        if remaining is not None and block.tokens > remaining:
+            room = remaining - header_tokens
+            if room < MIN_BLOCK_TOKENS:
+                packed.dropped_chunks += len(run)
+                continue
+            block.text = counter.truncate(text, room)
+            block.tokens = header_tokens + counter.count(block.text)
+            block.truncated = True
+            packed.truncated_blocks += 1
+        packed.blocks.append(block)
+        if remaining is not None:
+            remaining -= block.tokens
+    return packed
+
+
+def reuse_or_pack(
+    payload: Dict[str, Any] | None,
+    documents: Sequence[Any],
+    *,
+    budget_tokens: int,
+    counter: TokenCounter | None = None,
+) -> PackedContext:
+    """Reuse a packed context from state when it matches ``documents``."""
+    if payload and payload.get("key") == context_key(documents):
+        try:
+            return PackedContext.from_dict(payload)
+        except (TypeError, KeyError):
+            pass
+    return pack_context(documents, budget_tokens=budget_tokens, counter=counter)
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Sequence
+
+from ..utils.metrics import latency_summary
+
+
+DEFAULT_QUESTIONS_PATH = Path("benchmarks") / "golden_questions.json"
+DEFAULT_FOLLOWUP_PAIRS_PATH = Path("benchmarks") / "followup_pairs.json"
+
+
+@dataclass(frozen=True)
+class LabelledQuestion:
+    """A question with the documents (file names or ``doc_id``) that answer it."""
+
+    id: str
+    question: str
+    relevant_sources: tuple[str, ...] = ()
+    relevant_doc_ids: tuple[str, ...] = ()
+
+    @property
+    def relevant_count(self) -> int:
+        return len(self.relevant_sources) + len(self.relevant_doc_ids)
+
+    def match(self, metadata: Mapping[str, Any]) -> str | None:
+        """Label matched by a retrieved chunk's metadata, if any."""
+        doc_id = str(metadata.get("doc_id", ""))
+        if doc_id and doc_id in self.relevant_doc_ids:
+            return doc_id
+        source = str(metadata.get("source_path") or metadata.get("source") or "")
+        name = Path(source.replace("\\", "/")).name
+        if name and name in self.relevant_sources:
+            return name
+        return None
+
+
+def load_labelled_questions(path: Path = DEFAULT_QUESTIONS_PATH) -> List[LabelledQuestion]:
+    """Questions with at least one relevant document; unlabelled entries are skipped."""
+    payload = json.loads(Path(path).read_text(encoding="utf-8"))
+    questions = []
+    for idx, item in enumerate(payload, start=1):
+        labelled = LabelledQuestion(
+            id=str(item.get("id", idx)),
+            question=str(item["question"]),
+            relevant_sources=tuple(item.get("relevant_sources", [])),
+            relevant_doc_ids=tuple(item.get("relevant_doc_ids", [])),
+        )
+        if labelled.relevant_count:
+            questions.append(labelled)
+    return questions
+
+
+@dataclass(frozen=True)
+class LabelledPair:
+    """Two consecutive questions on a thread, labelled follow-up or topic change."""
+
+    id: str
+    previous: str
+    question: str
+    followup: bool
+
+
+def load_followup_pairs(path: Path = DEFAULT_FOLLOWUP_PAIRS_PATH) -> List[LabelledPair]:
+    """Pairs with ``previous``, ``question`` and a boolean ``followup`` label; others are skipped."""
+    payload = json.loads(Path(path).read_text(encoding="utf-8"))
+    pairs = []
+    for idx, item in enumerate(payload, start=1):
+        if not item.get("previous") or not item.get("question") or not isinstance(item.get("followup"), bool):
+            continue
+        pairs.append(
+            LabelledPair(
+                id=str(item.get("id", idx)),
+                previous=str(item["previous"]),
+                question=str(item["question"]),
+                followup=item["followup"],
+            )
+        )
+    return pairs
+
+
+def score_ranking(
+    question: LabelledQuestion, ranked: Sequence[Mapping[str, Any]], k: int
+) -> tuple[float, float]:
+    """Document-level recall@k and reciprocal rank for ranked chunk metadata."""
+    found = set()
+    reciprocal_rank = 0.0
+    for rank, metadata in enumerate(ranked[:k], start=1):
+        label = question.match(metadata)
+        if label is None:
+            continue
+        found.add(label)
+        if not reciprocal_rank:
+            reciprocal_rank = 1.0 / rank
+    recall = len(found) / question.relevant_count if question.relevant_count else 0.0
+    return recall, reciprocal_rank
+
+
+def aggregate(
+    scores: Iterable[tuple[float, float]], latencies_s: Sequence[float]
+) -> Dict[str, Any]:
+    scores = list(scores)
+    latency = latency_summary(latencies_s)
+    count = len(scores) or 1
+    return {
+        "questions": len(scores),
+        "recall": round(sum(recall for recall, _ in scores) / count, 3),
+        "mrr": round(sum(rr for _, rr in scores) / count, 3),
+        "p50_ms": latency["p50_ms"],
+        "p95_ms": latency["p95_ms"],
+    }
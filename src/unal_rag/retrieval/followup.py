@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import itertools
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Sequence, TypeVar
+
+from ..utils.text import cosine, fold_accents
+
+
+T = TypeVar("T")
+
+# Starting points on raw e5 cosines, not yet fitted to this corpus: paraphrases
+# sit above ~0.88, and a question is usually answered by chunks it scores above
+# ~0.84 against. Calibrate with ``eval-retrieval --followup-pairs`` and override
+# with UNAL_RAG_FOLLOWUP_QUESTION_SIM / _CHUNK_SIM / _CUE_MARGIN.
+FOLLOWUP_QUESTION_SIMILARITY = 0.88
+FOLLOWUP_CHUNK_SIMILARITY = 0.84
+# Elliptical follow-ups ("¿y el plazo?") carry little topic on their own.
+FOLLOWUP_CUE_MARGIN = 0.03
+# Extra candidates fetched beyond k so a follow-up has something to re-rank.
+FOLLOWUP_EXTRA_CANDIDATES = 4
+# Reusing candidates for a topic change answers from the wrong documents, while
+# a missed follow-up only costs a search: calibration keeps precision this high.
+CALIBRATION_MIN_PRECISION = 0.95
+
+_CUE_RE = re.compile(
+    r"^\W*(y|e|pero|entonces|tambien|ademas|and|also)\b"
+    r"|\b(eso|esa|ese|esos|esas|esto|lo anterior|dicho|dicha|mismo|misma|alli|ahi)\b"
+)
+
+
+def followup_enabled() -> bool:
+    return os.getenv("UNAL_RAG_FOLLOWUP", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+@dataclass(frozen=True)
+class FollowupThresholds:
+    question: float = FOLLOWUP_QUESTION_SIMILARITY
+    chunk: float = FOLLOWUP_CHUNK_SIMILARITY
+    cue_margin: float = FOLLOWUP_CUE_MARGIN
+
+    def to_dict(self) -> Dict[str, float]:
+        return {key: round(value, 3) for key, value in asdict(self).items()}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def followup_thresholds() -> FollowupThresholds:
+    """Thresholds from ``UNAL_RAG_FOLLOWUP_QUESTION_SIM``, ``_CHUNK_SIM`` and ``_CUE_MARGIN``."""
+    return FollowupThresholds(
+        question=_env_float("UNAL_RAG_FOLLOWUP_QUESTION_SIM", FOLLOWUP_QUESTION_SIMILARITY),
+        chunk=_env_float("UNAL_RAG_FOLLOWUP_CHUNK_SIM", FOLLOWUP_CHUNK_SIMILARITY),
+        cue_margin=max(0.0, _env_float("UNAL_RAG_FOLLOWUP_CUE_MARGIN", FOLLOWUP_CUE_MARGIN)),
+    )
+
+
+def is_elliptical(question: str) -> bool:
+    """True for questions that lean on the previous turn ("¿y cual es el plazo?")."""
+    return bool(_CUE_RE.search(fold_accents(question)))
+
+
+@dataclass(frozen=True)
+class FollowupDecision:
+    reuse: bool
+    reason: str
+    cue: bool = False
+    question_similarity: float | None = None
+    chunk_similarity: float | None = None
+    chunk_similarities: List[float] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        payload = asdict(self)
+        payload.pop("chunk_similarities")
+        for key in ("question_similarity", "chunk_similarity"):
+            if payload[key] is not None:
+                payload[key] = round(payload[key], 3)
+        return payload
+
+
+def reuse_reason(
+    question_similarity: float, chunk_similarity: float, cue: bool, thresholds: FollowupThresholds
+) -> str:
+    """``same_topic``, ``covered_by_candidates`` or ``topic_change``."""
+    margin = thresholds.cue_margin if cue else 0.0
+    if question_similarity >= thresholds.question - margin:
+        return "same_topic"
+    if chunk_similarity >= thresholds.chunk - margin:
+        return "covered_by_candidates"
+    return "topic_change"
+
+
+def decide_followup(
+    question: str,
+    vector: Sequence[float],
+    previous_vector: Sequence[float] | None,
+    chunk_vectors: Sequence[Sequence[float]],
+    *,
+    thresholds: FollowupThresholds | None = None,
+) -> FollowupDecision:
+    """Reuse the previous turn's candidates when the topic continues.
+
+    The topic continues when the question is close to the previous question,
+    or when some cached chunk already scores like a retrieval hit for it.
+    Elliptical questions get ``cue_margin`` of slack on both thresholds.
+    ``thresholds`` defaults to ``followup_thresholds()``.
+    """
+    if previous_vector is None:
+        return FollowupDecision(reuse=False, reason="no_previous_turn")
+    if not chunk_vectors:
+        return FollowupDecision(reuse=False, reason="no_candidates")
+    cue = is_elliptical(question)
+    question_similarity = cosine(vector, previous_vector)
+    similarities = [cosine(vector, chunk) for chunk in chunk_vectors]
+    best = max(similarities)
+    reason = reuse_reason(question_similarity, best, cue, thresholds or followup_thresholds())
+    return FollowupDecision(
+        reuse=reason != "topic_change",
+        reason=reason,
+        cue=cue,
+        question_similarity=question_similarity,
+        chunk_similarity=best,
+        chunk_similarities=similarities,
+    )
+
+
+@dataclass(frozen=True)
+class PairSimilarity:
+    """Similarities measured for one labelled (previous, question) pair."""
+
+    followup: bool
+    cue: bool
+    question_similarity: float
+    chunk_similarity: float
+
+
+def score_thresholds(pairs: Sequence[PairSimilarity], thresholds: FollowupThresholds) -> Dict[str, Any]:
+    """Precision and recall of reuse decisions against the follow-up labels."""
+    reused = [
+        pair
+        for pair in pairs
+        if reuse_reason(pair.question_similarity, pair.chunk_similarity, pair.cue, thresholds) != "topic_change"
+    ]
+    true_reuse = sum(pair.followup for pair in reused)
+    followups = sum(pair.followup for pair in pairs)
+    return {
+        **thresholds.to_dict(),
+        "pairs": len(pairs),
+        "reused": len(reused),
+        "false_reuse": len(reused) - true_reuse,
+        "missed": followups - true_reuse,
+        "precision": round(true_reuse / len(reused), 3) if reused else 1.0,
+        "recall": round(true_reuse / followups, 3) if followups else 0.0,
+    }
+
+
+def _grid(low: float, high: float, step: float) -> List[float]:
+    return [round(low + step * idx, 3) for idx in range(int(round((high - low) / step)) + 1)]
+
+
+def calibrate_thresholds(
+    pairs: Sequence[PairSimilarity],
+    *,
+    min_precision: float = CALIBRATION_MIN_PRECISION,
+    question_grid: Iterable[float] = _grid(0.80, 0.96, 0.01),
+    chunk_grid: Iterable[float] = _grid(0.78, 0.94, 0.01),
+    margin_grid: Iterable[float] = _grid(0.0, 0.05, 0.01),
+) -> Dict[str, Any]:
+    """Thresholds that reuse the most follow-ups while keeping ``min_precision``.
+
+    Ties go to stricter thresholds. If no combination reaches ``min_precision``
+    the most precise one wins. Returns ``score_thresholds`` for the choice.
+    """
+    best_key, best = None, None
+    for question, chunk, margin in itertools.product(question_grid, chunk_grid, margin_grid):
+        score = score_thresholds(pairs, FollowupThresholds(question, chunk, margin))
+        meets = score["precision"] >= min_precision
+        primary = (score["recall"], score["precision"]) if meets else (score["precision"], score["recall"])
+        key = (meets, *primary, question, chunk, -margin)
+        if best_key is None or key > best_key:
+            best_key, best = key, score
+    return best or score_thresholds(pairs, FollowupThresholds())
+
+
+def rerank(candidates: Sequence[T], similarities: Sequence[float], k: int) -> List[T]:
+    """Top ``k`` candidates by similarity to the new question (ties keep retrieval order)."""
+    order = sorted(range(len(candidates)), key=lambda idx: -similarities[idx])
+    return [candidates[idx] for idx in order[: max(0, k)]]
+
+
+class ReuseStats:
+    """Process-wide follow-up reuse counters for the trace."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.reused = 0
+        self.saved_ms = 0.0
+
+    def record(self, reused: bool, saved_ms: float = 0.0) -> None:
+        with self._lock:
+            self.turns += 1
+            if reused:
+                self.reused += 1
+                self.saved_ms += max(0.0, saved_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "reused": self.reused,
+                "reuse_rate": round(self.reused / self.turns, 3) if self.turns else 0.0,
+                "saved_ms_total": round(self.saved_ms, 1),
+                "saved_ms_mean": round(self.saved_ms / self.reused, 1) if self.reused else 0.0,
+            }
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import re
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Sequence
+
+from ..utils.text import cosine, fold_accents
+
+
+DEFAULT_PRECHECK_STATS_PATH = Path("db") / "grounding_precheck.json"
+
+ACCEPT = "accept"
+ESCALATE = "escalate"
+
+# e5 cosine similarities cluster in a narrow band; rescale it to 0..1.
+SEMANTIC_FLOOR = 0.75
+SEMANTIC_CEIL = 0.92
+STEM_CHARS = 5
+# Share of an answer sentence's content stems that must appear in the cited
+# chunks; sentences with fewer stems than ANSWER_MIN_STEMS only have their
+# numbers checked ("Si, es posible.").
+ANSWER_MIN_LEXICAL = 0.6
+ANSWER_MIN_STEMS = 3
+
+_CITATION_RE = re.compile(r"\[DOC[^\]]*\]", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+_SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+|\n+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    """
+    las los una unos unas que por para con sin sus del como mas pero esta este estos estas
+    ese esa esos esas puede pueden debe deben cual cuales donde cuando sobre entre segun
+    tiene tienen hay ser son sera seran fue fueron dicho dicha cada todo toda todos todas
+    """.split()
+)
+
+Embedder = Callable[[List[str]], List[List[float]]]
+
+
+def content_stems(text: str) -> set[str]:
+    words = _WORD_RE.findall(fold_accents(_CITATION_RE.sub(" ", text)))
+    return {
+        word[:STEM_CHARS]
+        for word in words
+        if len(word) >= 3 and word not in _STOPWORDS and not word.isdigit()
+    }
+
+
+def numbers(text: str) -> set[str]:
+    found = set()
+    for raw in _NUMBER_RE.findall(_CITATION_RE.sub(" ", text)):
+        value = float(raw.replace(",", "."))
+        found.add(f"{value:g}")
+    return found
+
+
+def _rescale(similarity: float) -> float:
+    return max(0.0, min(1.0, (similarity - SEMANTIC_FLOOR) / (SEMANTIC_CEIL - SEMANTIC_FLOOR)))
+
+
+@dataclass
+class ClaimScore:
+    claim: str
+    doc_ids: List[int]
+    lexical: float
+    numeric: float
+    semantic: float | None
+    score: float
+
+    @property
+    def numbers_supported(self) -> bool:
+        return self.numeric >= 1.0
+
+
+@dataclass
+class PrecheckResult:
+    decision: str
+    min_score: float
+    accept_threshold: float
+    claims: List[ClaimScore] = field(default_factory=list)
+    reason: str = ""
+    # Sentences of the free-text answer, scored against all cited chunks.
+    answer: List[ClaimScore] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        payload = asdict(self)
+        for claim in [*payload["claims"], *payload["answer"]]:
+            for key in ("lexical", "numeric", "semantic", "score"):
+                if claim[key] is not None:
+                    claim[key] = round(claim[key], 3)
+        payload["min_score"] = round(self.min_score, 3)
+        return payload
+
+
+def score_claim(
+    claim: str,
+    doc_ids: Sequence[int],
+    support: str,
+    *,
+    semantic: float | None = None,
+) -> ClaimScore:
+    claim_stems = content_stems(claim)
+    lexical = (
+        len(claim_stems & content_stems(support)) / len(claim_stems) if claim_stems else 0.0
+    )
+    claim_numbers = numbers(claim)
+    numeric = (
+        len(claim_numbers & numbers(support)) / len(claim_numbers) if claim_numbers else 1.0
+    )
+    if semantic is None:
+        score = 0.7 * lexical + 0.3 * numeric
+    else:
+        score = 0.45 * lexical + 0.2 * numeric + 0.35 * semantic
+    return ClaimScore(
+        claim=claim,
+        doc_ids=list(doc_ids),
+        lexical=lexical,
+        numeric=numeric,
+        semantic=semantic,
+        score=score,
+    )
+
+
+def cited_doc_ids(text: str) -> set[int]:
+    """Block numbers cited as ``[DOC n]`` (or ``[DOC 1, DOC 2]``) in ``text``."""
+    return {
+        int(number) for citation in _CITATION_RE.findall(text) for number in re.findall(r"\d+", citation)
+    }
+
+
+def score_answer(answer: str, doc_ids: Sequence[int], support: str) -> List[ClaimScore]:
+    """Score every sentence of the free-text answer against ``support``."""
+    return [
+        score_claim(sentence, doc_ids, support)
+        for sentence in (part.strip() for part in _SENTENCE_RE.split(answer))
+        if content_stems(sentence) or numbers(sentence)
+    ]
+
+
+def sentence_supported(score: ClaimScore, *, min_lexical: float = ANSWER_MIN_LEXICAL) -> bool:
+    if not score.numbers_supported:
+        return False
+    return len(content_stems(score.claim)) < ANSWER_MIN_STEMS or score.lexical >= min_lexical
+
+
+def precheck_grounding(
+    claims: Sequence[Mapping[str, Any]],
+    support_texts: Mapping[int, str],
+    *,
+    accept_threshold: float,
+    embed: Embedder | None = None,
+    answer: str | None = None,
+    answer_threshold: float = ANSWER_MIN_LEXICAL,
+) -> PrecheckResult:
+    """Score each claim against the chunks it cites, and the answer text against all of them.
+
+    Returns ``accept`` only when every claim cites available chunks, all of
+    its numbers appear in them and its score clears ``accept_threshold``, and
+    every sentence of ``answer`` (the prose that leads the delivered answer)
+    has its numbers and most of its content in the union of the cited chunks;
+    anything else is ``escalate`` so the LLM evaluator decides. ``answer=None``
+    checks the claims only.
+    """
+    if not claims:
+        return PrecheckResult(ESCALATE, 0.0, accept_threshold, reason="Sin afirmaciones.")
+
+    prepared = []
+    for item in claims:
+        text = str(item.get("claim", "")).strip()
+        doc_ids = [int(doc_id) for doc_id in item.get("support_doc_ids", [])]
+        cited = [support_texts[doc_id] for doc_id in doc_ids if doc_id in support_texts]
+        if not text or not cited:
+            return PrecheckResult(
+                ESCALATE, 0.0, accept_threshold, reason="Afirmacion sin fragmentos citados."
+            )
+        prepared.append((text, doc_ids, cited))
+
+    similarities: List[float | None] = [None] * len(prepared)
+    if embed is not None:
+        try:
+            block_ids = sorted(
+                {doc_id for _, ids, _ in prepared for doc_id in ids if doc_id in support_texts}
+            )
+            vectors = embed(
+                [text for text, _, _ in prepared] + [support_texts[doc_id] for doc_id in block_ids]
+            )
+            block_vectors = dict(zip(block_ids, vectors[len(prepared) :]))
+            for idx, (_, doc_ids, _) in enumerate(prepared):
+                best = max(
+                    cosine(vectors[idx], block_vectors[doc_id])
+                    for doc_id in doc_ids
+                    if doc_id in block_vectors
+                )
+                similarities[idx] = _rescale(best)
+        except Exception:
+            similarities = [None] * len(prepared)
+
+    scores = [
+        score_claim(text, doc_ids, "\n".join(cited), semantic=similarity)
+        for (text, doc_ids, cited), similarity in zip(prepared, similarities)
+    ]
+    min_score = min(score.score for score in scores)
+    answer_scores: List[ClaimScore] = []
+    if answer is not None:
+        answer_ids = sorted(
+            ({doc_id for _, ids, _ in prepared for doc_id in ids} | cited_doc_ids(answer)) & set(support_texts)
+        )
+        support = "\n".join(support_texts[doc_id] for doc_id in answer_ids)
+        answer_scores = score_answer(answer, answer_ids, support)
+    if not all(score.numbers_supported for score in scores) or min_score < accept_threshold:
+        reason = "Soporte local incierto; se escala al evaluador LLM."
+    elif not all(sentence_supported(score, min_lexical=answer_threshold) for score in answer_scores):
+        reason = "El texto de la respuesta agrega contenido sin soporte local; se escala al evaluador LLM."
+    else:
+        return PrecheckResult(
+            ACCEPT,
+            min_score,
+            accept_threshold,
+            scores,
+            reason="Verificacion local: todas las afirmaciones tienen soporte en sus fragmentos citados.",
+            answer=answer_scores,
+        )
+    return PrecheckResult(ESCALATE, min_score, accept_threshold, scores, reason=reason, answer=answer_scores)
+
+
+def update_precheck_stats(
+    data: Dict[str, Any],
+    result: PrecheckResult,
+    *,
+    llm_grounded: bool | None = None,
+    shadow: bool = False,
+    max_samples: int = 200,
+) -> Dict[str, Any]:
+    """Accumulate accept/escalate counts and (score, LLM verdict) samples for tuning.
+
+    ``shadow`` marks an accept the LLM evaluator re-checked after the answer
+    was delivered; ``llm_grounded=False`` there counts a false accept.
+    """
+    data[result.decision] = int(data.get(result.decision, 0)) + 1
+    if shadow and llm_grounded is not None:
+        data["shadow_checked"] = int(data.get("shadow_checked", 0)) + 1
+        data["false_accepts"] = int(data.get("false_accepts", 0)) + (not llm_grounded)
+    samples = list(data.get("samples", []))
+    sample = {
+        "decision": result.decision,
+        "min_score": round(result.min_score, 3),
+        "llm_grounded": llm_grounded,
+    }
+    if shadow:
+        sample["shadow"] = True
+    samples.append(sample)
+    data["samples"] = samples[-max_samples:]
+    return data
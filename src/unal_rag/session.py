@@ -0,0 +1,460 @@
+from __future__ import annotations
+
+import hashlib
+import importlib
+import importlib.machinery
+import importlib.util
+import json
+import logging
+import math
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Sequence
+
+from .checkpoints import compact_checkpoint_file, compactor_from_env, keep_checkpoints_from_env, max_threads_from_env
+from .utils.profiling import Profiler, default_profile_prefix, profile_mode_from_env
+from .utils.singleflight import SingleFlight
+from .utils.text import fold_accents
+
+
+# The graph runtime (main.py, nodes/, llm_runtime.py) lives next to this package
+# and is imported as the ``src`` package.
+RUNTIME_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_THREAD_ID = "default"
+DEFAULT_MAX_ITERATIONS = 2
+DEFAULT_MAX_WORKERS = 4
+# Per-request traces a coalesced follower does not inherit from the leader.
+_NOT_SHARED = frozenset(
+    {"llm_calls", "degradations", "iteration_history", "question", "user_id", "deadline_at"}
+)
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+PENDING_VERIFICATION = "pending_verification"
+
+logger = logging.getLogger(__name__)
+
+
+def runtime(name: str) -> ModuleType:
+    """Import ``src.<name>`` from the runtime directory without touching ``sys.path``."""
+    if "src" not in sys.modules:
+        spec = importlib.machinery.ModuleSpec("src", None, is_package=True)
+        spec.submodule_search_locations = [str(RUNTIME_DIR)]
+        sys.modules["src"] = importlib.util.module_from_spec(spec)
+    return importlib.import_module(f"src.{name}")
+
+
+def initial_state(
+    question: str,
+    *,
+    max_iterations: int,
+    deadline_at: float = 0.0,
+    user_id: str = DEFAULT_THREAD_ID,
+) -> Dict[str, Any]:
+    """Graph input for a new question; resets the per-request fields kept by the checkpointer.
+
+    ``None`` clears the append-only traces (``llm_calls``, ``degradations``).
+    """
+    return {
+        "question": question,
+        "user_id": user_id,
+        "iteration_count": 0,
+        "max_iterations": max(0, int(max_iterations)),
+        "llm_failure": False,
+        "llm_failure_reason": "",
+        "llm_failure_source": "",
+        "llm_calls": None,
+        "evaluation_skipped": False,
+        "prompt_tokens": {},
+        "grounding_precheck": {},
+        "deadline_at": deadline_at,
+        "degradations": None,
+        "followup": {},
+        # Empty until the evaluator runs for this question (see ``verification_verdict``).
+        "evaluation_result": {},
+    }
+
+
+def normalize_question(question: str) -> str:
+    """Case-, accent-, punctuation- and whitespace-insensitive form used to coalesce questions."""
+    return " ".join(_PUNCTUATION_RE.sub(" ", fold_accents(question)).split())
+
+
+def deadline_bucket(budget_s: float | None) -> int | None:
+    """Coarse class of a request's time budget for coalescing (``None`` without a deadline).
+
+    Budgets in the same bucket are within a factor of two, so the degradations
+    the leader's budget forced (skipped evaluator or retry) suit its followers.
+    """
+    if budget_s is None or budget_s <= 0:
+        return None
+    return math.ceil(math.log2(max(1.0, budget_s)))
+
+
+def _fingerprint(value: Any) -> str:
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def verification_verdict(state: Dict[str, Any]) -> str | None:
+    """Outcome of the grounding check for the question that produced ``state``.
+
+    ``grounded``, ``not_grounded`` (the draft was replaced), ``unverified``
+    (evaluation skipped for the deadline or an open breaker), or None when the
+    evaluator did not run (tools, direct answers).
+    """
+    evaluation = state.get("evaluation_result") or {}
+    if not evaluation:
+        return None
+    if evaluation.get("skipped") or state.get("evaluation_skipped"):
+        return "unverified"
+    return "grounded" if state.get("is_grounded") else "not_grounded"
+
+
+@dataclass(frozen=True)
+class DraftAnswer:
+    """Cited answer from the first generation, delivered before the evaluator's verdict."""
+
+    thread_id: str
+    answer: str
+    sources: tuple[str, ...]
+    claims: tuple[str, ...]
+    elapsed_s: float
+    status: str = PENDING_VERIFICATION
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "thread_id": self.thread_id,
+            "answer": self.answer,
+            "sources": list(self.sources),
+            "claims": list(self.claims),
+            "status": self.status,
+            "elapsed_s": round(self.elapsed_s, 3),
+        }
+
+
+def draft_from_update(update: Any, *, thread_id: str, elapsed_s: float) -> DraftAnswer | None:
+    """Draft from a ``rag_generator`` update; None for refusals, clarifications and LLM failures."""
+    if not isinstance(update, dict) or update.get("llm_failure"):
+        return None
+    claims = tuple(str(item.get("claim", "")) for item in update.get("grounded_claims") or [])
+    sources = tuple(update.get("sources") or ())
+    answer = str(update.get("generation") or "")
+    # The generator drops sources when it falls back to the insufficient-evidence message.
+    if not (claims and sources and answer):
+        return None
+    return DraftAnswer(thread_id=thread_id, answer=answer, sources=sources, claims=claims, elapsed_s=elapsed_s)
+
+
+@dataclass(frozen=True)
+class AskResult:
+    thread_id: str
+    question: str
+    answer: str
+    sources: tuple[str, ...]
+    evaluation_skipped: bool
+    started_at: float
+    elapsed_s: float
+    deadline_at: float
+    state: Dict[str, Any]
+    # True when the answer came from an identical request already in flight.
+    coalesced: bool = False
+    verdict: str | None = None
+    # Set when the request asked for a draft (``on_draft``) and one was delivered.
+    draft: DraftAnswer | None = None
+
+    @property
+    def draft_replaced(self) -> bool:
+        return self.draft is not None and self.answer != self.draft.answer
+
+
+class RAGSession:
+    """In-process entry point that keeps the compiled graph and its resources warm.
+
+    The session owns the checkpointer and the compiled graph; the embedder,
+    Chroma collection and LLM clients are process-wide and are loaded once
+    (in the background when ``warmup`` is on). Questions on the same thread ID
+    share conversation state, so ``ask_many`` runs them in order; different
+    thread IDs run concurrently.
+
+    With ``coalesce`` on, concurrent questions that normalize to the same text,
+    with the same memory profile, a similar deadline and no earlier retrieval
+    in their thread, run the graph once; the other requests get a copy of the
+    answer written to their own thread checkpoint, or run alone if their
+    deadline passes first. Questions that update memory always run.
+
+    ``ask(..., on_draft=...)`` answers in two phases: the cited draft first,
+    then the evaluator's verdict on the returned result.
+
+    Checkpoint retention runs in the background every
+    ``UNAL_RAG_CHECKPOINT_COMPACT_EVERY`` requests or
+    ``UNAL_RAG_CHECKPOINT_COMPACT_S`` seconds, not only on ``close``.
+    """
+
+    def __init__(
+        self,
+        *,
+        checkpoint_path: str | Path | None = None,
+        max_iterations: int = DEFAULT_MAX_ITERATIONS,
+        deadline_s: float | None = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        warmup: bool = True,
+        profile: str | None = None,
+        profile_output: str | Path | None = None,
+        node_wrapper: Callable[[str, Callable], Callable] | None = None,
+        coalesce: bool = True,
+    ) -> None:
+        main = runtime("main")
+        self._llm_runtime = runtime("llm_runtime")
+        self._retriever = runtime("nodes.retriever")
+        self._memory = runtime("nodes.memory")
+        self.coalesce = coalesce
+        self._flights = SingleFlight()
+        self.max_iterations = max_iterations
+        self.deadline_s = deadline_s
+        self.max_workers = max(1, int(max_workers))
+
+        mode = profile or profile_mode_from_env()
+        self.profiler = Profiler(mode) if mode else None
+        self._profile_output = Path(profile_output) if profile_output else None
+        self.profile_paths: List[Path] = []
+        wrappers = [wrap for wrap in (node_wrapper, self.profiler.wrap if self.profiler else None) if wrap]
+
+        def _wrap(name: str, fn: Callable) -> Callable:
+            for wrapper in wrappers:
+                fn = wrapper(name, fn)
+            return fn
+
+        checkpoint_path = Path(checkpoint_path) if checkpoint_path else main.DEFAULT_CHECKPOINT_PATH
+        self._checkpointer, self._close_checkpointer = main.open_checkpointer(checkpoint_path)
+        self._compactor = compactor_from_env(lambda: self._compact(checkpoint_path))
+        self.graph = main.build_workflow(
+            node_wrapper=_wrap if wrappers else None, checkpointer=self._checkpointer
+        )
+        self._closed = False
+        self._lock = threading.Lock()
+        if warmup:
+            self._retriever.start_warmup()
+        if self.profiler:
+            self.profiler.start()
+
+    def __enter__(self) -> "RAGSession":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def config(self, thread_id: str = DEFAULT_THREAD_ID) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": thread_id}}
+
+    def warmup_status(self) -> Dict[str, Any]:
+        return self._retriever.warmup_status()
+
+    def embedding_stats(self) -> Dict[str, Any]:
+        """Micro-batching of question embeddings: batch sizes, added latency, throughput."""
+        return self._retriever.embedding_stats()
+
+    def followup_stats(self) -> Dict[str, Any]:
+        """Share of retrieval turns answered from cached candidates, and the time saved."""
+        return self._retriever.reuse_stats()
+
+    def ask(
+        self,
+        question: str,
+        *,
+        thread_id: str = DEFAULT_THREAD_ID,
+        user_id: str | None = None,
+        max_iterations: int | None = None,
+        deadline_s: float | None = None,
+        on_draft: Callable[[DraftAnswer], None] | None = None,
+    ) -> AskResult:
+        """Answer ``question`` on ``thread_id``; ``deadline_s`` overrides the session budget.
+
+        The memory profile belongs to ``user_id``, which defaults to the thread ID.
+        With ``on_draft`` the answer is delivered in two phases: the callback gets
+        the first cited draft as soon as ``rag_generator`` finishes, marked
+        pending verification, and the result carries the evaluator's ``verdict``.
+        Two-phase requests are not coalesced, so every caller gets its draft.
+        """
+        if self._closed:
+            raise RuntimeError("RAGSession is closed.")
+        question = question.strip()
+        if not question:
+            raise ValueError("Empty question.")
+        started = time.time()
+        deadline_at = self._llm_runtime.deadline_at(
+            deadline_s if deadline_s is not None else self.deadline_s, now=started
+        )
+        user_id = user_id or thread_id
+        iterations = self.max_iterations if max_iterations is None else max_iterations
+
+        drafts: List[DraftAnswer] = []
+
+        def _deliver(draft: DraftAnswer) -> None:
+            drafts.append(draft)
+            on_draft(draft)
+
+        def _invoke() -> Dict[str, Any]:
+            inputs = initial_state(question, max_iterations=iterations, deadline_at=deadline_at, user_id=user_id)
+            if on_draft is None:
+                return self.graph.invoke(inputs, config=self.config(thread_id))
+            return self._stream(inputs, thread_id=thread_id, started=started, on_draft=_deliver)
+
+        budget_s = deadline_at - started if deadline_at > 0 else None
+        key = None if on_draft is not None else self._coalesce_key(question, thread_id, user_id, iterations, budget_s)
+        coalesced = False
+        if key is None:
+            state = _invoke()
+        else:
+            # A follower still waiting when its own deadline passes runs alone.
+            wait_s = deadline_at - time.time() if deadline_at > 0 else None
+            state, coalesced = self._flights.do(key, _invoke, timeout=wait_s)
+            if coalesced:
+                state = self._adopt(
+                    state, question=question, thread_id=thread_id, user_id=user_id, deadline_at=deadline_at
+                )
+        elapsed_s = time.time() - started
+        if not coalesced:
+            self._llm_runtime.record_request_usage(state, thread_id=thread_id)
+        if self._compactor is not None:
+            self._compactor.note_write()
+        return AskResult(
+            thread_id=thread_id,
+            question=question,
+            answer=str(state.get("generation", "")),
+            sources=tuple(state.get("sources", []) or ()),
+            evaluation_skipped=bool(state.get("evaluation_skipped")),
+            started_at=started,
+            elapsed_s=elapsed_s,
+            deadline_at=deadline_at,
+            state=state,
+            coalesced=coalesced,
+            verdict=verification_verdict(state),
+            draft=drafts[0] if drafts else None,
+        )
+
+    def _stream(
+        self,
+        inputs: Dict[str, Any],
+        *,
+        thread_id: str,
+        started: float,
+        on_draft: Callable[[DraftAnswer], None],
+    ) -> Dict[str, Any]:
+        """Run the graph node by node, handing the first cited draft to ``on_draft``."""
+        config = self.config(thread_id)
+        delivered = False
+        for chunk in self.graph.stream(inputs, config=config, stream_mode="updates"):
+            update = chunk.get("rag_generator") if isinstance(chunk, dict) else None
+            if delivered or update is None:
+                continue
+            draft = draft_from_update(update, thread_id=thread_id, elapsed_s=time.time() - started)
+            if draft is None:
+                continue
+            delivered = True
+            try:
+                on_draft(draft)
+            except Exception:
+                # A client that went away must not abort the run; the checkpoint still gets the verdict.
+                logger.warning("Delivering the draft answer on thread %s failed.", thread_id, exc_info=True)
+        return dict(self.graph.get_state(config).values)
+
+    def _coalesce_key(
+        self, question: str, thread_id: str, user_id: str, max_iterations: int, budget_s: float | None
+    ) -> tuple | None:
+        """Key shared by requests that would produce the same answer; None to run alone."""
+        if not self.coalesce or self._memory.updates_memory(question):
+            return None
+        # A thread with an earlier retrieval turn may answer as a follow-up.
+        if (self.graph.get_state(self.config(thread_id)).values or {}).get("last_turn"):
+            return None
+        return (
+            normalize_question(question),
+            max_iterations,
+            deadline_bucket(budget_s),
+            _fingerprint(self._memory.load_profile(user_id)),
+        )
+
+    def _adopt(
+        self, leader_state: Dict[str, Any], *, question: str, thread_id: str, user_id: str, deadline_at: float
+    ) -> Dict[str, Any]:
+        """Write the leader's answer to this request's own thread and return that thread's state."""
+        values = {key: value for key, value in leader_state.items() if key not in _NOT_SHARED}
+        # None restarts the traces: this request made no LLM calls of its own.
+        values.update(
+            question=question, user_id=user_id, deadline_at=deadline_at, llm_calls=None, degradations=None
+        )
+        config = self.config(thread_id)
+        # As if the terminal direct_llm node wrote it, so the thread has nothing left to run.
+        self.graph.update_state(config, values, as_node="direct_llm")
+        return dict(self.graph.get_state(config).values)
+
+    def coalesce_stats(self) -> Dict[str, int]:
+        return {**self._flights.stats, "in_flight": self._flights.in_flight()}
+
+    def ask_many(
+        self,
+        questions: Sequence[str],
+        *,
+        thread_ids: Sequence[str] | None = None,
+        user_ids: Sequence[str] | None = None,
+        max_workers: int | None = None,
+        deadline_s: float | None = None,
+    ) -> List[AskResult]:
+        """Answer ``questions`` concurrently; results keep the input order.
+
+        Without ``thread_ids`` every question gets its own new thread.
+        """
+        if thread_ids is None:
+            thread_ids = [f"session-{uuid.uuid4().hex[:12]}" for _ in questions]
+        if len(thread_ids) != len(questions) or (user_ids is not None and len(user_ids) != len(questions)):
+            raise ValueError("thread_ids and user_ids must match questions one to one.")
+        groups: Dict[str, List[int]] = {}
+        for index, thread_id in enumerate(thread_ids):
+            groups.setdefault(thread_id, []).append(index)
+        results: List[AskResult | None] = [None] * len(questions)
+
+        def _run_group(indices: List[int]) -> None:
+            for index in indices:
+                results[index] = self.ask(
+                    questions[index],
+                    thread_id=thread_ids[index],
+                    user_id=user_ids[index] if user_ids is not None else None,
+                    deadline_s=deadline_s,
+                )
+
+        workers = min(max_workers or self.max_workers, len(groups)) or 1
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="unal-rag-session") as pool:
+            for future in [pool.submit(_run_group, indices) for indices in groups.values()]:
+                future.result()
+        return [result for result in results if result is not None]
+
+    @staticmethod
+    def _compact(checkpoint_path: Path) -> None:
+        try:
+            stats = compact_checkpoint_file(
+                checkpoint_path, keep_last=keep_checkpoints_from_env(), max_threads=max_threads_from_env()
+            )
+        except Exception:
+            logger.warning("Checkpoint compaction of %s failed.", checkpoint_path, exc_info=True)
+            return
+        logger.debug("Compacted checkpoints: %s", stats)
+
+    def close(self) -> None:
+        """Flush memory, close the checkpointer and write the profile, if any. Idempotent."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self.profiler:
+            self.profiler.stop()
+            self.profile_paths = self.profiler.write(self._profile_output or default_profile_prefix("session"))
+        self._memory.flush_memory()
+        if self._compactor is not None:
+            self._compactor.join()
+        self._close_checkpointer()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import re
 from typing import Any
 
 
@@ -22,3 +23,62 @@ def is_rate_limit_429(exc: Exception) -> bool:
         return True
     text = str(exc).lower()
     return "429" in text or "rate limit" in text or "too many requests" in text
+
+
+# Groq writes compound durations ("try again in 2m59.56s", "1h2m3s").
+_DURATION = r"[0-9]+(?:\.[0-9]+)?\s*(?:ms|h|m|s)?"
+# Exception class names of provider SDKs (httpx, openai, groq, google) for
+# transport failures and server-side errors.
+_PROVIDER_ERROR_NAMES = ("connection", "timeout", "servererror", "internalserver", "unavailable")
+
+
+def is_provider_failure(exc: Exception) -> bool:
+    """True for errors that say the provider is unhealthy: 5xx, 429, connection and timeouts.
+
+    Client errors (4xx other than 408/429) and local failures such as output
+    parsing say nothing about the provider's health.
+    """
+    status = _get_status_code(exc)
+    if status is not None:
+        return status >= 500 or status in (408, 429)
+    if is_rate_limit_429(exc) or isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    name = type(exc).__name__.lower()
+    return any(part in name for part in _PROVIDER_ERROR_NAMES)
+
+
+_RETRY_HINT_RE = re.compile(
+    r"(?:try again in|retry in|retry_delay|retrydelay)['\"]?\s*[:=]?\s*['\"]?"
+    rf"((?:{_DURATION})+)",
+    re.IGNORECASE,
+)
+_DURATION_PART_RE = re.compile(r"([0-9]+(?:\.[0-9]+)?)\s*(ms|h|m|s)?", re.IGNORECASE)
+_UNIT_SECONDS = {"ms": 0.001, "h": 3600.0, "m": 60.0, "s": 1.0}
+
+
+def _header_value(exc: Exception, name: str) -> Any:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) if response is not None else None
+    if headers is None:
+        return None
+    try:
+        return headers.get(name)
+    except Exception:
+        return None
+
+
+def retry_after_seconds(exc: Exception) -> float | None:
+    """Best-effort ``retry-after`` hint (seconds) from a provider error."""
+    for value in (getattr(exc, "retry_after", None), _header_value(exc, "retry-after")):
+        try:
+            if value is not None:
+                return max(0.0, float(value))
+        except (TypeError, ValueError):
+            continue
+    match = _RETRY_HINT_RE.search(str(exc))
+    if not match:
+        return None
+    return sum(
+        float(value) * _UNIT_SECONDS[(unit or "s").lower()]
+        for value, unit in _DURATION_PART_RE.findall(match.group(1))
+    )
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+Mutation = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+# How often request-path statistics (hedging, grounding pre-check) are written out.
+DEFAULT_STATS_FLUSH_S = 2.0
+
+
+def stats_flush_interval_s() -> float:
+    """``UNAL_RAG_STATS_FLUSH_S`` (``0`` writes every update through)."""
+    try:
+        return max(0.0, float(os.getenv("UNAL_RAG_STATS_FLUSH_S", DEFAULT_STATS_FLUSH_S)))
+    except ValueError:
+        return DEFAULT_STATS_FLUSH_S
+
+
+def load_json_states(path: Path) -> Dict[str, Dict[str, Any]]:
+    if not path.exists():
+        return {}
+    try:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+class SharedJsonStore:
+    """Small ``name -> dict`` JSON file shared between threads and processes.
+
+    Reads are cached until the file changes on disk; writes go through a
+    temporary file and ``os.replace`` so readers never see partial JSON. Every
+    read-modify-write of the file holds an ``fcntl.flock`` on ``<name>.lock``,
+    so prefork workers do not lose each other's updates (without ``fcntl``
+    only threads of one process are serialized).
+
+    With ``flush_interval_s > 0``, ``update`` only queues the mutation and
+    applies it to an in-memory view; a background thread replays the queued
+    mutations on the latest file contents every ``flush_interval_s`` seconds
+    (and once more at exit). Readers in this process see their own pending
+    updates; other processes see them after the next flush. ``put`` always
+    writes through.
+    """
+
+    def __init__(self, path: Path, *, flush_interval_s: float = 0.0) -> None:
+        self.path = path
+        self.flush_interval_s = max(0.0, float(flush_interval_s))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._version: tuple[int, int] | None = None
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, List[Mutation]] = {}
+        self._local: Dict[str, Dict[str, Any]] = {}
+        self._flusher: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._registered = False
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        handle = None
+        if fcntl is not None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                handle = open(self.path.with_name(f"{self.path.name}.lock"), "a")
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            except OSError:
+                if handle is not None:
+                    handle.close()
+                handle = None
+        try:
+            yield
+        finally:
+            if handle is not None:
+                handle.close()  # closing the descriptor releases the flock
+
+    def _refresh(self) -> None:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version != self._version:
+            self._cache = load_json_states(self.path)
+            self._version = version
+
+    def _write(self, payload: Dict[str, Dict[str, Any]]) -> None:
+        self._cache = payload
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+            stat = self.path.stat()
+            self._version = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            return {**self._cache, **self._local}
+
+    def get(self, name: str) -> Dict[str, Any] | None:
+        with self._lock:
+            if name in self._local:
+                return self._local[name]
+            self._refresh()
+            return self._cache.get(name)
+
+    def put(self, name: str, data: Dict[str, Any]) -> None:
+        with self._lock, self._file_lock():
+            payload = load_json_states(self.path)
+            payload[name] = data
+            self._write(payload)
+
+    def update(self, name: str, mutate: Mutation) -> Dict[str, Any]:
+        """Apply ``mutate`` to one entry; returns the entry as this process now sees it."""
+        if self.flush_interval_s == 0:
+            with self._lock, self._file_lock():
+                payload = load_json_states(self.path)
+                data = mutate(dict(payload.get(name, {})))
+                payload[name] = data
+                self._write(payload)
+                return data
+        with self._lock:
+            if name not in self._local:
+                self._refresh()
+            data = mutate(dict(self._local.get(name, self._cache.get(name, {}))))
+            self._local[name] = data
+            self._pending.setdefault(name, []).append(mutate)
+        self._ensure_flusher()
+        return data
+
+    def flush(self) -> None:
+        """Replay the queued mutations on the latest file contents and write once."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            with self._file_lock():
+                payload = load_json_states(self.path)
+                for name, mutations in pending.items():
+                    data = dict(payload.get(name, {}))
+                    for mutate in mutations:
+                        data = mutate(dict(data))
+                    payload[name] = data
+                with self._lock:
+                    self._write(payload)
+                    # Updates queued during the write are re-applied on the merged entry.
+                    for name in list(self._local):
+                        data = dict(payload.get(name, {}))
+                        for mutate in self._pending.get(name, []):
+                            data = mutate(dict(data))
+                        if name in self._pending:
+                            self._local[name] = data
+                        else:
+                            del self._local[name]
+
+    def _ensure_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            if not self._registered:
+                atexit.register(self.close)
+                self._registered = True
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._run_flusher, name="unal-rag-json-flush", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        while not self._stop.wait(self.flush_interval_s):
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the flusher and write every pending update."""
+        self._stop.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self._flusher = None
+        self.flush()
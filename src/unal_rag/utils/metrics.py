@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Sequence
+
+from ..llm.hedging import percentile
+
+
+def latency_summary(samples_s: Sequence[float]) -> Dict[str, Any]:
+    """Count, mean and p50/p95/p99 in milliseconds for latency samples in seconds."""
+    if not samples_s:
+        return {"count": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    summary: Dict[str, Any] = {
+        "count": len(samples_s),
+        "mean_ms": round(1000 * sum(samples_s) / len(samples_s), 2),
+    }
+    for q in (50, 95, 99):
+        summary[f"p{q}_ms"] = round(1000 * (percentile(samples_s, q / 100) or 0.0), 2)
+    return summary
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process in MiB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def current_rss_mb() -> float | None:
+    """Current resident set size of this process in MiB (Linux only, None elsewhere)."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as handle:
+            resident_pages = int(handle.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+def available_memory_mb() -> float | None:
+    """``MemAvailable`` from /proc/meminfo in MiB (None where unsupported)."""
+    try:
+        with open("/proc/meminfo", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("MemAvailable:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def path_size_bytes(path: Path) -> int:
+    """Size of a file, or of every file under a directory."""
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    if not path.exists():
+        return 0
+    return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+
+
+def pareto_front(
+    rows: Sequence[Mapping[str, Any]],
+    *,
+    maximize: Sequence[str] = (),
+    minimize: Sequence[str] = (),
+) -> List[bool]:
+    """Flag rows that no other row beats on every objective (missing values lose)."""
+
+    def _values(row: Mapping[str, Any]) -> List[float]:
+        values = []
+        for key in maximize:
+            value = row.get(key)
+            values.append(float("-inf") if value is None else float(value))
+        for key in minimize:
+            value = row.get(key)
+            values.append(float("-inf") if value is None else -float(value))
+        return values
+
+    scored = [_values(row) for row in rows]
+    flags = []
+    for idx, current in enumerate(scored):
+        dominated = any(
+            all(o >= c for o, c in zip(other, current)) and any(o > c for o, c in zip(other, current))
+            for jdx, other in enumerate(scored)
+            if jdx != idx
+        )
+        flags.append(not dominated)
+    return flags
+
+
+def format_table(rows: Iterable[Mapping[str, Any]], columns: Sequence[str]) -> str:
+    """Render ``rows`` as a fixed-width text table with the given columns."""
+    cells: List[List[str]] = [[str(column) for column in columns]]
+    for row in rows:
+        cells.append(["-" if row.get(column) is None else str(row.get(column)) for column in columns])
+    widths = [max(len(line[idx]) for line in cells) for idx in range(len(columns))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in cells]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
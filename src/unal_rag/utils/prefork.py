@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import signal
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List
+
+
+DEFAULT_BACKOFF_S = 0.5
+MAX_BACKOFF_S = 30.0
+# A slot that crashes this many times within the window is considered broken.
+DEFAULT_MAX_RESTARTS = 5
+DEFAULT_RESTART_WINDOW_S = 60.0
+DEFAULT_GRACEFUL_TIMEOUT_S = 10.0
+POLL_INTERVAL_S = 0.2
+
+logger = logging.getLogger(__name__)
+
+
+class PreforkSupervisor:
+    """Fork ``workers`` copies of ``target(slot)`` after loading shared state once.
+
+    ``preload`` runs in the parent before the first fork (load model weights,
+    import modules); ``gc.freeze()`` then moves everything it allocated out of
+    the collector's reach, so collections in the workers do not write to, and
+    un-share, those copy-on-write pages. The parent only supervises: a worker
+    that exits is forked again after an exponential backoff, and a slot that
+    crashes ``max_restarts`` times within ``restart_window_s`` stops the pool.
+
+    ``target`` runs with SIGTERM at its default action and SIGINT ignored (the
+    parent handles Ctrl-C and terminates its workers); it may install its own
+    SIGTERM handler to shut down gracefully.
+    """
+
+    def __init__(
+        self,
+        target: Callable[[int], Any],
+        workers: int,
+        *,
+        preload: Callable[[], Any] | None = None,
+        backoff_s: float = DEFAULT_BACKOFF_S,
+        max_restarts: int = DEFAULT_MAX_RESTARTS,
+        restart_window_s: float = DEFAULT_RESTART_WINDOW_S,
+        graceful_timeout_s: float = DEFAULT_GRACEFUL_TIMEOUT_S,
+    ) -> None:
+        if not hasattr(os, "fork"):
+            raise RuntimeError("Pre-forked workers need os.fork (Linux or macOS).")
+        self.target = target
+        self.workers = max(1, int(workers))
+        self.preload = preload
+        self.backoff_s = max(0.0, float(backoff_s))
+        self.max_restarts = max(1, int(max_restarts))
+        self.restart_window_s = float(restart_window_s)
+        self.graceful_timeout_s = float(graceful_timeout_s)
+        self._pids: Dict[int, int] = {}
+        self._pending: Dict[int, float] = {}
+        self._failures: Dict[int, Deque[float]] = {slot: deque() for slot in range(self.workers)}
+        self._stop = threading.Event()
+        self.exit_code = 0
+        self.stats = {"spawned": 0, "restarts": 0, "crashes": 0}
+
+    def pids(self) -> List[int]:
+        return sorted(self._pids)
+
+    def _spawn(self, slot: int) -> int:
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover - runs in the child, which never returns
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                self.target(slot)
+            except SystemExit as exc:
+                code = exc.code if isinstance(exc.code, int) else 1
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                # Skip the parent's atexit handlers and buffered state.
+                os._exit(code)
+        self._pids[pid] = slot
+        self.stats["spawned"] += 1
+        logger.info("Worker %s started (pid %s).", slot, pid)
+        return pid
+
+    def start(self) -> None:
+        """Run ``preload`` and fork every worker."""
+        if self.preload is not None:
+            self.preload()
+        gc.collect()
+        gc.freeze()
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+    def _reap(self) -> None:
+        while self._pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._pids.clear()
+                return
+            if pid == 0:
+                return
+            slot = self._pids.pop(pid, None)
+            if slot is None:
+                continue
+            if self._stop.is_set():
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            now = time.monotonic()
+            failures = self._failures[slot]
+            if code != 0:
+                self.stats["crashes"] += 1
+                failures.append(now)
+            while failures and now - failures[0] > self.restart_window_s:
+                failures.popleft()
+            if len(failures) >= self.max_restarts:
+                logger.error(
+                    "Worker %s crashed %s times in %.0fs; stopping.", slot, len(failures), self.restart_window_s
+                )
+                self.exit_code = 1
+                self._stop.set()
+                return
+            delay = min(MAX_BACKOFF_S, self.backoff_s * 2 ** (len(failures) - 1)) if failures else 0.0
+            logger.warning("Worker %s (pid %s) exited with %s; restarting in %.1fs.", slot, pid, code, delay)
+            self._pending[slot] = now + delay
+
+    def _respawn_due(self) -> None:
+        now = time.monotonic()
+        for slot, due in list(self._pending.items()):
+            if due <= now and not self._stop.is_set():
+                del self._pending[slot]
+                self._spawn(slot)
+                self.stats["restarts"] += 1
+
+    def run(self) -> int:
+        """Supervise until ``stop()`` (or SIGTERM/SIGINT in the main thread); returns the exit code."""
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous[signum] = signal.signal(signum, lambda *_: self._stop.set())
+        try:
+            if not self._pids and not self._pending:
+                self.start()
+            while not self._stop.is_set():
+                self._reap()
+                self._respawn_due()
+                self._stop.wait(POLL_INTERVAL_S)
+        finally:
+            self.shutdown()
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        return self.exit_code
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def shutdown(self) -> None:
+        """SIGTERM every worker, wait ``graceful_timeout_s`` and SIGKILL the rest."""
+        self._stop.set()
+        self._pending.clear()
+        for pid in list(self._pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout_s
+        while self._pids and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for pid in list(self._pids):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self._pids.pop(pid, None)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, TypeVar
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+DEFAULT_PROFILE_DIR = Path("db") / "profiles"
+PROFILE_MODES = ("sampling", "cprofile")
+DEFAULT_INTERVAL_S = 0.005
+TOP_FUNCTIONS = 3
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    # Semicolons separate frames in the folded format.
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _collapse(frame: Any) -> List[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class Profiler:
+    """Per-section wall/CPU breakdown plus a whole-run profile.
+
+    ``sampling`` mode samples every thread's stack and writes collapsed
+    stacks (``.folded``, accepted by flamegraph.pl and speedscope), each
+    prefixed with the section that was running on that thread.
+    ``cprofile`` mode runs the deterministic profiler on the calling
+    thread and writes a ``.pstats`` file.
+    """
+
+    def __init__(self, mode: str = "sampling", *, interval_s: float = DEFAULT_INTERVAL_S) -> None:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.interval_s = max(0.001, float(interval_s))
+        self.stacks: Counter[str] = Counter()
+        self.sections: Dict[str, Dict[str, float]] = {}
+        self._labels: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._cprofile: Any = None
+        self._started = 0.0
+        self.elapsed_s = 0.0
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        if self.mode == "cprofile":
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+            return
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, name="unal-rag-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        self.elapsed_s = time.perf_counter() - self._started
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_s):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                prefix = self._labels.get(ident) or names.get(ident, "thread")
+                self.stacks[";".join([prefix, *_collapse(frame)])] += 1
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        """Time a named section (graph node, ingest stage) on the current thread."""
+        ident = threading.get_ident()
+        previous = self._labels.get(ident)
+        self._labels[ident] = name
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall_s, cpu_s = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            with self._lock:
+                stats = self.sections.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+                stats["calls"] += 1
+                stats["wall_s"] += wall_s
+                stats["cpu_s"] += cpu_s
+            if previous is None:
+                self._labels.pop(ident, None)
+            else:
+                self._labels[ident] = previous
+
+    def wrap(self, name: str, fn: F) -> F:
+        @functools.wraps(fn)
+        def _wrapped(*args: Any, **kwargs: Any) -> Any:
+            with self.section(name):
+                return fn(*args, **kwargs)
+
+        return _wrapped  # type: ignore[return-value]
+
+    def _top_functions(self, name: str) -> List[str]:
+        leaves: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            if frames[0] == name and len(frames) > 1:
+                leaves[frames[-1]] += count
+        return [f"{label} x{count}" for label, count in leaves.most_common(TOP_FUNCTIONS)]
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        rows = []
+        for name, stats in self.sections.items():
+            share = stats["wall_s"] / self.elapsed_s if self.elapsed_s else 0.0
+            rows.append(
+                {
+                    "section": name,
+                    "calls": int(stats["calls"]),
+                    "wall_ms": round(1000 * stats["wall_s"], 1),
+                    "cpu_ms": round(1000 * stats["cpu_s"], 1),
+                    "share": round(share, 3),
+                    "samples": sum(
+                        count for stack, count in self.stacks.items() if stack.split(";", 1)[0] == name
+                    ),
+                    "top": ", ".join(self._top_functions(name)),
+                }
+            )
+        return rows
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def write(self, prefix: Path) -> List[Path]:
+        """Write the profile and the JSON breakdown next to ``prefix``."""
+        prefix = Path(prefix)
+        prefix.parent.mkdir(parents=True, exist_ok=True)
+        written = []
+        if self._cprofile is not None:
+            path = prefix.with_suffix(".pstats")
+            self._cprofile.dump_stats(str(path))
+        else:
+            path = prefix.with_suffix(".folded")
+            path.write_text(self.folded(), encoding="utf-8")
+        written.append(path)
+        report = prefix.with_suffix(".json")
+        report.write_text(
+            json.dumps(
+                {
+                    "mode": self.mode,
+                    "elapsed_s": round(self.elapsed_s, 3),
+                    "interval_s": self.interval_s,
+                    "sections": self.breakdown(),
+                },
+                ensure_ascii=False,
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+        written.append(report)
+        return written
+
+
+def profile_mode_from_env(value: str | None = None) -> str | None:
+    """Profiler requested through ``UNAL_RAG_PROFILE`` (``1``/``sampling`` or ``cprofile``)."""
+    raw = (value if value is not None else os.getenv("UNAL_RAG_PROFILE", "")).strip().lower()
+    if raw in {"", "0", "false", "off", "no"}:
+        return None
+    if raw in {"1", "true", "on", "yes"}:
+        return "sampling"
+    return raw if raw in PROFILE_MODES else None
+
+
+def default_profile_prefix(kind: str) -> Path:
+    return DEFAULT_PROFILE_DIR / f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}"
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import functools
+import threading
+import tracemalloc
+from typing import Any, Callable, Dict, List, TypeVar
+
+from .metrics import current_rss_mb, peak_rss_mb
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _kib(value: int) -> float:
+    return round(value / 1024, 1)
+
+
+class MemoryTracker:
+    """RSS and tracemalloc snapshots around each wrapped call (graph node).
+
+    ``tracemalloc`` is started on ``start()`` when it is not already tracing,
+    so Python allocations are only paid for while the tracker is active.
+    """
+
+    def __init__(self) -> None:
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._owns_tracing = False
+
+    def __enter__(self) -> "MemoryTracker":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+
+    def stop(self) -> None:
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+    def wrap(self, name: str, fn: F) -> F:
+        @functools.wraps(fn)
+        def _wrapped(*args: Any, **kwargs: Any) -> Any:
+            rss_before = current_rss_mb()
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.reset_peak()
+                py_before, _ = tracemalloc.get_traced_memory()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record: Dict[str, Any] = {
+                    "node": name,
+                    "rss_before_mb": rss_before,
+                    "rss_after_mb": current_rss_mb(),
+                }
+                if rss_before is not None and record["rss_after_mb"] is not None:
+                    record["rss_delta_mb"] = round(record["rss_after_mb"] - rss_before, 1)
+                if tracing and tracemalloc.is_tracing():
+                    py_after, py_peak = tracemalloc.get_traced_memory()
+                    record["py_delta_kb"] = _kib(py_after - py_before)
+                    record["py_peak_kb"] = _kib(py_peak - py_before)
+                with self._lock:
+                    self.records.append(record)
+
+        return _wrapped  # type: ignore[return-value]
+
+
+def checkpoint_sizes(graph: Any, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Serialized state size of every checkpoint written by the latest run, oldest first.
+
+    Walks the thread's history back to the ``input`` checkpoint of the last
+    invocation and serializes each snapshot with the checkpointer's own serde.
+    When that serde wraps another one (``SlimSerializer``), ``full_bytes`` is
+    the size the wrapped serde alone would have written.
+    """
+    checkpointer = getattr(graph, "checkpointer", None)
+    serde = getattr(checkpointer, "serde", None)
+    if serde is None:
+        return []
+    inner = getattr(serde, "inner", None)
+    rows = []
+    try:
+        for snapshot in graph.get_state_history(config):
+            metadata = snapshot.metadata or {}
+            _, payload = serde.dumps_typed(snapshot.values)
+            row = {
+                "step": metadata.get("step"),
+                "source": metadata.get("source"),
+                "next": list(snapshot.next or ()),
+                "bytes": len(payload),
+            }
+            if inner is not None:
+                row["full_bytes"] = len(inner.dumps_typed(snapshot.values)[1])
+            rows.append(row)
+            if metadata.get("source") == "input":
+                break
+    except Exception:
+        return []
+    rows.reverse()
+    return rows
+
+
+def module_parameter_bytes(model: Any) -> int | None:
+    """Bytes held by a torch module's parameters and buffers (None for other objects)."""
+    parameters = getattr(model, "parameters", None)
+    if not callable(parameters):
+        return None
+    total = sum(param.numel() * param.element_size() for param in parameters())
+    buffers = getattr(model, "buffers", None)
+    if callable(buffers):
+        total += sum(buf.numel() * buf.element_size() for buf in buffers())
+    return int(total)
+
+
+def memory_summary(tracker: MemoryTracker | None, checkpoints: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Trace payload: per-node snapshots (with a tracker), checkpoint bytes per step and process RSS."""
+    return {
+        "rss_mb": current_rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+        "nodes": tracker.records if tracker else [],
+        "checkpoints": checkpoints,
+        "checkpoint_bytes_total": sum(row["bytes"] for row in checkpoints),
+        "checkpoint_full_bytes_total": sum(row.get("full_bytes", row["bytes"]) for row in checkpoints),
+    }
+
+
+def process_memory(pid: int | str = "self") -> Dict[str, float]:
+    """RSS, PSS and shared KiB of a process from ``/proc/<pid>/smaps_rollup`` ({} elsewhere).
+
+    PSS splits every shared page among the processes mapping it, so the sum of
+    PSS over a pre-forked pool is its real footprint.
+    """
+    fields = {"Rss": "rss_kb", "Pss": "pss_kb", "Shared_Clean": "shared_kb", "Shared_Dirty": "shared_kb"}
+    result: Dict[str, float] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as handle:
+            for line in handle:
+                name, _, rest = line.partition(":")
+                key = fields.get(name)
+                if key:
+                    result[key] = result.get(key, 0.0) + float(rest.split()[0])
+    except (OSError, ValueError, IndexError):
+        return {}
+    return result
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers with the same key share it.
+
+    The first caller (the leader) runs ``fn``; callers arriving while it is in
+    flight block and get the leader's value, or its exception re-raised. Once
+    the call finishes the key is forgotten, so later callers run again.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.stats = {"leaders": 0, "followers": 0, "expired": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], T], *, timeout: float | None = None) -> Tuple[T, bool]:
+        """Returns ``(value, shared)``; ``shared`` is True for followers.
+
+        A follower waits at most ``timeout`` seconds for the leader; after that
+        it stops waiting and runs ``fn`` itself (``shared`` False).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["leaders"] += 1
+            else:
+                call.followers += 1
+                self.stats["followers"] += 1
+        if not leader:
+            if not call.done.wait(None if timeout is None else max(0.0, timeout)):
+                with self._lock:
+                    self.stats["expired"] += 1
+                return fn(), False
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.value, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
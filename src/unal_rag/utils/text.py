@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+import math
+import unicodedata
+from typing import Sequence
+
+
+def fold_accents(text: str) -> str:
+    """Lowercase ``text`` and strip its accents (``"Sí, Cálculo"`` -> ``"si, calculo"``)."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def cosine(left: Sequence[float], right: Sequence[float]) -> float:
+    """Cosine similarity; 0.0 when either vector is all zeros."""
+    dot = sum(a * b for a, b in zip(left, right))
+    norm = math.sqrt(sum(a * a for a in left)) * math.sqrt(sum(b * b for b in right))
+    return dot / norm if norm else 0.0
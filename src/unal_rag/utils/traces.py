@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from typing import Any, List
+
+
+def extend_trace(current: List[Any] | None, update: List[Any] | None) -> List[Any]:
+    """Reducer for append-only traces.
+
+    Nodes return only the entries they add. ``None`` (sent by the request
+    input, see ``initial_state``) starts a new trace for the request.
+    """
+    if update is None:
+        return []
+    return [*(current or []), *update]
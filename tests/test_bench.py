@@ -0,0 +1,32 @@
+from unal_rag.app import bench
+
+
+def test_probe_row_reports_cold_and_warm_percentiles() -> None:
+    row = bench.probe_row("embed_query", 0.25, [0.01, 0.02, 0.03], note="dim=384")
+
+    assert row["cold_ms"] == 250.0
+    assert row["n"] == 3
+    assert row["p50_ms"] == 20.0
+    assert row["note"] == "dim=384"
+    assert bench.probe_row("skipped", None)["cold_ms"] is None
+
+
+def test_bench_imports_times_fresh_interpreters(monkeypatch) -> None:
+    monkeypatch.setattr(bench, "IMPORT_TARGETS", {"import_json": ("json", 5.0), "import_missing": ("no_such_module_xyz", 5.0)})
+
+    rows = {row["probe"]: row for row in bench.bench_imports(repeat=2)}
+
+    assert rows["import_json"]["cold_ms"] >= 0
+    assert rows["import_json"]["n"] == 1
+    assert "error" not in rows["import_json"]
+    assert rows["import_missing"]["error"] is True
+    assert "no_such_module_xyz" in rows["import_missing"]["note"]
+
+
+def test_bench_imports_flags_modules_over_budget(monkeypatch) -> None:
+    monkeypatch.setattr(bench, "IMPORT_TARGETS", {"import_json": ("json", 0.0)})
+
+    (row,) = bench.bench_imports(repeat=2)
+
+    assert row["error"] is True
+    assert "OVER BUDGET" in row["note"]
@@ -0,0 +1,125 @@
+import pickle
+import sqlite3
+from dataclasses import dataclass, field
+
+from unal_rag.checkpoints import (
+    CheckpointCompactor,
+    SlimSerializer,
+    compact_checkpoint_file,
+    compact_checkpoints,
+    tune_connection,
+)
+
+
+@dataclass
+class _Document:
+    page_content: str
+    metadata: dict = field(default_factory=dict)
+
+
+class _PickleSerde:
+    def dumps_typed(self, value):
+        return "pickle", pickle.dumps(value)
+
+    def loads_typed(self, data):
+        return pickle.loads(data[1])
+
+
+def _chunk(chunk_id: str, text: str) -> _Document:
+    return _Document(text, {"chunk_id": chunk_id, "content_hash": f"h{len(text)}-{text[:4]}", "source": "doc.pdf"})
+
+
+def test_documents_become_chunk_references_and_prompts_are_compressed() -> None:
+    serde = SlimSerializer(inner=_PickleSerde(), document_factory=_Document)
+    documents = [_chunk("a-1", "texto " * 400), _chunk("a-2", "otro " * 400)]
+    state = {"documents": documents, "generator_prompt": "contexto " * 1000, "question": "corta"}
+
+    slim = serde.dumps_typed(state)
+    full = _PickleSerde().dumps_typed(state)
+
+    assert len(slim[1]) < len(full[1]) / 5
+    assert serde.loads_typed(slim) == state
+
+
+def test_chunks_missing_from_the_cache_are_resolved_from_the_index_in_one_call() -> None:
+    index = {"a-1": _chunk("a-1", "texto"), "a-2": _chunk("a-2", "cambiado")}
+    calls = []
+
+    def resolver(chunk_ids):
+        calls.append(list(chunk_ids))
+        return {chunk_id: index[chunk_id] for chunk_id in chunk_ids if chunk_id in index}
+
+    writer = SlimSerializer(inner=_PickleSerde(), document_factory=_Document)
+    payload = writer.dumps_typed({"documents": [_chunk("a-1", "texto"), _chunk("a-2", "viejo"), _chunk("a-3", "x")]})
+    reader = SlimSerializer(resolver, inner=_PickleSerde(), document_factory=_Document)
+
+    documents = reader.loads_typed(payload)["documents"]
+
+    assert calls == [["a-1", "a-2", "a-3"]]
+    assert documents[0] == index["a-1"]
+    # Re-ingested with other content, or gone: an empty placeholder.
+    assert documents[1] == _Document("", {"chunk_id": "a-2", "rehydrated": False})
+    assert documents[2].metadata["rehydrated"] is False
+
+
+def _checkpoint_db(path) -> sqlite3.Connection:
+    conn = tune_connection(sqlite3.connect(path))
+    conn.execute(
+        "CREATE TABLE checkpoints (thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, checkpoint BLOB)"
+    )
+    conn.execute("CREATE TABLE writes (thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, value BLOB)")
+    for thread_id, count in (("a", 5), ("b", 2)):
+        for idx in range(count):
+            row = (thread_id, "", f"{idx:04d}", b"x")
+            conn.execute("INSERT INTO checkpoints VALUES (?, ?, ?, ?)", row)
+            conn.execute("INSERT INTO writes VALUES (?, ?, ?, ?)", row)
+    conn.commit()
+    return conn
+
+
+def test_compaction_keeps_the_newest_checkpoints_per_thread(tmp_path) -> None:
+    conn = _checkpoint_db(tmp_path / "checkpoints.sqlite")
+
+    stats = compact_checkpoints(conn, keep_last=3)
+
+    assert stats == {"checkpoints_deleted": 2, "writes_deleted": 2, "threads_deleted": 0}
+    rows = conn.execute("SELECT thread_id, checkpoint_id FROM checkpoints ORDER BY 1, 2").fetchall()
+    assert rows == [("a", "0002"), ("a", "0003"), ("a", "0004"), ("b", "0000"), ("b", "0001")]
+    assert compact_checkpoints(conn, keep_last=1, thread_id="b")["checkpoints_deleted"] == 1
+    assert compact_checkpoints(conn, keep_last=0)["checkpoints_deleted"] == 0
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_compaction_drops_the_least_recently_active_threads(tmp_path) -> None:
+    conn = _checkpoint_db(tmp_path / "checkpoints.sqlite")
+    conn.execute("INSERT INTO checkpoints VALUES ('serve-1', '', '0009', x'00')")
+    conn.commit()
+    conn.close()
+
+    stats = compact_checkpoint_file(tmp_path / "checkpoints.sqlite", keep_last=3, max_threads=2)
+
+    # "b" was checkpointed last the longest ago; "a" keeps its newest three.
+    assert stats == {"checkpoints_deleted": 4, "writes_deleted": 4, "threads_deleted": 1}
+    conn = sqlite3.connect(tmp_path / "checkpoints.sqlite")
+    assert conn.execute("SELECT DISTINCT thread_id FROM checkpoints ORDER BY 1").fetchall() == [("a",), ("serve-1",)]
+    assert conn.execute("SELECT COUNT(*) FROM writes WHERE thread_id = 'b'").fetchone()[0] == 0
+    assert compact_checkpoint_file(tmp_path / "missing.sqlite")["checkpoints_deleted"] == 0
+
+
+def test_compactor_runs_every_n_writes_or_after_the_interval() -> None:
+    now = [0.0]
+    runs = []
+    compactor = CheckpointCompactor(lambda: runs.append(now[0]), every_writes=3, every_s=60.0, clock=lambda: now[0])
+
+    for _ in range(4):
+        compactor.note_write()
+        compactor.join()
+    assert runs == [0.0]
+
+    now[0] = 61.0
+    compactor.note_write()
+    compactor.join()
+    assert runs == [0.0, 61.0]
+    # Idle time alone does not trigger a run: nothing was written since.
+    now[0] = 200.0
+    assert compactor.due() is False
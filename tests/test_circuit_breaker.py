@@ -0,0 +1,239 @@
+import multiprocessing
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from unal_rag.app.doctor import describe_breakers
+from unal_rag.llm.circuit_breaker import BreakerStateStore, CircuitBreaker, load_breaker_states
+from unal_rag.utils.errors import is_provider_failure
+from unal_rag.utils.json_store import SharedJsonStore
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_breaker_opens_after_threshold_and_probes_after_cooldown() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker("router", failure_threshold=2, cooldown_s=30.0, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.allow() is True
+    breaker.record_failure()
+    assert breaker.is_open() is True
+    assert breaker.allow() is False
+
+    clock.now += 31.0
+    assert breaker.state == "half_open"
+    assert breaker.allow() is True
+    assert breaker.allow() is False  # only one probe in flight
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens_breaker() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker("k_selector", failure_threshold=1, cooldown_s=10.0, clock=clock)
+    breaker.record_failure()
+    clock.now += 11.0
+    assert breaker.allow() is True
+
+    breaker.record_failure()
+
+    assert breaker.is_open() is True
+
+
+def test_state_is_shared_through_store(tmp_path: Path) -> None:
+    path = tmp_path / "breakers.json"
+    clock = FakeClock()
+    first = CircuitBreaker(
+        "rag_generation", failure_threshold=2, store=BreakerStateStore(path), clock=clock
+    )
+    first.record_failure()
+    second = CircuitBreaker(
+        "rag_generation", failure_threshold=2, store=BreakerStateStore(path), clock=clock
+    )
+    second.record_failure()
+
+    assert first.is_open() is True
+    assert describe_breakers(load_breaker_states(path), now=clock.now) == {
+        "rag_generation": "open (retry in 60s)"
+    }
+
+
+def _isolated_runtime(monkeypatch, tmp_path: Path, run):
+    from src import llm_runtime
+
+    monkeypatch.setattr(llm_runtime, "_BREAKERS", {})
+    monkeypatch.setattr(llm_runtime, "_MODE_STORES", {})
+    monkeypatch.setattr(llm_runtime, "_BREAKER_STORE", llm_runtime.BreakerStateStore(tmp_path / "breakers.json"))
+    monkeypatch.setattr(llm_runtime, "_HEDGE_STORE", llm_runtime.SharedJsonStore(tmp_path / "hedging.json"))
+    scheduler = SimpleNamespace(max_queue_wait_s=5.0, run=run)
+    monkeypatch.setattr(llm_runtime, "get_scheduler", lambda provider: scheduler)
+    return llm_runtime
+
+
+def _role():
+    from src.llm_config import LLMRoleConfig
+
+    return LLMRoleConfig(name="router", provider="groq", model="m", temperature=0.0, rationale="")
+
+
+def test_local_queue_timeouts_leave_the_breaker_closed(monkeypatch, tmp_path: Path) -> None:
+    from src.unal_rag.llm.rate_limit import QueueTimeoutError
+
+    def run(fn, **kwargs):
+        raise QueueTimeoutError("request deadline reached while queued")
+
+    llm_runtime = _isolated_runtime(monkeypatch, tmp_path, run)
+    role = _role()
+    for _ in range(5):
+        stats = {}
+        with pytest.raises(QueueTimeoutError):
+            llm_runtime.invoke_llm(role, lambda: "ok", prompt="hola", stats=stats)
+        assert stats["outcome"] == "queue_timeout"
+
+    assert llm_runtime.get_breaker(role).state == "closed"
+
+
+def test_only_provider_errors_open_the_breaker(monkeypatch, tmp_path: Path) -> None:
+    errors = [ValueError("could not parse structured output")] * 3 + [ConnectionError("reset")] * 3
+
+    def run(fn, **kwargs):
+        raise errors.pop(0)
+
+    llm_runtime = _isolated_runtime(monkeypatch, tmp_path, run)
+    role = _role()
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            llm_runtime.invoke_llm(role, lambda: "ok", prompt="hola")
+    assert llm_runtime.get_breaker(role).state == "closed"
+
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            llm_runtime.invoke_llm(role, lambda: "ok", prompt="hola")
+    assert llm_runtime.get_breaker(role).state == "open"
+
+
+def test_single_candidate_responses_are_validated(monkeypatch, tmp_path: Path) -> None:
+    from src.unal_rag.llm.hedging import NoValidResponseError
+
+    llm_runtime = _isolated_runtime(monkeypatch, tmp_path, lambda fn, **kwargs: fn())
+    role = _role()
+    assert role.candidates == (role,)
+
+    with pytest.raises(NoValidResponseError):
+        llm_runtime.invoke_with_fallbacks(role, lambda target: None, prompt="hola")
+    with pytest.raises(NoValidResponseError):
+        llm_runtime.invoke_with_fallbacks(role, lambda target: "", prompt="hola", is_valid=bool)
+    assert llm_runtime.invoke_with_fallbacks(role, lambda target: "ok", prompt="hola", is_valid=bool) == "ok"
+
+
+def test_replay_runs_keep_their_own_breaker_and_hedge_state(monkeypatch, tmp_path: Path) -> None:
+    from src.unal_rag.llm.replay import ReplayMissError
+
+    errors = [ReplayMissError("no fixture")] * 3 + [ConnectionError("reset")] * 3
+
+    def run(fn, **kwargs):
+        raise errors.pop(0)
+
+    llm_runtime = _isolated_runtime(monkeypatch, tmp_path, run)
+    monkeypatch.setenv("UNAL_RAG_LLM_MODE", "replay")
+    role = _role()
+    for _ in range(3):
+        stats = {}
+        with pytest.raises(ReplayMissError):
+            llm_runtime.invoke_llm(role, lambda: "ok", prompt="hola", stats=stats)
+        assert stats["outcome"] == "replay_miss"
+    assert llm_runtime.get_breaker(role).state == "closed"
+
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            llm_runtime.invoke_llm(role, lambda: "ok", prompt="hola")
+    llm_runtime._record_hedge(role, winner="router", hedged=False)
+    assert llm_runtime.get_breaker(role).state == "open"
+    assert load_breaker_states(tmp_path / "breakers.replay.json")["router"]["state"] == "open"
+    assert (tmp_path / "hedging.replay.json").exists()
+
+    monkeypatch.setenv("UNAL_RAG_LLM_MODE", "live")
+    assert llm_runtime.get_breaker(role).state == "closed"
+    assert not (tmp_path / "breakers.json").exists()
+    assert not (tmp_path / "hedging.json").exists()
+
+
+def test_provider_failure_classification() -> None:
+    class APIStatusError(Exception):
+        def __init__(self, status_code: int) -> None:
+            super().__init__(f"status {status_code}")
+            self.status_code = status_code
+
+    class APITimeoutError(Exception):
+        pass
+
+    assert is_provider_failure(APIStatusError(503)) is True
+    assert is_provider_failure(APIStatusError(429)) is True
+    assert is_provider_failure(APIStatusError(400)) is False
+    assert is_provider_failure(APITimeoutError("read timed out")) is True
+    assert is_provider_failure(ValueError("bad json")) is False
+
+
+def test_primary_latency_samples_include_censored_ones(monkeypatch, tmp_path: Path) -> None:
+    llm_runtime = _isolated_runtime(monkeypatch, tmp_path, lambda fn, **kwargs: fn())
+    role = _role()
+    record = llm_runtime._primary_latency_recorder(role)
+
+    record(0.8, False)
+    record(12.0, True)
+
+    data = llm_runtime._mode_store(llm_runtime._HEDGE_STORE).get("router")
+    assert data["latencies"] == [0.8, 12.0]
+    assert data["censored"] == 1
+
+
+def _bump(data):
+    data["count"] = int(data.get("count", 0)) + 1
+    return data
+
+
+def _bump_many(path: str, times: int) -> None:
+    store = SharedJsonStore(Path(path))
+    for _ in range(times):
+        store.update("stats", _bump)
+
+
+def test_shared_json_store_does_not_lose_updates_across_processes(tmp_path: Path) -> None:
+    path = tmp_path / "stats.json"
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_bump_many, args=(str(path), 25)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+
+    assert SharedJsonStore(path).get("stats") == {"count": 100}
+
+
+def test_buffered_store_flushes_pending_updates_on_top_of_other_writers(tmp_path: Path) -> None:
+    path = tmp_path / "stats.json"
+    first = SharedJsonStore(path, flush_interval_s=3600.0)
+    second = SharedJsonStore(path, flush_interval_s=3600.0)
+    try:
+        assert first.update("stats", _bump) == {"count": 1}
+        assert first.update("stats", _bump) == {"count": 2}
+        second.update("stats", _bump)
+        assert not path.exists()  # nothing written on the request path
+        assert first.get("stats") == {"count": 2}
+
+        second.flush()
+        first.flush()
+        assert SharedJsonStore(path).get("stats") == {"count": 3}
+        assert first.get("stats") == {"count": 3}
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,47 @@
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY_MODULES = (
+    "langchain_community",
+    "langchain_huggingface",
+    "langchain_chroma",
+    "langchain_groq",
+    "langchain_google_genai",
+    "chromadb",
+    "transformers",
+    "torch",
+    "bs4",
+    "ingestion_pipeline",
+)
+
+# Fails any import of a heavy module, so the check holds whether or not they are installed.
+_PROBE = """
+import sys
+
+class _Blocker:
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in {heavy!r}:
+            raise ImportError("blocked heavy import: " + name)
+        return None
+
+sys.meta_path.insert(0, _Blocker())
+import unal_rag.app.cli
+from unal_rag.app.cli import build_parser
+build_parser()
+for module in ("doctor", "ingest", "ingest_sweep", "ask", "eval_retrieval", "usage", "bench", "serve"):
+    __import__("unal_rag.app." + module)
+"""
+
+
+def test_cli_and_subcommand_modules_import_without_heavy_dependencies() -> None:
+    src = Path(__file__).resolve().parents[1] / "src"
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(heavy=set(HEAVY_MODULES))],
+        capture_output=True,
+        text=True,
+        env={"PYTHONPATH": str(src), "PATH": ""},
+        check=False,
+    )
+
+    assert completed.returncode == 0, completed.stderr
@@ -0,0 +1,72 @@
+from dataclasses import dataclass, field
+
+from unal_rag.retrieval.context import (
+    PackedContext,
+    TokenCounter,
+    join_overlapping,
+    pack_context,
+    reuse_or_pack,
+)
+
+
+@dataclass
+class Doc:
+    page_content: str
+    metadata: dict = field(default_factory=dict)
+
+
+def _doc(text: str, doc_id: str, seq: int) -> Doc:
+    return Doc(text, {"doc_id": doc_id, "chunk_id": f"{doc_id}-{seq}", "source": f"{doc_id}.html"})
+
+
+def test_adjacent_chunks_are_merged_without_repeating_overlap() -> None:
+    docs = [
+        _doc("Articulo 5. El estudiante podra cancelar asignaturas hasta la semana ocho.", "a", 11),
+        _doc("Otro documento sin relacion con el primero.", "b", 40),
+        _doc("cancelar asignaturas hasta la semana ocho. Despues requiere autorizacion.", "a", 12),
+    ]
+
+    packed = pack_context(docs, budget_tokens=0, counter=TokenCounter())
+
+    assert [block.chunk_ids for block in packed.blocks] == [["a-11", "a-12"], ["b-40"]]
+    assert packed.blocks[0].text.count("semana ocho") == 1
+    assert packed.merged_chunks == 1
+
+
+def test_budget_keeps_rank_order_and_drops_tail() -> None:
+    docs = [_doc("x" * 800, f"d{i}", i * 10) for i in range(4)]
+
+    packed = pack_context(docs, budget_tokens=400, counter=TokenCounter())
+
+    assert [block.doc_id for block in packed.blocks] == ["d0", "d1"]
+    assert packed.blocks[1].truncated is True
+    assert packed.tokens <= 400
+    assert packed.dropped_chunks == 2
+    assert len(packed.select(250)) == 1
+
+
+def test_select_keeps_cited_blocks_beyond_the_budget() -> None:
+    docs = [_doc("x" * 1000, f"d{i}", i * 10) for i in range(5)]
+    packed = pack_context(docs, budget_tokens=0, counter=TokenCounter())
+
+    # 270 tokens per block (header included).
+    assert [block.number for block in packed.select(600)] == [1, 2]
+    # [DOC 5] is cited: it is always in, and only the remaining budget goes to rank order.
+    assert [block.number for block in packed.select(600, keep={5})] == [1, 5]
+    assert [block.number for block in packed.select(400, keep={4, 5})] == [4, 5]
+    assert "[DOC 5]" in packed.render(300, keep=[5]) and "[DOC 1]" not in packed.render(300, keep=[5])
+    assert len(packed.select(None, keep={5})) == 5
+
+
+def test_packed_context_round_trips_through_state() -> None:
+    docs = [_doc("Texto del articulo uno.", "a", 1)]
+    packed = pack_context(docs, budget_tokens=100, counter=TokenCounter())
+
+    reused = reuse_or_pack(packed.to_dict(), docs, budget_tokens=100, counter=TokenCounter())
+
+    assert isinstance(reused, PackedContext)
+    assert reused.render() == packed.render()
+
+
+def test_join_overlapping_falls_back_to_space() -> None:
+    assert join_overlapping("uno dos", "tres cuatro") == "uno dos tres cuatro"
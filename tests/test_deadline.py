@@ -0,0 +1,85 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from src import llm_runtime
+from src.llm_config import LLMRoleConfig
+from src.llm_runtime import (
+    deadline_at,
+    deadline_degradation,
+    has_budget,
+    record_degradation,
+    record_llm_call,
+    remaining_s,
+)
+from src.unal_rag.llm.rate_limit import DeadlineExceededError, run_with_timeout
+
+
+def test_deadline_is_absolute_and_optional(monkeypatch) -> None:
+    monkeypatch.delenv("UNAL_RAG_DEADLINE", raising=False)
+    assert deadline_at(None, now=100.0) == 0.0
+    assert deadline_at(0, now=100.0) == 0.0
+    assert deadline_at(12.5, now=100.0) == 112.5
+
+    monkeypatch.setenv("UNAL_RAG_DEADLINE", "20")
+    assert deadline_at(None, now=100.0) == 120.0
+
+
+def test_budget_checks_against_remaining_time() -> None:
+    assert remaining_s({}, now=50.0) is None
+    assert has_budget({}, 1e9)
+
+    state = {"deadline_at": 60.0}
+    assert remaining_s(state, now=50.0) == 10.0
+    assert not has_budget({"deadline_at": 1.0}, 0.0)
+
+
+def test_degradations_are_recorded_once() -> None:
+    state = {"degradations": ["skip_k_selector"]}
+    assert record_degradation(state, "skip_evaluator") == ["skip_evaluator"]
+    assert record_degradation({"degradations": ["skip_evaluator"]}, "skip_evaluator") == []
+    assert record_degradation({"degradations": None}, "skip_retry") == ["skip_retry"]
+    assert state["degradations"] == ["skip_k_selector"]
+
+
+def test_llm_call_updates_carry_only_the_new_call() -> None:
+    state = {"llm_calls": [{"role": "router"}], "iteration_count": 1}
+    assert record_llm_call(state, {"role": "evaluator"}) == [{"role": "evaluator", "iteration": 1}]
+    assert record_llm_call(state, {}) == []
+
+
+def test_provider_calls_are_abandoned_at_the_deadline(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(llm_runtime, "_SCHEDULERS", {})
+    monkeypatch.setattr(llm_runtime, "_BREAKERS", {})
+    monkeypatch.setattr(llm_runtime, "_BREAKER_STORE", llm_runtime.BreakerStateStore(tmp_path / "breakers.json"))
+    role = LLMRoleConfig(name="router", provider="groq", model="m", temperature=0.0, rationale="")
+    finished = threading.Event()
+
+    def slow_model() -> str:
+        time.sleep(1.0)
+        finished.set()
+        return "late"
+
+    stats = {}
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError) as excinfo:
+        llm_runtime.invoke_llm(role, slow_model, prompt="hola", stats=stats, deadline=time.time() + 0.2)
+
+    assert time.monotonic() - started < 0.8
+    assert not finished.is_set()
+    assert stats["outcome"] == "deadline_exceeded"
+    assert llm_runtime.get_breaker(role).state == "closed"
+    assert deadline_degradation({}, excinfo.value) == ["deadline_exceeded"]
+    assert deadline_degradation({"degradations": ["deadline_exceeded"]}, excinfo.value) == []
+    assert deadline_degradation({}, ValueError("bad json")) == []
+
+
+def test_run_with_timeout_returns_fast_results_and_their_errors() -> None:
+    assert run_with_timeout(lambda: 3, None) == 3
+    assert run_with_timeout(lambda: 4, 1.0) == 4
+    with pytest.raises(ValueError):
+        run_with_timeout(lambda: int("x"), 1.0)
+    with pytest.raises(DeadlineExceededError):
+        run_with_timeout(lambda: 5, 0.0)
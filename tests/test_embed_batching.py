@@ -0,0 +1,133 @@
+import threading
+
+import pytest
+
+from unal_rag.retrieval.batching import (
+    MicroBatcher,
+    batch_window_ms_from_env,
+    cache_size_from_env,
+    max_batch_from_env,
+)
+
+
+def _embed_all(batcher: MicroBatcher, texts):
+    results = {}
+    errors = {}
+    start = threading.Barrier(len(texts))
+
+    def _call(text: str) -> None:
+        start.wait()
+        try:
+            results[text] = batcher.embed(text)
+        except Exception as exc:
+            errors[text] = exc
+
+    threads = [threading.Thread(target=_call, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results, errors
+
+
+def test_concurrent_queries_share_forward_passes_and_get_their_own_vectors() -> None:
+    batches = []
+
+    def batch_fn(texts):
+        batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    batcher = MicroBatcher(batch_fn, window_ms=200, max_batch=16)
+    texts = [f"q{'x' * index}" for index in range(8)]
+
+    results, errors = _embed_all(batcher, texts)
+
+    assert errors == {}
+    assert {text: vector[0] for text, vector in results.items()} == {text: float(len(text)) for text in texts}
+    assert len(batches) < len(texts)
+    stats = batcher.stats()
+    assert stats["requests"] == 8 and stats["batches"] == len(batches)
+    assert stats["largest_batch"] == max(len(batch) for batch in batches)
+    assert stats["added_ms_max"] >= stats["added_ms_mean"] > 0
+
+
+def test_batches_never_exceed_max_batch() -> None:
+    sizes = []
+
+    def batch_fn(texts):
+        sizes.append(len(texts))
+        return [[0.0] for _ in texts]
+
+    batcher = MicroBatcher(batch_fn, window_ms=200, max_batch=3)
+    results, errors = _embed_all(batcher, [f"q{index}" for index in range(7)])
+
+    assert errors == {} and len(results) == 7
+    assert sum(sizes) == 7 and max(sizes) <= 3
+
+
+def test_batch_errors_reach_every_caller_in_the_batch() -> None:
+    def batch_fn(texts):
+        raise RuntimeError("model not loaded")
+
+    batcher = MicroBatcher(batch_fn, window_ms=100, max_batch=4)
+    results, errors = _embed_all(batcher, ["a", "b", "c"])
+
+    assert results == {}
+    assert {str(exc) for exc in errors.values()} == {"model not loaded"}
+    assert len(errors) == 3
+    # The collector thread survives a failed batch.
+    batcher.batch_fn = lambda texts: [[1.0] for _ in texts]
+    assert batcher.embed("d") == [1.0]
+
+
+def test_zero_window_embeds_each_query_directly() -> None:
+    calls = []
+
+    def batch_fn(texts):
+        calls.append(list(texts))
+        if texts == ["boom"]:
+            raise ValueError("bad text")
+        return [[2.0, 3.0]]
+
+    batcher = MicroBatcher(batch_fn, window_ms=0)
+
+    assert batcher.enabled is False
+    assert batcher.embed("hola") == [2.0, 3.0]
+    with pytest.raises(ValueError):
+        batcher.embed("boom")
+    assert calls == [["hola"], ["boom"]]
+    assert batcher.stats()["batches"] == 2
+
+
+def test_recent_questions_are_served_from_the_cache() -> None:
+    calls = []
+
+    def batch_fn(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    batcher = MicroBatcher(batch_fn, window_ms=0, cache_size=2)
+
+    assert batcher.embed("a") == [1.0]
+    batcher.embed("bb")
+    vector = batcher.embed("a")
+    vector.append(9.0)
+    assert batcher.embed("a") == [1.0]
+    # "bb" is the least recently used entry and makes room for "ccc".
+    batcher.embed("ccc")
+    batcher.embed("bb")
+    assert calls == [["a"], ["bb"], ["ccc"], ["bb"]]
+    assert batcher.stats()["cache_hits"] == 2
+    assert MicroBatcher(batch_fn, window_ms=0).embed("a") == [1.0] and len(calls) == 5
+
+
+def test_batching_settings_come_from_env(monkeypatch) -> None:
+    monkeypatch.setenv("UNAL_RAG_EMBED_BATCH_MS", "5")
+    monkeypatch.setenv("UNAL_RAG_EMBED_BATCH_MAX", "0")
+    assert batch_window_ms_from_env() == 5.0
+    assert max_batch_from_env() == 1
+    monkeypatch.setenv("UNAL_RAG_EMBED_BATCH_MS", "nope")
+    assert batch_window_ms_from_env() == 2.0
+    assert cache_size_from_env() == 256
+    monkeypatch.setenv("UNAL_RAG_EMBED_CACHE", "0")
+    assert cache_size_from_env() == 0
@@ -0,0 +1,131 @@
+import math
+
+from unal_rag.retrieval.followup import (
+    FollowupThresholds,
+    PairSimilarity,
+    ReuseStats,
+    calibrate_thresholds,
+    decide_followup,
+    followup_thresholds,
+    is_elliptical,
+    rerank,
+    score_thresholds,
+)
+
+
+# e5-small width; cosines are set exactly so the tests sit at realistic values
+# (unrelated e5 questions still score ~0.7-0.8, not 0).
+DIM = 384
+
+
+def _axis(index: int):
+    vector = [0.0] * DIM
+    vector[index] = 1.0
+    return vector
+
+
+def _toward(base, cosine: float, axis: int):
+    """Unit vector at ``cosine`` from unit ``base``, tilted along an axis orthogonal to it."""
+    side = math.sqrt(1 - cosine**2)
+    return [cosine * b + side * o for b, o in zip(base, _axis(axis))]
+
+
+PREVIOUS = _axis(0)
+CHUNKS = [_toward(PREVIOUS, 0.86, 1), _toward(PREVIOUS, 0.78, 2), _toward(PREVIOUS, 0.74, 3)]
+
+
+def test_elliptical_cues_are_detected_without_accents() -> None:
+    assert is_elliptical("¿Y cuál es el plazo?")
+    assert is_elliptical("Cuanto cuesta eso")
+    assert not is_elliptical("Requisitos para cancelar el semestre")
+
+
+def test_close_question_reuses_candidates() -> None:
+    decision = decide_followup("Plazo para cancelar asignaturas", _toward(PREVIOUS, 0.9, 10), PREVIOUS, CHUNKS)
+
+    assert decision.reuse and decision.reason == "same_topic"
+    assert decision.question_similarity == 0.9
+    assert len(decision.chunk_similarities) == 3
+    assert set(decision.to_dict()) == {"reuse", "reason", "cue", "question_similarity", "chunk_similarity"}
+
+
+def test_question_answered_by_a_cached_chunk_reuses_and_reranks() -> None:
+    # 0.85 to the second chunk, ~0.66 to the previous question: only the chunk clears its threshold.
+    vector = _toward(CHUNKS[1], 0.85, 20)
+    decision = decide_followup("Recargo por cancelacion tardia", vector, PREVIOUS, CHUNKS)
+
+    assert decision.question_similarity < 0.88
+    assert decision.reuse and decision.reason == "covered_by_candidates" and not decision.cue
+    assert rerank(["a", "b", "c"], decision.chunk_similarities, 2) == ["b", "a"]
+
+
+def test_elliptical_question_gets_the_cue_margin() -> None:
+    vector = _toward(PREVIOUS, 0.86, 10)
+
+    assert decide_followup("Plazo de pago", vector, PREVIOUS, CHUNKS).reason == "topic_change"
+    decision = decide_followup("¿Y el plazo de pago?", vector, PREVIOUS, CHUNKS)
+    assert decision.cue and decision.reason == "same_topic"
+
+
+def test_topic_change_runs_a_fresh_search() -> None:
+    decision = decide_followup("Horario de biblioteca", _toward(PREVIOUS, 0.75, 30), PREVIOUS, CHUNKS)
+
+    assert not decision.reuse and decision.reason == "topic_change"
+    assert decide_followup("x", PREVIOUS, None, CHUNKS).reason == "no_previous_turn"
+    assert decide_followup("x", PREVIOUS, PREVIOUS, []).reason == "no_candidates"
+
+
+def test_thresholds_come_from_env(monkeypatch) -> None:
+    assert followup_thresholds() == FollowupThresholds()
+    monkeypatch.setenv("UNAL_RAG_FOLLOWUP_QUESTION_SIM", "0.92")
+    monkeypatch.setenv("UNAL_RAG_FOLLOWUP_CHUNK_SIM", "nope")
+    monkeypatch.setenv("UNAL_RAG_FOLLOWUP_CUE_MARGIN", "-1")
+    assert followup_thresholds() == FollowupThresholds(question=0.92, chunk=0.84, cue_margin=0.0)
+
+    vector = _toward(PREVIOUS, 0.9, 10)
+    assert decide_followup("Plazo de pago", vector, PREVIOUS, CHUNKS).reason == "topic_change"
+    strict = FollowupThresholds(question=0.95, chunk=0.95, cue_margin=0.0)
+    assert not decide_followup("Plazo", _toward(PREVIOUS, 0.93, 10), PREVIOUS, CHUNKS, thresholds=strict).reuse
+
+
+PAIRS = [
+    PairSimilarity(followup=True, cue=False, question_similarity=0.91, chunk_similarity=0.83),
+    PairSimilarity(followup=True, cue=True, question_similarity=0.85, chunk_similarity=0.82),
+    PairSimilarity(followup=True, cue=False, question_similarity=0.84, chunk_similarity=0.87),
+    PairSimilarity(followup=False, cue=False, question_similarity=0.86, chunk_similarity=0.80),
+    PairSimilarity(followup=False, cue=False, question_similarity=0.78, chunk_similarity=0.79),
+]
+
+
+def test_score_thresholds_counts_false_reuse_and_misses() -> None:
+    score = score_thresholds(PAIRS, FollowupThresholds(question=0.85, chunk=0.84, cue_margin=0.0))
+
+    assert score["reused"] == 4 and score["false_reuse"] == 1 and score["missed"] == 0
+    assert score["precision"] == 0.75 and score["recall"] == 1.0
+    assert score["question"] == 0.85
+
+
+def test_calibration_keeps_precision_and_maximizes_recall() -> None:
+    best = calibrate_thresholds(PAIRS)
+
+    assert best["precision"] == 1.0 and best["recall"] == 1.0
+    assert best["false_reuse"] == 0 and best["missed"] == 0
+    # Among the perfect combinations the strictest wins: the chunk threshold
+    # sits just above the 0.80 distractor and the cue margin is as small as it can be.
+    assert (best["question"], best["chunk"], best["cue_margin"]) == (0.96, 0.83, 0.01)
+    assert calibrate_thresholds(PAIRS, min_precision=1.01)["precision"] == 1.0
+
+
+def test_reuse_stats_report_rate_and_saved_latency() -> None:
+    stats = ReuseStats()
+    stats.record(False)
+    stats.record(True, 900.0)
+    stats.record(True, 300.0)
+
+    assert stats.snapshot() == {
+        "turns": 3,
+        "reused": 2,
+        "reuse_rate": 0.667,
+        "saved_ms_total": 1200.0,
+        "saved_ms_mean": 600.0,
+    }
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from unal_rag.llm.hedging import percentile, run_hedged
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled() -> None:
+    released = threading.Event()
+
+    def slow(cancelled: threading.Event) -> str:
+        cancelled.wait(2.0)
+        released.set()
+        return "primary"
+
+    def fast(cancelled: threading.Event) -> str:
+        return "secondary"
+
+    outcome = run_hedged([slow, fast], hedge_delay_s=0.05)
+
+    assert outcome.value == "secondary"
+    assert outcome.index == 1
+    assert outcome.hedged is True
+    assert outcome.cancelled == [0]
+    assert outcome.primary_latency_s is None
+    assert released.wait(1.0)
+
+
+def test_primary_latency_is_recorded_only_when_the_primary_wins() -> None:
+    samples = []
+
+    def primary(cancelled: threading.Event) -> str:
+        time.sleep(0.05)
+        return "primary"
+
+    outcome = run_hedged(
+        [primary, lambda cancelled: "secondary"],
+        hedge_delay_s=1.0,
+        on_primary_latency=lambda latency, censored: samples.append((latency, censored)),
+    )
+
+    assert outcome.index == 0
+    assert 0.05 <= outcome.primary_latency_s <= outcome.elapsed_s
+    assert samples == [(outcome.primary_latency_s, False)]
+
+
+def _sampled(samples: list, count: int = 1) -> bool:
+    deadline = time.monotonic() + 5.0
+    while len(samples) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return len(samples) == count
+
+
+def test_primary_that_loses_is_sampled_when_it_finishes() -> None:
+    samples = []
+
+    def slow(cancelled: threading.Event) -> str:
+        # Already talking to the provider: the cancel event does not stop it.
+        time.sleep(0.3)
+        return "primary"
+
+    outcome = run_hedged(
+        [slow, lambda cancelled: "secondary"],
+        hedge_delay_s=0.05,
+        on_primary_latency=lambda latency, censored: samples.append((latency, censored)),
+        censor_after_s=5.0,
+    )
+
+    assert outcome.index == 1 and samples == []
+    assert _sampled(samples)
+    latency, censored = samples[0]
+    assert censored is False and latency >= 0.3
+
+
+def test_primary_that_fails_or_hangs_after_losing_gives_a_censored_sample() -> None:
+    samples = []
+    release = threading.Event()
+
+    def failing(cancelled: threading.Event) -> str:
+        time.sleep(0.2)
+        raise RuntimeError("reset")
+
+    def hanging(cancelled: threading.Event) -> str:
+        release.wait(5.0)
+        return "too late"
+
+    record = lambda latency, censored: samples.append((latency, censored))  # noqa: E731
+    first = run_hedged([failing, lambda c: "b"], hedge_delay_s=0.05, on_primary_latency=record)
+    assert _sampled(samples)
+    assert samples[0][1] is True and samples[0][0] >= first.elapsed_s
+
+    second = run_hedged(
+        [hanging, lambda c: "b"], hedge_delay_s=0.05, on_primary_latency=record, censor_after_s=0.2
+    )
+    assert _sampled(samples, 2)
+    latency, censored = samples[1]
+    assert censored is True and latency >= second.elapsed_s + 0.2
+    # The late answer does not add a second sample.
+    release.set()
+    time.sleep(0.1)
+    assert len(samples) == 2
+
+
+def test_failed_primary_fails_over_without_waiting_for_delay() -> None:
+    def broken(cancelled: threading.Event) -> str:
+        raise RuntimeError("boom")
+
+    start = time.monotonic()
+    outcome = run_hedged([broken, lambda cancelled: "ok"], hedge_delay_s=5.0)
+
+    assert outcome.value == "ok"
+    assert outcome.hedged is False
+    assert outcome.primary_latency_s is None
+    assert time.monotonic() - start < 1.0
+
+
+def test_invalid_responses_surface_last_error() -> None:
+    outcome = run_hedged([lambda cancelled: None], hedge_delay_s=None)
+
+    assert outcome.index is None
+    assert outcome.error is not None
+
+
+def test_percentile_nearest_rank() -> None:
+    assert percentile([1.0, 2.0, 3.0, 4.0, 10.0], 0.9) == 10.0
+    assert percentile([1.0, 2.0, 3.0, 4.0, 10.0], 0.5) == 3.0
+    assert percentile([], 0.9) is None
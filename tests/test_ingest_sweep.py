@@ -0,0 +1,92 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+from unal_rag.app.ingest_sweep import _pick_promoted, promote_index, release_vectorstore, sweep_grid
+from unal_rag.utils.metrics import pareto_front, path_size_bytes
+
+
+def test_pareto_front_keeps_non_dominated_configs() -> None:
+    rows = [
+        {"config": "128:0", "recall": 0.9, "index_mb": 12.0, "p50_ms": 20.0},
+        {"config": "256:48", "recall": 0.9, "index_mb": 8.0, "p50_ms": 18.0},
+        {"config": "512:0", "recall": 0.7, "index_mb": 4.0, "p50_ms": 18.0},
+        {"config": "512:48", "recall": None, "index_mb": 4.5, "p50_ms": 19.0},
+    ]
+
+    flags = pareto_front(rows, maximize=("recall",), minimize=("index_mb", "p50_ms"))
+
+    assert flags == [False, True, True, False]
+
+
+def test_path_size_bytes_sums_directory(tmp_path: Path) -> None:
+    index = tmp_path / "index"
+    (index / "seg").mkdir(parents=True)
+    (index / "chroma.sqlite3").write_bytes(b"x" * 100)
+    (index / "seg" / "data.bin").write_bytes(b"y" * 28)
+
+    assert path_size_bytes(index) == 128
+    assert path_size_bytes(index / "chroma.sqlite3") == 100
+    assert path_size_bytes(tmp_path / "missing") == 0
+
+
+def test_sweep_grid_drops_overlaps_not_smaller_than_the_chunk() -> None:
+    grid = sweep_grid([256, 128, 128, 0], [48, 0, 128, -1])
+
+    assert grid == [(128, 0), (128, 48), (256, 0), (256, 48), (256, 128)]
+    assert sweep_grid([64], [64, 100]) == []
+
+
+ROWS = [
+    {"config": "128:0", "recall": 0.9, "index_mb": 12.0, "pareto": "no"},
+    {"config": "256:48", "recall": 0.9, "index_mb": 8.0, "pareto": "yes"},
+    {"config": "512:0", "recall": 0.7, "index_mb": 4.0, "pareto": "yes"},
+]
+
+
+def test_pick_promoted_prefers_recall_then_size_on_the_front() -> None:
+    assert _pick_promoted(ROWS, "best")["config"] == "256:48"
+    assert _pick_promoted(ROWS, "128:0")["config"] == "128:0"
+    assert _pick_promoted(ROWS, "64:0") is None
+    assert _pick_promoted([], "best") is None
+    # Without recall (no labelled questions) the smallest index wins.
+    unlabelled = [{**row, "recall": None, "pareto": "no"} for row in ROWS]
+    assert _pick_promoted(unlabelled, "best")["config"] == "512:0"
+
+
+def _index(path: Path, content: str) -> Path:
+    (path / "seg").mkdir(parents=True)
+    (path / "chroma.sqlite3").write_text(content)
+    (path / "seg" / "data.bin").write_text(content)
+    return path
+
+
+def test_promote_index_swaps_in_a_copy_and_keeps_one_backup(tmp_path: Path) -> None:
+    live = tmp_path / "chroma_db"
+
+    assert promote_index(_index(tmp_path / "cs128", "v1"), live) is None
+    assert (live / "seg" / "data.bin").read_text() == "v1"
+
+    backup = promote_index(_index(tmp_path / "cs256", "v2"), live)
+    assert backup == tmp_path / "chroma_db.bak"
+    assert (live / "chroma.sqlite3").read_text() == "v2"
+    assert (backup / "chroma.sqlite3").read_text() == "v1"
+    # Sweep outputs stay in place and a leftover staging copy is replaced.
+    assert (tmp_path / "cs256" / "chroma.sqlite3").read_text() == "v2"
+    _index(tmp_path / "chroma_db.promote", "stale")
+    promote_index(_index(tmp_path / "cs512", "v3"), live)
+    assert (live / "chroma.sqlite3").read_text() == "v3"
+    assert (tmp_path / "chroma_db.bak" / "chroma.sqlite3").read_text() == "v2"
+    assert not (tmp_path / "chroma_db.promote").exists()
+
+
+def test_release_vectorstore_persists_and_stops_the_client() -> None:
+    calls = []
+    vectorstore = SimpleNamespace(
+        persist=lambda: calls.append("persist"),
+        _client=SimpleNamespace(_system=SimpleNamespace(stop=lambda: calls.append("stop"))),
+    )
+
+    release_vectorstore(vectorstore)
+    release_vectorstore(SimpleNamespace())
+
+    assert calls == ["persist", "stop"]
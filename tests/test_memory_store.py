@@ -0,0 +1,166 @@
+import json
+import sqlite3
+import threading
+
+from unal_rag.memory import (
+    DEFAULT_USER_ID,
+    CachedMemoryStore,
+    SqliteMemoryStore,
+    apply_changes,
+    profile_changes,
+)
+
+
+def test_profiles_are_isolated_per_user_and_versioned(tmp_path) -> None:
+    store = SqliteMemoryStore(tmp_path / "memory.sqlite3", legacy_path=None)
+
+    assert store.load_versioned("ana") == ({}, 0)
+    assert store.save("ana", {"promedio": 4.1}) == 1
+    assert store.save("ana", {"promedio": 4.3}) == 2
+    store.save("luis", {"semestres": 3})
+
+    assert store.load_versioned("ana") == ({"promedio": 4.3}, 2)
+    assert store.load("luis") == {"semestres": 3}
+    store.delete("luis")
+    assert store.load("luis") == {}
+
+    mode = sqlite3.connect(tmp_path / "memory.sqlite3").execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+
+def test_legacy_json_is_migrated_to_the_default_user(tmp_path) -> None:
+    legacy = tmp_path / "memory.json"
+    legacy.write_text(json.dumps({"glossary": {"PAPA": "Promedio"}, "promedio": 3.9}), encoding="utf-8")
+
+    store = SqliteMemoryStore(tmp_path / "memory.sqlite3", legacy_path=legacy)
+
+    assert store.load(DEFAULT_USER_ID)["promedio"] == 3.9
+    assert not legacy.exists()
+    assert (tmp_path / "memory.json.migrated").exists()
+    assert store.load("someone-else") == {}
+
+
+def test_concurrent_upserts_from_threads_do_not_clobber_other_users(tmp_path) -> None:
+    store = SqliteMemoryStore(tmp_path / "memory.sqlite3", legacy_path=None)
+
+    def worker(user: str) -> None:
+        for value in range(20):
+            store.save(user, {"n": value})
+
+    threads = [threading.Thread(target=worker, args=(f"user-{idx}",)) for idx in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for idx in range(4):
+        assert store.load_versioned(f"user-{idx}") == ({"n": 19}, 20)
+
+
+def _cached(tmp_path, **kwargs) -> CachedMemoryStore:
+    backend = SqliteMemoryStore(tmp_path / "memory.sqlite3", legacy_path=None)
+    return CachedMemoryStore(backend, **kwargs)
+
+
+def test_cache_writes_behind_and_skips_unchanged_saves(tmp_path) -> None:
+    cache = _cached(tmp_path, flush_interval_s=60)
+
+    assert cache.save("ana", {"promedio": 4.1}) is True
+    assert cache.load("ana") == {"promedio": 4.1}
+    assert cache.backend.load_versioned("ana") == ({}, 0)
+    assert cache.dirty_users() == ["ana"]
+
+    cache.close()
+    assert cache.backend.load_versioned("ana") == ({"promedio": 4.1}, 1)
+    assert cache.save("ana", {"promedio": 4.1}) is False
+    cache.flush()
+    assert cache.backend.version("ana") == 1
+
+
+def test_cache_revalidates_stale_entries_by_version(tmp_path) -> None:
+    now = [0.0]
+    cache = _cached(tmp_path, flush_interval_s=0, max_staleness_s=1.0, clock=lambda: now[0])
+    other = SqliteMemoryStore(tmp_path / "memory.sqlite3", legacy_path=None)
+    cache.save("ana", {"promedio": 4.1})
+
+    other.save("ana", {"promedio": 4.5})
+    assert cache.load("ana") == {"promedio": 4.1}
+
+    now[0] = 2.0
+    assert cache.load("ana") == {"promedio": 4.5}
+    now[0] = 4.0
+    assert cache.load("ana") == {"promedio": 4.5}
+    assert cache.stats["revalidations"] == 1
+
+
+def test_flush_conflict_reapplies_pending_changes_on_the_newer_row(tmp_path) -> None:
+    cache = _cached(tmp_path, flush_interval_s=60)
+    other = SqliteMemoryStore(tmp_path / "memory.sqlite3", legacy_path=None)
+    cache.load("ana")
+    cache.save("ana", {"glossary": {"PAPA": "Promedio"}, "semestres": 3})
+
+    other.save("ana", {"glossary": {"SIA": "Sistema de Informacion Academica"}, "promedio": 4.0})
+    cache.close()
+
+    payload, version = other.load_versioned("ana")
+    assert version == 2
+    assert payload == {
+        "glossary": {"SIA": "Sistema de Informacion Academica", "PAPA": "Promedio"},
+        "promedio": 4.0,
+        "semestres": 3,
+    }
+    assert cache.stats["conflicts"] == 1
+
+
+def test_cache_evicts_least_recently_used_clean_profiles(tmp_path) -> None:
+    cache = _cached(tmp_path, flush_interval_s=60, max_entries=2)
+    cache.save("ana", {"promedio": 4.1})
+    cache.load("beto")
+    cache.load("carla")
+    cache.load("dario")
+
+    # "ana" is dirty and stays; the clean least recently used entries make room.
+    assert list(cache._entries) == ["ana", "dario"]
+    assert cache.stats["evictions"] == 2
+    cache.close()
+    assert cache.backend.load_versioned("ana") == ({"promedio": 4.1}, 1)
+
+    cache.load("beto")
+    assert "ana" not in cache._entries
+    assert cache.load("ana") == {"promedio": 4.1}
+
+
+def test_slow_profile_io_does_not_block_other_users(tmp_path) -> None:
+    class SlowBackend(SqliteMemoryStore):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self.entered = threading.Event()
+            self.release = threading.Event()
+
+        def load_versioned(self, user_id="default"):
+            if user_id == "lento":
+                self.entered.set()
+                self.release.wait(5)
+            return super().load_versioned(user_id)
+
+    cache = CachedMemoryStore(SlowBackend(tmp_path / "memory.sqlite3", legacy_path=None), flush_interval_s=60)
+    slow = threading.Thread(target=cache.load, args=("lento",))
+    slow.start()
+    assert cache.backend.entered.wait(5)
+    try:
+        assert cache.save("ana", {"promedio": 4.1}) is True
+        cache.flush()
+        assert cache.load("ana") == {"promedio": 4.1}
+        assert cache.backend.load_versioned("ana") == ({"promedio": 4.1}, 1)
+    finally:
+        cache.backend.release.set()
+        slow.join()
+
+
+def test_profile_changes_diffs_nested_dicts() -> None:
+    old = {"glossary": {"PAPA": "Promedio"}, "promedio": 4.0}
+    new = {"glossary": {"PAPA": "Promedio", "SIA": "Sistema"}, "promedio": 4.0}
+
+    assert profile_changes(old, new) == {"glossary": {"SIA": "Sistema"}}
+    assert profile_changes(new, new) == {}
+    assert apply_changes(old, profile_changes(old, new)) == new
@@ -0,0 +1,151 @@
+import json
+import os
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+from unal_rag.app.serve import MAX_BODY_BYTES, _WorkerServer, content_length_error, handle_ask
+from unal_rag.utils.prefork import PreforkSupervisor
+from unal_rag.utils.resources import process_memory
+
+
+def _wait_for(condition, timeout_s: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_supervisor_preloads_once_and_restarts_crashed_workers(tmp_path) -> None:
+    preloaded = []
+
+    def target(slot: int) -> None:
+        runs = tmp_path / f"slot-{slot}"
+        count = len(runs.read_text()) if runs.exists() else 0
+        runs.write_text("x" * (count + 1))
+        if slot == 0 and count == 0:
+            raise RuntimeError("boom")
+        time.sleep(30)
+
+    supervisor = PreforkSupervisor(
+        target, 2, preload=lambda: preloaded.append(os.getpid()), backoff_s=0, graceful_timeout_s=2
+    )
+    runner = threading.Thread(target=supervisor.run)
+    runner.start()
+    try:
+        assert _wait_for(lambda: (tmp_path / "slot-0").exists() and len((tmp_path / "slot-0").read_text()) == 2)
+        assert _wait_for(lambda: len(supervisor.pids()) == 2)
+    finally:
+        supervisor.stop()
+        runner.join(10)
+
+    assert preloaded == [os.getpid()]
+    assert (tmp_path / "slot-1").read_text() == "x"
+    assert supervisor.stats == {"spawned": 3, "restarts": 1, "crashes": 1}
+    assert supervisor.pids() == []
+    assert supervisor.exit_code == 0
+
+
+def test_supervisor_stops_a_crash_looping_pool() -> None:
+    def target(slot: int) -> None:
+        raise SystemExit(3)
+
+    supervisor = PreforkSupervisor(target, 1, backoff_s=0, max_restarts=2, graceful_timeout_s=2)
+    result = {}
+    runner = threading.Thread(target=lambda: result.setdefault("code", supervisor.run()))
+    runner.start()
+    runner.join(10)
+
+    assert result["code"] == 1
+    assert supervisor.stats["crashes"] == 2
+    assert supervisor.pids() == []
+
+
+def test_handle_ask_validates_and_maps_the_result() -> None:
+    calls = []
+
+    def ask(question, *, thread_id, user_id, max_iterations, deadline_s, on_draft):
+        calls.append((question, thread_id, user_id, max_iterations, deadline_s))
+        if question == "falla":
+            raise RuntimeError("llm down")
+        return SimpleNamespace(
+            thread_id=thread_id,
+            answer="respuesta",
+            sources=("doc.pdf",),
+            evaluation_skipped=False,
+            coalesced=True,
+            verdict="grounded",
+            draft_replaced=False,
+            elapsed_s=1.23456,
+        )
+
+    session = SimpleNamespace(ask=ask)
+
+    assert handle_ask(session, ["no"])[0] == 400
+    assert handle_ask(session, {"question": "  "})[0] == 400
+    assert handle_ask(session, {"question": "hola", "deadline_s": "pronto"})[0] == 400
+    assert calls == []
+
+    status, body = handle_ask(session, {"question": "hola", "thread_id": "t1", "deadline_s": "5"}, worker=2)
+    assert status == 200
+    assert body == {
+        "thread_id": "t1",
+        "answer": "respuesta",
+        "sources": ["doc.pdf"],
+        "evaluation_skipped": False,
+        "coalesced": True,
+        "verdict": "grounded",
+        "draft_replaced": False,
+        "elapsed_s": 1.235,
+        "worker": 2,
+    }
+    assert calls[-1] == ("hola", "t1", None, None, 5.0)
+
+    status, body = handle_ask(session, {"question": "falla"})
+    assert status == 500 and body["error"] == "Internal server error."
+    assert "llm down" not in json.dumps(body)
+    assert body["thread_id"].startswith("serve-")
+
+
+def test_content_length_must_be_plain_digits_within_the_limit() -> None:
+    assert content_length_error("17") is None
+    assert content_length_error(" 0 ") is None
+    assert content_length_error(None)[0] == 411
+    assert content_length_error("")[0] == 411
+    for value in ("-1", "abc", "+5", "1_0", "1.5", "\u0661"):
+        assert content_length_error(value)[0] == 400, value
+    assert content_length_error(str(MAX_BODY_BYTES + 1))[0] == 413
+
+
+def _post(port: int, headers: str, body: bytes = b"") -> str:
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as client:
+        client.sendall(f"POST /ask HTTP/1.1\r\nHost: x\r\n{headers}\r\n".encode("ascii") + body)
+        # Nothing more is sent, but the connection stays open: a read(-1) would block here.
+        return client.recv(4096).decode("utf-8").split("\r\n", 1)[0]
+
+
+def test_server_rejects_bad_content_length_without_reading_the_body() -> None:
+    listener = socket.create_server(("127.0.0.1", 0))
+    session = SimpleNamespace(ask=lambda *args, **kwargs: None)
+    server = _WorkerServer(listener, session, slot=0)
+    port = listener.getsockname()[1]
+    try:
+        for headers, status in (("Content-Length: -1\r\n", "400"), ("Content-Length: x\r\n", "400"), ("", "411")):
+            runner = threading.Thread(target=server.handle_request)
+            runner.start()
+            assert _post(port, headers, b"{}").split(" ")[1] == status
+            runner.join(5)
+            assert not runner.is_alive()
+    finally:
+        server.server_close()
+
+
+def test_process_memory_reports_pss_on_linux() -> None:
+    memory = process_memory()
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        assert memory == {}
+        return
+    assert memory["rss_kb"] >= memory["pss_kb"] > 0
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from unal_rag.app import ingest
+from unal_rag.config.settings import load_settings
+from unal_rag.utils.profiling import Profiler, profile_mode_from_env
+
+
+def _busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+def test_sampling_profiler_attributes_samples_to_sections(tmp_path) -> None:
+    profiler = Profiler(interval_s=0.001)
+    with profiler:
+        profiler.wrap("retriever", _busy)(0.05)
+        with profiler.section("evaluator"):
+            _busy(0.02)
+
+    rows = {row["section"]: row for row in profiler.breakdown()}
+    assert set(rows) == {"retriever", "evaluator"}
+    assert rows["retriever"]["calls"] == 1
+    assert rows["retriever"]["wall_ms"] >= 50
+    assert rows["retriever"]["samples"] > 0
+    assert "_busy" in rows["retriever"]["top"]
+
+    written = profiler.write(tmp_path / "ask")
+    assert [path.suffix for path in written] == [".folded", ".json"]
+    lines = written[0].read_text(encoding="utf-8").splitlines()
+    assert any(line.startswith("retriever;") for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+
+
+def test_cprofile_mode_writes_pstats(tmp_path) -> None:
+    profiler = Profiler("cprofile")
+    with profiler:
+        profiler.wrap("generator", _busy)(0.01)
+
+    written = profiler.write(tmp_path / "run")
+    assert written[0].suffix == ".pstats" and written[0].stat().st_size > 0
+    assert profiler.breakdown()[0]["section"] == "generator"
+
+
+def test_profile_mode_from_env() -> None:
+    assert profile_mode_from_env("") is None
+    assert profile_mode_from_env("0") is None
+    assert profile_mode_from_env("1") == "sampling"
+    assert profile_mode_from_env("cprofile") == "cprofile"
+    assert profile_mode_from_env("bogus") is None
+
+
+def test_ingest_stops_the_profiler_when_loading_fails(monkeypatch, tmp_path) -> None:
+    def _fail(*args, **kwargs):
+        raise RuntimeError("corrupt pdf")
+
+    monkeypatch.setattr(ingest, "pipeline_import_error", lambda: None)
+    monkeypatch.setattr(ingest, "load_corpus", _fail)
+
+    with pytest.raises(RuntimeError):
+        ingest.run_ingest(
+            load_settings(),
+            docs_path=str(tmp_path),
+            vectorstore_path=str(tmp_path / "db"),
+            chunk_size=256,
+            chunk_overlap=0,
+            profile="sampling",
+        )
+    assert not any(thread.name == "unal-rag-profiler" for thread in threading.enumerate())
@@ -0,0 +1,87 @@
+import pytest
+
+from src.llm_runtime import get_scheduler, set_rate_limit_share
+from unal_rag.llm.rate_limit import ProviderScheduler, QueueTimeoutError
+from unal_rag.utils.errors import retry_after_seconds
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def _scheduler(clock: FakeClock, **kwargs) -> ProviderScheduler:
+    params = {"requests_per_minute": 60, "tokens_per_minute": 6000, "max_queue_wait_s": 10.0}
+    params.update(kwargs)
+    return ProviderScheduler("groq", clock=clock, sleep=clock.sleep, **params)
+
+
+def test_requests_beyond_burst_wait_for_refill() -> None:
+    clock = FakeClock()
+    scheduler = _scheduler(clock, requests_per_minute=2, max_queue_wait_s=60.0)
+    stats: dict = {}
+
+    for _ in range(3):
+        scheduler.run(lambda: "ok", stats=stats)
+
+    assert clock.now == pytest.approx(30.0)
+    assert stats["wait_s"] == pytest.approx(30.0)
+
+
+def test_throttled_call_backs_off_and_retries() -> None:
+    clock = FakeClock()
+    scheduler = _scheduler(clock)
+    calls = []
+
+    def flaky() -> str:
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise RateLimited("Rate limit reached. Please try again in 2.5s.")
+        return "ok"
+
+    stats: dict = {}
+    assert scheduler.run(flaky, stats=stats) == "ok"
+    assert calls[1] - calls[0] >= 2.5
+    assert stats["attempts"] == 2
+    assert stats["throttled"] == 1
+
+
+def test_queue_deadline_raises() -> None:
+    clock = FakeClock()
+    scheduler = _scheduler(clock, requests_per_minute=1, max_queue_wait_s=5.0)
+    scheduler.run(lambda: "ok")
+
+    with pytest.raises(QueueTimeoutError):
+        scheduler.run(lambda: "ok")
+
+
+def test_retry_after_seconds_parses_provider_hints() -> None:
+    assert retry_after_seconds(Exception("Please try again in 7.66s.")) == pytest.approx(7.66)
+    assert retry_after_seconds(Exception("{'retryDelay': '37s'}")) == pytest.approx(37.0)
+    assert retry_after_seconds(Exception("try again in 250ms")) == pytest.approx(0.25)
+    assert retry_after_seconds(Exception("Please try again in 2m59.56s. Visit")) == pytest.approx(179.56)
+    assert retry_after_seconds(Exception("Please try again in 1h2m3s")) == pytest.approx(3723.0)
+    assert retry_after_seconds(Exception("Please try again in 12m0s")) == pytest.approx(720.0)
+    assert retry_after_seconds(Exception("connection reset")) is None
+
+
+def test_rate_limit_share_scales_new_schedulers() -> None:
+    try:
+        set_rate_limit_share(0.25)
+        quarter = get_scheduler("groq")._requests.capacity
+        set_rate_limit_share(1.0)
+        full = get_scheduler("groq")._requests.capacity
+    finally:
+        set_rate_limit_share(1.0)
+
+    assert quarter == max(1, int(full * 0.25))
@@ -0,0 +1,92 @@
+import random
+from dataclasses import asdict, dataclass
+
+import pytest
+
+from unal_rag.llm.hedging import percentile
+from unal_rag.llm.replay import (
+    FixtureStore,
+    LatencySampler,
+    RecordingChatModel,
+    ReplayChatModel,
+    ReplayMissError,
+    fixture_key,
+)
+from unal_rag.utils.metrics import latency_summary
+
+
+@dataclass
+class KSelection:
+    k_value: int
+
+    def model_dump(self, mode: str = "python") -> dict:
+        return asdict(self)
+
+    @classmethod
+    def model_validate(cls, payload: dict) -> "KSelection":
+        return cls(**payload)
+
+
+class FakeLiveModel:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def with_structured_output(self, schema):
+        model = self
+
+        class _Structured:
+            def invoke(self, prompt):
+                model.calls += 1
+                return schema(k_value=len(prompt) % 7 + 2)
+
+        return _Structured()
+
+
+def test_recorded_structured_response_replays_without_provider(tmp_path) -> None:
+    store = FixtureStore(tmp_path / "fixtures.json")
+    live = FakeLiveModel()
+    recorded = RecordingChatModel(live, "k_selector", store).with_structured_output(KSelection).invoke(
+        "Pregunta:   cancelar asignaturas"
+    )
+
+    slept = []
+    replay = ReplayChatModel(
+        "k_selector",
+        FixtureStore(tmp_path / "fixtures.json"),
+        latency=LatencySampler(0.2, 0.5, rng=random.Random(1)),
+        sleep=slept.append,
+    )
+    # Whitespace differences do not change the key.
+    replayed = replay.with_structured_output(KSelection).invoke("Pregunta: cancelar asignaturas")
+
+    assert replayed == recorded
+    assert live.calls == 1
+    assert len(slept) == 1 and slept[0] > 0
+
+
+def test_replay_miss_raises_and_is_counted(tmp_path) -> None:
+    store = FixtureStore(tmp_path / "fixtures.json")
+    model = ReplayChatModel("router", store)
+
+    with pytest.raises(ReplayMissError):
+        model.with_structured_output(KSelection).invoke("sin grabar")
+    assert store.stats()["misses"] == 1
+    assert fixture_key("router", "a") != fixture_key("k_selector", "a")
+
+
+def test_latency_sampler_matches_configured_percentiles() -> None:
+    sampler = LatencySampler(1.0, 3.0, rng=random.Random(7))
+    samples = [sampler.sample() for _ in range(4000)]
+
+    assert percentile(samples, 0.5) == pytest.approx(1.0, rel=0.1)
+    assert percentile(samples, 0.95) == pytest.approx(3.0, rel=0.15)
+    assert LatencySampler(1.0, 3.0, scale=0).sample() == 0.0
+
+
+def test_latency_summary_reports_milliseconds() -> None:
+    summary = latency_summary([0.01 * step for step in range(1, 101)])
+
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == 500.0
+    assert summary["p99_ms"] == 990.0
+    assert latency_summary([])["p95_ms"] is None
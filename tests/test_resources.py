@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+from unal_rag.utils.resources import MemoryTracker, checkpoint_sizes, memory_summary, module_parameter_bytes
+
+
+def test_memory_tracker_records_python_allocations_per_node() -> None:
+    with MemoryTracker() as tracker:
+        kept = tracker.wrap("retriever", lambda: [bytearray(1024) for _ in range(200)])()
+        tracker.wrap("evaluator", lambda: None)()
+
+    assert [record["node"] for record in tracker.records] == ["retriever", "evaluator"]
+    retriever = tracker.records[0]
+    assert retriever["py_delta_kb"] >= 200
+    assert retriever["py_peak_kb"] >= retriever["py_delta_kb"]
+    assert len(kept) == 200
+
+
+class _Serde:
+    def dumps_typed(self, value):
+        return "json", repr(value).encode("utf-8")
+
+
+def _snapshot(step, source, values, next_nodes=()):
+    return SimpleNamespace(metadata={"step": step, "source": source}, values=values, next=next_nodes)
+
+
+def test_checkpoint_sizes_stops_at_the_last_input_checkpoint() -> None:
+    history = [
+        _snapshot(2, "loop", {"question": "q", "generation": "x" * 50}),
+        _snapshot(1, "loop", {"question": "q"}, ("retriever",)),
+        _snapshot(-1, "input", {}, ("__start__",)),
+        _snapshot(5, "loop", {"question": "previous run"}),
+    ]
+    graph = SimpleNamespace(checkpointer=SimpleNamespace(serde=_Serde()), get_state_history=lambda _: iter(history))
+
+    rows = checkpoint_sizes(graph, {"configurable": {"thread_id": "t"}})
+
+    assert [row["step"] for row in rows] == [-1, 1, 2]
+    assert rows[1]["next"] == ["retriever"]
+    assert rows[2]["bytes"] > rows[1]["bytes"]
+    assert checkpoint_sizes(SimpleNamespace(checkpointer=None), {}) == []
+
+
+def test_module_parameter_bytes() -> None:
+    tensor = SimpleNamespace(numel=lambda: 10, element_size=lambda: 4)
+    model = SimpleNamespace(parameters=lambda: [tensor, tensor], buffers=lambda: [tensor])
+
+    assert module_parameter_bytes(model) == 120
+    assert module_parameter_bytes(None) is None
+
+
+def test_checkpoint_sizes_reports_the_wrapped_serde_size() -> None:
+    class _Slim(_Serde):
+        inner = SimpleNamespace(dumps_typed=lambda value: ("json", b"x" * 1000))
+
+    history = [_snapshot(-1, "input", {"question": "q"})]
+    graph = SimpleNamespace(checkpointer=SimpleNamespace(serde=_Slim()), get_state_history=lambda _: iter(history))
+
+    (row,) = checkpoint_sizes(graph, {})
+
+    assert row["full_bytes"] == 1000
+    assert row["bytes"] < row["full_bytes"]
+
+
+def test_memory_summary_without_a_tracker_has_no_node_records() -> None:
+    summary = memory_summary(None, [{"step": 1, "bytes": 10}])
+
+    assert summary["nodes"] == []
+    assert summary["checkpoint_bytes_total"] == 10
@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from unal_rag.retrieval.evaluation import (
+    DEFAULT_FOLLOWUP_PAIRS_PATH,
+    aggregate,
+    load_followup_pairs,
+    load_labelled_questions,
+    score_ranking,
+)
+
+
+def _write_questions(tmp_path: Path) -> Path:
+    path = tmp_path / "questions.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"id": "q1", "question": "Doble titulacion", "relevant_sources": ["a.html", "b.html"]},
+                {"id": "q2", "question": "Hola", "relevant_sources": []},
+                {"id": "q3", "question": "PAPA", "relevant_doc_ids": ["abc123"]},
+            ]
+        ),
+        encoding="utf-8",
+    )
+    return path
+
+
+def test_unlabelled_questions_are_skipped(tmp_path: Path) -> None:
+    questions = load_labelled_questions(_write_questions(tmp_path))
+
+    assert [item.id for item in questions] == ["q1", "q3"]
+
+
+def test_recall_and_reciprocal_rank_are_document_level(tmp_path: Path) -> None:
+    q1, q3 = load_labelled_questions(_write_questions(tmp_path))
+    ranked = [
+        {"source": "docs/c.html"},
+        {"source": "docs/b.html"},
+        {"source": "docs\\b.html"},
+        {"source": "docs/a.html"},
+    ]
+
+    assert score_ranking(q1, ranked, 2) == (0.5, 0.5)
+    assert score_ranking(q1, ranked, 4) == (1.0, 0.5)
+    assert score_ranking(q3, [{"doc_id": "zzz"}, {"doc_id": "abc123"}], 1) == (0.0, 0.0)
+
+    summary = aggregate([(1.0, 0.5), (0.0, 0.0)], [0.010, 0.030])
+    assert summary["recall"] == 0.5
+    assert summary["mrr"] == 0.25
+    assert summary["p95_ms"] == pytest.approx(30.0)
+
+
+def test_followup_pairs_need_both_questions_and_a_boolean_label(tmp_path: Path) -> None:
+    path = tmp_path / "pairs.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"id": "p1", "previous": "Requisitos de grado", "question": "¿Y el plazo?", "followup": True},
+                {"previous": "Requisitos de grado", "question": "Horario biblioteca", "followup": False},
+                {"id": "p3", "previous": "", "question": "¿Y el plazo?", "followup": True},
+                {"id": "p4", "previous": "Requisitos de grado", "question": "Costo", "followup": "yes"},
+            ]
+        ),
+        encoding="utf-8",
+    )
+    pairs = load_followup_pairs(path)
+
+    assert [(pair.id, pair.followup) for pair in pairs] == [("p1", True), ("2", False)]
+    shipped = load_followup_pairs(Path(__file__).resolve().parents[1] / DEFAULT_FOLLOWUP_PAIRS_PATH)
+    assert {pair.followup for pair in shipped} == {True, False}
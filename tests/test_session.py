@@ -0,0 +1,257 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from unal_rag.session import (
+    PENDING_VERIFICATION,
+    RUNTIME_DIR,
+    RAGSession,
+    deadline_bucket,
+    draft_from_update,
+    initial_state,
+    normalize_question,
+    runtime,
+    verification_verdict,
+)
+from unal_rag.utils.singleflight import SingleFlight
+
+
+def test_initial_state_resets_per_request_fields() -> None:
+    state = initial_state("  pregunta ", max_iterations=-1, deadline_at=12.5)
+
+    assert state["question"] == "  pregunta "
+    assert state["max_iterations"] == 0
+    assert state["deadline_at"] == 12.5
+    assert state["user_id"] == "default"
+    # None restarts the append-only traces (see ``extend_trace`` in src/unal_rag/utils/traces.py).
+    assert state["llm_calls"] is None and state["degradations"] is None
+    assert state["evaluation_result"] == {}
+
+
+def test_runtime_imports_graph_modules_from_the_runtime_directory() -> None:
+    module = runtime("llm_config")
+
+    assert module.__name__ == "src.llm_config"
+    assert module.__file__.startswith(str(RUNTIME_DIR))
+
+
+def _session_with_fake_ask(delay_s: float):
+    session = RAGSession.__new__(RAGSession)
+    session.max_workers = 4
+    calls = []
+    lock = threading.Lock()
+
+    def ask(question, *, thread_id, user_id=None, deadline_s=None):
+        with lock:
+            calls.append(("start", thread_id, question))
+        time.sleep(delay_s)
+        with lock:
+            calls.append(("end", thread_id, question))
+        return (thread_id, question)
+
+    session.ask = ask
+    return session, calls
+
+
+def test_ask_many_keeps_order_and_serializes_each_thread() -> None:
+    session, calls = _session_with_fake_ask(0.02)
+
+    results = session.ask_many(["a1", "b1", "a2"], thread_ids=["a", "b", "a"])
+
+    assert results == [("a", "a1"), ("b", "b1"), ("a", "a2")]
+    thread_a = [event for event in calls if event[1] == "a"]
+    assert thread_a == [("start", "a", "a1"), ("end", "a", "a1"), ("start", "a", "a2"), ("end", "a", "a2")]
+    # Different threads overlap.
+    assert calls.index(("start", "b", "b1")) < calls.index(("end", "a", "a1"))
+
+
+def test_ask_many_gives_each_question_its_own_thread_by_default() -> None:
+    session, _ = _session_with_fake_ask(0.0)
+
+    results = session.ask_many(["x", "y"])
+
+    assert len({thread_id for thread_id, _ in results}) == 2
+
+
+class _FakeGraph:
+    def __init__(self) -> None:
+        self.threads = {}
+        self.invocations = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, state, config):
+        with self.lock:
+            self.invocations += 1
+        time.sleep(0.1)
+        values = {**state, "generation": f"respuesta a {state['question']}", "llm_calls": [{"role": "rag"}]}
+        self.threads[config["configurable"]["thread_id"]] = values
+        return values
+
+    def get_state(self, config):
+        return SimpleNamespace(values=self.threads.get(config["configurable"]["thread_id"], {}))
+
+    def update_state(self, config, values, as_node):
+        self.threads[config["configurable"]["thread_id"]] = {**values, "llm_calls": [], "as_node": as_node}
+
+
+def _coalescing_session(graph):
+    session = RAGSession.__new__(RAGSession)
+    session.graph = graph
+    session.coalesce = True
+    session.max_iterations = 2
+    session.deadline_s = None
+    session.max_workers = 8
+    session._closed = False
+    session._compactor = None
+    session._flights = SingleFlight()
+    session._llm_runtime = SimpleNamespace(
+        deadline_at=lambda budget, now: 0.0, record_request_usage=lambda *args, **kwargs: None
+    )
+    session._memory = SimpleNamespace(
+        updates_memory=lambda question: "recuerda" in question,
+        load_profile=lambda user_id: {"promedio": 4.0} if user_id == "ana" else {},
+    )
+    return session
+
+
+def test_identical_concurrent_questions_share_one_graph_run() -> None:
+    graph = _FakeGraph()
+    session = _coalescing_session(graph)
+
+    results = session.ask_many(
+        ["¿Cómo cancelo el semestre?", "como cancelo el SEMESTRE", "Como cancelo el semestre", "otra cosa"],
+        thread_ids=["t1", "t2", "t3", "t4"],
+        user_ids=["u1", "u2", "ana", "u4"],
+    )
+
+    # t3 has another memory profile and t4 another question: three graph runs.
+    assert graph.invocations == 3
+    follower = next(result for result in results if result.coalesced)
+    assert follower.thread_id == "t2" and follower.question == "como cancelo el SEMESTRE"
+    assert follower.answer == "respuesta a ¿Cómo cancelo el semestre?"
+    assert graph.threads["t2"]["user_id"] == "u2" and graph.threads["t2"]["as_node"] == "direct_llm"
+    assert session.coalesce_stats()["followers"] == 1
+
+
+def test_memory_updates_and_threads_with_history_are_not_coalesced() -> None:
+    graph = _FakeGraph()
+    graph.threads["t2"] = {"last_turn": {"intent": "busqueda"}}
+    session = _coalescing_session(graph)
+
+    assert session._coalesce_key("recuerda que mi papa es 4.1", "t1", "u1", 2, None) is None
+    assert session._coalesce_key("que es la papa", "t2", "u1", 2, None) is None
+    same = session._coalesce_key("¿Qué es la PAPA?", "t1", "u1", 2, None)
+    assert same == session._coalesce_key("que es la papa", "t3", "u9", 2, None)
+    assert normalize_question("  ¿Qué   es la PAPA? ") == "que es la papa"
+
+
+def test_coalescing_requires_a_similar_deadline() -> None:
+    session = _coalescing_session(_FakeGraph())
+
+    def key(budget_s):
+        return session._coalesce_key("que es la papa", "t1", "u1", 2, budget_s)
+
+    assert key(20.0) == key(30.0)
+    assert key(3.0) != key(30.0)
+    assert key(None) != key(30.0)
+    assert [deadline_bucket(budget) for budget in (None, 0.0, 0.5, 1.0, 3.0, 4.0, 30.0)] == [
+        None,
+        None,
+        0,
+        0,
+        2,
+        2,
+        5,
+    ]
+
+
+def test_followers_run_alone_when_their_deadline_passes() -> None:
+    graph = _FakeGraph()
+    session = _coalescing_session(graph)
+    session._llm_runtime = SimpleNamespace(
+        deadline_at=lambda budget, now: now + budget if budget else 0.0,
+        record_request_usage=lambda *args, **kwargs: None,
+    )
+
+    results = session.ask_many(["que es la papa", "Que es la PAPA"], thread_ids=["t1", "t2"], deadline_s=0.03)
+
+    assert graph.invocations == 2
+    assert not any(result.coalesced for result in results)
+    assert session.coalesce_stats()["expired"] == 1
+
+
+def test_draft_only_for_cited_generations() -> None:
+    cited = {
+        "generation": "Respuesta [Acuerdo 008]",
+        "sources": ["acuerdo.pdf"],
+        "grounded_claims": [{"claim": "Se cancela antes de la semana 8 [DOC 1]", "support_doc_ids": [1]}],
+    }
+
+    draft = draft_from_update(cited, thread_id="t1", elapsed_s=1.5)
+    assert draft.status == PENDING_VERIFICATION
+    assert draft.claims == ("Se cancela antes de la semana 8 [DOC 1]",)
+    assert draft.to_dict()["sources"] == ["acuerdo.pdf"]
+    # Insufficient evidence keeps the parsed claims but drops the sources.
+    assert draft_from_update({**cited, "sources": []}, thread_id="t1", elapsed_s=0) is None
+    assert draft_from_update({**cited, "grounded_claims": []}, thread_id="t1", elapsed_s=0) is None
+    assert draft_from_update({**cited, "llm_failure": True}, thread_id="t1", elapsed_s=0) is None
+
+
+def test_verification_verdict() -> None:
+    assert verification_verdict({"evaluation_result": {}, "is_grounded": True}) is None
+    assert verification_verdict({"evaluation_result": {"is_grounded": True}, "is_grounded": True}) == "grounded"
+    assert verification_verdict({"evaluation_result": {"is_grounded": False}, "is_grounded": False}) == "not_grounded"
+    skipped = {"evaluation_result": {"is_grounded": None, "skipped": True}, "evaluation_skipped": True}
+    assert verification_verdict(skipped) == "unverified"
+
+
+class _StreamingGraph(_FakeGraph):
+    def __init__(self, grounded: bool) -> None:
+        super().__init__()
+        self.grounded = grounded
+        self.events = []
+
+    def stream(self, state, config, stream_mode):
+        assert stream_mode == "updates"
+        draft = {
+            "generation": "borrador citado",
+            "sources": ["acuerdo.pdf"],
+            "grounded_claims": [{"claim": "afirmacion", "support_doc_ids": [1]}],
+        }
+        yield {"retriever": {"documents": []}}
+        yield {"rag_generator": draft}
+        self.events.append("evaluated")
+        verdict = {"is_grounded": self.grounded, "evaluation_result": {"is_grounded": self.grounded}}
+        if not self.grounded:
+            verdict["generation"] = "evidencia insuficiente"
+        yield {"evaluator": verdict}
+        self.threads[config["configurable"]["thread_id"]] = {**state, **draft, **verdict}
+
+
+def test_two_phase_ask_delivers_the_draft_before_the_verdict() -> None:
+    graph = _StreamingGraph(grounded=False)
+    session = _coalescing_session(graph)
+    drafts = []
+
+    def on_draft(draft) -> None:
+        graph.events.append("draft")
+        drafts.append(draft)
+
+    result = session.ask("¿Cómo cancelo?", thread_id="t1", on_draft=on_draft)
+
+    assert graph.events == ["draft", "evaluated"]
+    assert drafts[0].answer == "borrador citado" and result.draft == drafts[0]
+    assert result.answer == "evidencia insuficiente"
+    assert result.verdict == "not_grounded" and result.draft_replaced is True
+    assert session.coalesce_stats()["leaders"] == 0
+
+
+def test_two_phase_ask_survives_a_failing_draft_callback() -> None:
+    session = _coalescing_session(_StreamingGraph(grounded=True))
+
+    def on_draft(draft) -> None:
+        raise BrokenPipeError("client went away")
+
+    result = session.ask("pregunta", thread_id="t1", on_draft=on_draft)
+
+    assert result.verdict == "grounded" and result.draft_replaced is False
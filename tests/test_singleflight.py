@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from unal_rag.utils.singleflight import SingleFlight
+
+
+def _run_concurrently(flight, keys, fn):
+    results = [None] * len(keys)
+    barrier = threading.Barrier(len(keys))
+
+    def worker(index):
+        barrier.wait()
+        try:
+            results[index] = flight.do(keys[index], fn)
+        except Exception as exc:
+            results[index] = exc
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(len(keys))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_callers_with_the_same_key_share_one_call() -> None:
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    results = _run_concurrently(flight, ["q"] * 5 + ["other"], slow)
+
+    assert len(calls) == 2
+    assert [value for value, _ in results] == ["answer"] * 6
+    assert sum(shared for _, shared in results) == 4
+    assert flight.stats == {"leaders": 2, "followers": 4, "expired": 0}
+    assert flight.in_flight() == 0
+
+
+def test_followers_get_the_leader_error_and_the_key_is_released() -> None:
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.05)
+        raise RuntimeError("provider down")
+
+    results = _run_concurrently(flight, ["q", "q"], failing)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.do("q", lambda: "retry") == ("retry", False)
+    with pytest.raises(ValueError):
+        flight.do("q", lambda: (_ for _ in ()).throw(ValueError("x")))
+
+
+def test_followers_stop_waiting_at_their_timeout_and_run_alone() -> None:
+    flight = SingleFlight()
+    release = threading.Event()
+    leader_result = []
+    leader = threading.Thread(target=lambda: leader_result.append(flight.do("q", lambda: release.wait(5) and "leader")))
+    leader.start()
+    while not flight.in_flight():
+        time.sleep(0.001)
+
+    started = time.monotonic()
+    assert flight.do("q", lambda: "alone", timeout=0.05) == ("alone", False)
+    assert time.monotonic() - started < 1.0
+    release.set()
+    leader.join()
+
+    assert leader_result == [("leader", False)]
+    assert flight.stats == {"leaders": 1, "followers": 1, "expired": 1}
@@ -0,0 +1,48 @@
+from unal_rag.session import initial_state
+from unal_rag.utils.traces import extend_trace
+
+
+# Annotated with ``extend_trace`` in src/state.py.
+TRACE_FIELDS = ("llm_calls", "degradations", "iteration_history")
+
+
+def _apply(state: dict, update: dict) -> dict:
+    """Fold one node update into the state the way the graph does."""
+    merged = dict(state)
+    for key, value in update.items():
+        merged[key] = extend_trace(state.get(key), value) if key in TRACE_FIELDS else value
+    return merged
+
+
+def _history(iteration: int, decision: str) -> list:
+    return [{"iteration": iteration, "k_value": 4 + 2 * iteration, "decision": decision}]
+
+
+def test_updates_append_and_none_starts_a_new_trace() -> None:
+    assert extend_trace(None, [1]) == [1]
+    assert extend_trace([1], []) == [1]
+    assert extend_trace([1, 2], [3, 4]) == [1, 2, 3, 4]
+    assert extend_trace([1, 2], None) == []
+    assert extend_trace(None, None) == []
+
+    current = [1]
+    assert extend_trace(current, [2]) == [1, 2] and current == [1]
+
+
+def test_retry_loop_appends_iteration_history_and_requests_reset_traces() -> None:
+    previous = {"llm_calls": [{"role": "router"}], "degradations": ["llm_unavailable"], "iteration_history": []}
+    state = _apply(previous, initial_state("¿Plazo de cancelacion?", max_iterations=2))
+
+    assert state["llm_calls"] == [] and state["degradations"] == []
+
+    # Evaluator rejects the first answer, the retriever retries with a larger k, then it accepts.
+    for update in (
+        {"llm_calls": [{"role": "generator"}], "iteration_history": _history(0, "retry"), "iteration_count": 1},
+        {"llm_calls": [{"role": "generator"}], "iteration_history": _history(1, "accept")},
+    ):
+        state = _apply(state, update)
+
+    assert [entry["decision"] for entry in state["iteration_history"]] == ["retry", "accept"]
+    assert [entry["k_value"] for entry in state["iteration_history"]] == [4, 6]
+    assert state["llm_calls"] == [{"role": "generator"}, {"role": "generator"}]
+    assert state["iteration_count"] == 1
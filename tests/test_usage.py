@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from pathlib import Path
+
+from unal_rag.llm.usage import (
+    UsageStore,
+    aggregate_usage,
+    call_cost,
+    request_records,
+    usage_totals,
+)
+
+
+def _call(role: str, input_tokens: int, output_tokens: int, *, iteration: int = 0, cost: float = 0.0) -> dict:
+    return {
+        "role": role,
+        "model": "m",
+        "iteration": iteration,
+        "outcome": "ok",
+        "latency_s": 0.5,
+        "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens, "source": "provider"},
+        "cost_usd": cost,
+    }
+
+
+LLM_CALLS = [
+    _call("router", 100, 5),
+    {"role": "k_selector", "outcome": "circuit_open"},
+    {
+        **_call("rag_generation", 900, 200),
+        "hedge": {
+            "calls": [_call("rag_generation", 900, 200), _call("rag_generation_fallback", 900, 180)],
+        },
+    },
+    _call("grounding_evaluator", 700, 60, iteration=1),
+]
+
+
+def test_request_totals_count_every_hedged_candidate_and_skip_unattempted_calls() -> None:
+    totals = usage_totals(LLM_CALLS)
+
+    assert totals["total"]["calls"] == 4
+    assert totals["total"]["input_tokens"] == 2600
+    assert set(totals["by_role"]) == {
+        "router",
+        "rag_generation",
+        "rag_generation_fallback",
+        "grounding_evaluator",
+    }
+    assert call_cost({"input_tokens": 1_000_000, "output_tokens": 2_000_000}, 0.3, 2.5) == 5.3
+
+
+def test_usage_store_aggregates_by_day_role_and_intent(tmp_path: Path) -> None:
+    store = UsageStore(tmp_path / "usage.jsonl")
+    now = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+    store.append(request_records(LLM_CALLS, intent="busqueda", now=now))
+    store.append(request_records(LLM_CALLS[:1], intent="general", now=now))
+
+    records = store.read()
+    rows = aggregate_usage(records, by=("role", "intent"))
+    evaluator = next(row for row in rows if row["role"] == "grounding_evaluator")
+
+    assert len(records) == 5
+    assert evaluator["retry_tokens"] == 760
+    assert [row["calls"] for row in rows if row["role"] == "router"] == [1, 1]
+    assert aggregate_usage(records, by=("day",))[0]["day"] == "2026-03-01"
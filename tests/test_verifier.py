@@ -0,0 +1,117 @@
+from unal_rag.app.doctor import describe_precheck
+from unal_rag.retrieval.verifier import (
+    ACCEPT,
+    ESCALATE,
+    cited_doc_ids,
+    precheck_grounding,
+    sentence_supported,
+    update_precheck_stats,
+)
+
+
+SUPPORT = {
+    1: "Articulo 12. El estudiante podra cancelar asignaturas hasta la semana 8 del periodo academico.",
+    2: "La matricula extemporanea tiene un recargo del 20% sobre el valor ordinario.",
+}
+
+
+def test_supported_claims_are_accepted_locally() -> None:
+    claims = [
+        {"claim": "El estudiante puede cancelar asignaturas hasta la semana 8 [DOC 1].", "support_doc_ids": [1]},
+        {"claim": "La matricula extemporanea tiene un recargo del 20% [DOC 2].", "support_doc_ids": [2]},
+    ]
+
+    result = precheck_grounding(claims, SUPPORT, accept_threshold=0.7)
+
+    assert result.decision == ACCEPT
+    assert result.min_score >= 0.7
+
+
+def test_wrong_number_escalates_even_with_lexical_overlap() -> None:
+    claims = [{"claim": "Se pueden cancelar asignaturas hasta la semana 15.", "support_doc_ids": [1]}]
+
+    result = precheck_grounding(claims, SUPPORT, accept_threshold=0.5)
+
+    assert result.decision == ESCALATE
+    assert not result.claims[0].numbers_supported
+
+
+def test_missing_citation_or_embedding_failure_is_handled() -> None:
+    uncited = [{"claim": "Hay becas para todos.", "support_doc_ids": [7]}]
+    assert precheck_grounding(uncited, SUPPORT, accept_threshold=0.5).decision == ESCALATE
+
+    def broken_embed(texts):
+        raise RuntimeError("model not available")
+
+    claims = [{"claim": "Recargo del 20% para la matricula extemporanea.", "support_doc_ids": [2]}]
+    result = precheck_grounding(claims, SUPPORT, accept_threshold=0.6, embed=broken_embed)
+    assert result.claims[0].semantic is None
+    assert result.decision == ACCEPT
+
+
+CLAIMS = [
+    {"claim": "El estudiante puede cancelar asignaturas hasta la semana 8 [DOC 1].", "support_doc_ids": [1]},
+    {"claim": "La matricula extemporanea tiene un recargo del 20% [DOC 2].", "support_doc_ids": [2]},
+]
+
+
+def test_supported_answer_text_is_accepted() -> None:
+    answer = (
+        "Si. Puedes cancelar asignaturas hasta la semana 8 del periodo academico [DOC 1]. "
+        "La matricula extemporanea tiene un recargo del 20%."
+    )
+
+    result = precheck_grounding(CLAIMS, SUPPORT, accept_threshold=0.7, answer=answer)
+
+    assert result.decision == ACCEPT
+    # "Si." has nothing to check.
+    assert len(result.answer) == 2
+    assert all(sentence_supported(score) for score in result.answer)
+
+
+def test_unsupported_number_or_rule_in_the_answer_text_escalates() -> None:
+    extra_number = "Puedes cancelar asignaturas hasta la semana 8; despues pagas una multa de 150000 pesos."
+    extra_rule = "Puedes cancelar asignaturas. Tambien necesitas la firma del decano y del consejo de facultad."
+
+    for answer in (extra_number, extra_rule):
+        result = precheck_grounding(CLAIMS, SUPPORT, accept_threshold=0.7, answer=answer)
+        assert result.decision == ESCALATE, answer
+        assert "texto de la respuesta" in result.reason
+        assert not all(sentence_supported(score) for score in result.answer)
+    assert result.to_dict()["answer"][-1]["lexical"] < 0.6
+
+
+def test_answer_may_lean_on_any_block_cited_by_claims_or_text() -> None:
+    support = {**SUPPORT, 3: "Las becas de excelencia cubren el 100% de la matricula."}
+    answer = "El recargo es del 20% [DOC 2]. Las becas de excelencia cubren el 100% [DOC 3]."
+
+    assert cited_doc_ids("Ver [DOC 1, DOC 3] y [DOC 2].") == {1, 2, 3}
+    assert precheck_grounding(CLAIMS, support, accept_threshold=0.7, answer=answer).decision == ACCEPT
+    assert precheck_grounding(CLAIMS, SUPPORT, accept_threshold=0.7, answer=answer).decision == ESCALATE
+
+
+def test_stats_accumulate_decisions() -> None:
+    claims = [{"claim": "Texto sin soporte alguno en los fragmentos.", "support_doc_ids": [1]}]
+    result = precheck_grounding(claims, SUPPORT, accept_threshold=0.9)
+
+    data = update_precheck_stats({}, result, llm_grounded=False)
+    data = update_precheck_stats(data, result, llm_grounded=True, max_samples=1)
+
+    assert data[ESCALATE] == 2
+    assert data["samples"] == [{"decision": ESCALATE, "min_score": round(result.min_score, 3), "llm_grounded": True}]
+
+
+def test_shadow_verdicts_count_false_accepts() -> None:
+    accepted = precheck_grounding(CLAIMS, SUPPORT, accept_threshold=0.7)
+
+    data = update_precheck_stats({}, accepted)
+    data = update_precheck_stats(data, accepted, llm_grounded=True, shadow=True)
+    data = update_precheck_stats(data, accepted, llm_grounded=False, shadow=True)
+    data = update_precheck_stats(data, accepted, llm_grounded=None, shadow=True)
+
+    assert data[ACCEPT] == 4
+    assert data["shadow_checked"] == 2 and data["false_accepts"] == 1
+    assert [sample.get("shadow", False) for sample in data["samples"]] == [False, True, True, True]
+    assert describe_precheck({"grounding_evaluator": data})["grounding_evaluator"].endswith(
+        "shadow_checked=2 false_accept_rate=0.50"
+    )
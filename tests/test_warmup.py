@@ -0,0 +1,47 @@
+import threading
+
+from unal_rag.retrieval.warmup import DONE, IDLE, WarmUp, prefetch_files, warmup_enabled
+
+
+def test_warmup_runs_steps_once_in_background_and_records_errors() -> None:
+    calls = []
+    release = threading.Event()
+
+    def slow_step() -> None:
+        release.wait(5)
+        calls.append("embedder")
+
+    def failing_step() -> None:
+        raise RuntimeError("index missing")
+
+    warmup = WarmUp([("embedder", slow_step), ("index", failing_step)])
+    assert warmup.status()["state"] == IDLE
+    assert warmup.wait(0) is False
+
+    assert warmup.start() is True
+    assert warmup.start() is False
+    assert warmup.wait(0.01) is False
+    release.set()
+    assert warmup.wait(5) is True
+
+    status = warmup.status()
+    assert status["state"] == DONE
+    assert calls == ["embedder"]
+    assert "error" not in status["steps"]["embedder"]
+    assert status["steps"]["index"]["error"] == "index missing"
+
+
+def test_prefetch_files_covers_every_file(tmp_path) -> None:
+    (tmp_path / "segment").mkdir()
+    (tmp_path / "chroma.sqlite3").write_bytes(b"x" * 100)
+    (tmp_path / "segment" / "data_level0.bin").write_bytes(b"y" * 50)
+
+    assert prefetch_files(tmp_path) == 150
+    assert prefetch_files(tmp_path / "missing") == 0
+
+
+def test_warmup_can_be_disabled(monkeypatch) -> None:
+    monkeypatch.setenv("UNAL_RAG_WARMUP", "0")
+    assert warmup_enabled() is False
+    monkeypatch.delenv("UNAL_RAG_WARMUP")
+    assert warmup_enabled() is True